@@ -0,0 +1,241 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+"""Benchmark script for int8 and fp32 layers offloaded to Tachikoma on x86 CPU.
+see README.md for the usage of this script.
+
+Each layer is built three times:
+  fp32 llvm       : nn.conv2d / nn.dense + bias (+ relu) compiled by TVM
+  fp32 tachikoma  : the same graph offloaded to Tachikoma
+  int8 tachikoma  : qnn.conv2d / qnn.dense + bias + requantize + clip + cast, offloaded to
+                    Tachikoma as u8/s8 primitives with s32 accumulation
+"""
+import argparse
+
+import numpy as np
+
+import tvm
+from tvm import relay
+from tvm.relay import transform
+from tvm.relay.op.contrib import tachikoma
+import tvm.contrib.graph_executor as runtime
+
+from util import print_progress
+
+
+# name, input shape without batch, output channels, kernel, padding, strides
+RESNET_LAYERS = [
+    ("resnet.conv2_3x3", (64, 56, 56), 64, 3, 1, 1),
+    ("resnet.conv3_3x3", (128, 28, 28), 128, 3, 1, 1),
+    ("resnet.conv4_3x3", (256, 14, 14), 256, 3, 1, 1),
+    ("resnet.conv5_3x3", (512, 7, 7), 512, 3, 1, 1),
+    ("resnet.conv2_1x1", (64, 56, 56), 256, 1, 0, 1),
+    ("resnet.conv3_down", (256, 56, 56), 512, 1, 0, 2),
+]
+
+# name, input features, output features. Tokens are batch * sequence length
+BERT_LAYERS = [
+    ("bert.qkv", 768, 2304),
+    ("bert.attn_out", 768, 768),
+    ("bert.ffn_in", 768, 3072),
+    ("bert.ffn_out", 3072, 768),
+]
+
+
+def get_conv2d(shape, oc, kernel, padding, strides, layout, quantized):
+    """conv2d + bias + relu, in fp32 or qnn with u8 output"""
+    ic = shape[1]
+    w_shape = (oc, ic, kernel, kernel)
+    kernel_layout = "OIHW"
+    b_shape = (oc, 1, 1)
+    if layout == "NHWC":
+        shape = (shape[0], shape[2], shape[3], shape[1])
+        w_shape = (kernel, kernel, ic, oc)
+        kernel_layout = "HWIO"
+        b_shape = (oc,)
+    conv_attrs = dict(
+        kernel_size=(kernel, kernel),
+        padding=(padding, padding),
+        strides=(strides, strides),
+        channels=oc,
+        data_layout=layout,
+        kernel_layout=kernel_layout,
+    )
+
+    if not quantized:
+        data = relay.var("data", shape=shape, dtype="float32")
+        wgh = relay.const(np.random.uniform(-1, 1, w_shape).astype("float32"))
+        bias = relay.const(np.random.uniform(-1, 1, b_shape).astype("float32"))
+        out = relay.nn.conv2d(data, wgh, **conv_attrs)
+        out = relay.nn.relu(relay.add(out, bias))
+        return data, out
+
+    data = relay.var("data", shape=shape, dtype="uint8")
+    wgh = relay.const(np.random.randint(-20, 20, w_shape).astype("int8"))
+    bias = relay.const(np.random.randint(-50, 50, b_shape).astype("int32"))
+    out = relay.qnn.op.conv2d(
+        data,
+        wgh,
+        relay.const(0),
+        relay.const(0),
+        relay.const(0.02),
+        relay.const(0.01),
+        out_dtype="int32",
+        **conv_attrs,
+    )
+    out = relay.add(out, bias)
+    return data, requantize(out, "uint8")
+
+
+def get_dense(tokens, ic, oc, quantized):
+    """dense + bias, in fp32 or qnn with s8 output"""
+    if not quantized:
+        data = relay.var("data", shape=(tokens, ic), dtype="float32")
+        wgh = relay.const(np.random.uniform(-1, 1, (oc, ic)).astype("float32"))
+        bias = relay.const(np.random.uniform(-1, 1, (oc,)).astype("float32"))
+        out = relay.add(relay.nn.dense(data, wgh), bias)
+        return data, out
+
+    data = relay.var("data", shape=(tokens, ic), dtype="uint8")
+    wgh = relay.const(np.random.randint(-20, 20, (oc, ic)).astype("int8"))
+    bias = relay.const(np.random.randint(-50, 50, (oc,)).astype("int32"))
+    out = relay.qnn.op.dense(
+        data,
+        wgh,
+        relay.const(0),
+        relay.const(0),
+        relay.const(0.02),
+        relay.const(0.01),
+        units=oc,
+        out_dtype="int32",
+    )
+    out = relay.add(out, bias)
+    return data, requantize(out, "int8")
+
+
+def requantize(op, dtype):
+    """requantize s32 accumulator to dtype, mapped to Tachikoma output scales"""
+    op = relay.qnn.op.requantize(
+        op,
+        relay.const(0.02 * 0.01),
+        relay.const(0),
+        relay.const(0.5),
+        relay.const(0),
+        out_dtype="int32",
+    )
+    info = np.iinfo(dtype)
+    op = relay.clip(op, a_min=float(info.min), a_max=float(info.max))
+    return relay.cast(op, dtype)
+
+
+def partition_for_tachikoma(mod):
+    """Offload supported patterns, qnn patterns are legalized into Tachikoma form first"""
+    seq = tvm.transform.Sequential(
+        [
+            transform.InferType(),
+            transform.CanonicalizeOps(),
+            transform.FoldConstant(),
+        ]
+    )
+    with tvm.transform.PassContext(opt_level=3):
+        mod = seq(mod)
+    mod = tachikoma.legalize_qnn_for_tachikoma(mod)
+
+    byoc_seq = tvm.transform.Sequential(
+        [
+            transform.MergeComposite(tachikoma.pattern_table()),
+            transform.AnnotateTarget("tachikoma"),
+            transform.MergeCompilerRegions(),
+            transform.PartitionGraph(),
+        ]
+    )
+    with tvm.transform.PassContext(opt_level=3):
+        mod = byoc_seq(mod)
+    num_subgraphs = sum(1 for gv in mod.get_global_vars() if "tachikoma" in gv.name_hint)
+    assert num_subgraphs > 0, "nothing is offloaded to Tachikoma"
+    return mod
+
+
+def evaluate(data, out, target, offload, repeat):
+    """mean inference time in milliseconds"""
+    mod = tvm.IRModule.from_expr(relay.Function([data], out))
+    if offload:
+        mod = partition_for_tachikoma(mod)
+    with tvm.transform.PassContext(opt_level=3):
+        lib = relay.build(mod, target=target)
+
+    dev = tvm.cpu()
+    module = runtime.GraphModule(lib["default"](dev))
+    shape = [int(i) for i in data.type_annotation.shape]
+    dtype = data.type_annotation.dtype
+    if dtype == "float32":
+        value = np.random.uniform(0, 1, shape).astype(dtype)
+    else:
+        value = np.random.randint(0, 20, shape).astype(dtype)
+    module.set_input("data", value)
+    ftimer = module.module.time_evaluator("run", dev, number=10, repeat=repeat)
+    return np.mean(ftimer().results) * 1000  # multiply 1000 for converting to millisecond
+
+
+def evaluate_layer(name, get_layer, target, repeat):
+    print_progress(name)
+    fp32_llvm = evaluate(*get_layer(False), target, False, repeat)
+    fp32_tachikoma = evaluate(*get_layer(False), target, True, repeat)
+    int8_tachikoma = evaluate(*get_layer(True), target, True, repeat)
+    print(
+        "%-20s %-15s %-15s %-15s %.2fx"
+        % (
+            name,
+            "%.3f ms" % fp32_llvm,
+            "%.3f ms" % fp32_tachikoma,
+            "%.3f ms" % int8_tachikoma,
+            fp32_tachikoma / int8_tachikoma,
+        )
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workload", type=str, choices=["resnet", "bert", "all"], default="all")
+    parser.add_argument("--batch-size", type=int, default=1)
+    parser.add_argument("--seq-len", type=int, default=128, help="BERT sequence length")
+    parser.add_argument("--layout", type=str, choices=["NCHW", "NHWC"], default="NHWC")
+    parser.add_argument("--target", type=str, default="llvm -mcpu=native")
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    np.random.seed(0)
+    target = tvm.target.Target(args.target)
+
+    print("-" * 85)
+    print(
+        "%-20s %-15s %-15s %-15s %s"
+        % ("Layer Name", "fp32 llvm", "fp32 tachikoma", "int8 tachikoma", "int8 speedup")
+    )
+    print("-" * 85)
+    if args.workload in ["resnet", "all"]:
+        for name, shape, oc, kernel, padding, strides in RESNET_LAYERS:
+            shape = (args.batch_size,) + shape
+            evaluate_layer(
+                name,
+                lambda q: get_conv2d(shape, oc, kernel, padding, strides, args.layout, q),
+                target,
+                args.repeat,
+            )
+    if args.workload in ["bert", "all"]:
+        tokens = args.batch_size * args.seq_len
+        for name, ic, oc in BERT_LAYERS:
+            evaluate_layer(name, lambda q: get_dense(tokens, ic, oc, q), target, args.repeat)
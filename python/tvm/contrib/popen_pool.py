@@ -371,12 +371,17 @@ class PopenPoolExecutor:
             raise TypeError("initializer must be callable for PopenPoolExecutor")
 
     def __del__(self):
+        self.shutdown()
+
+    def shutdown(self):
+        """Kill the popen workers and shutdown the internal thread pool."""
         self._lock.acquire()
         for worker in self._worker_map.values():
             try:
                 worker.kill()
             except ImportError:
                 pass
+        self._worker_map = {}
         self._lock.release()
         self._threadpool.shutdown()
 
@@ -9,6 +9,7 @@ from tvm import relay, ir
 from .extool import *
 from .types import *
 from . import runtime, topi
+from .interop import as_numpy
 
 VisitorT = typing.Callable[ [RelayExpr, ParametersT], None ]
 TransformerT = typing.Callable[
@@ -50,14 +51,14 @@ class Trace:
     def calibrate(self,
             data: typing.Optional[np.ndarray] = None,
             data_dict: typing.Dict[str, np.ndarray] = {},
-        ) -> typing.Dict[str, np.ndarray]:
-        self.infer_type()
-
-        calibrate_outputs: typing.Dict[str, np.ndarray] = {
-                k: v.numpy() for k, v in params.items()}
+        ) -> typing.Dict[RelayExpr, np.ndarray]:
+        """ Calibrate with numpy reference operators in `topi`. """
+        trace = self.infer_type()
 
+        named_outputs: typing.Dict[str, np.ndarray] = {
+                k: as_numpy(v) for k, v in trace.params.items()}
         # set input data
-        for v in self.input_vars:
+        for v in trace.input_vars:
             shape = v.type_annotation.concrete_shape
             dtype = v.type_annotation.dtype
             val = data_dict.get(v.name_hint, data)
@@ -65,16 +66,25 @@ class Trace:
                 print("input: {} use random data".format(
                     v.name_hint))
                 val = np.random.randn(*shape).astype(dtype)
-            calibrate_outputs[v.name_hint] = val
+            named_outputs[v.name_hint] = val
 
+        calibrate_outputs: typing.Dict[RelayExpr, np.ndarray] = {}
         def _calibrate(expr: RelayExpr, params: ParametersT):
-            data = [ calibrate_outputs[e] for e in args(expr) ]
-            out = topi.execute(expr, data)
-            shape = list(expr.checked_type.concrete_shape)
-            assert list(out.shape) == shape
-            assert str(out.dtype) == expr.checked_type.dtype
+            if isinstance(expr, Var):
+                out = named_outputs[expr.name_hint]
+            elif isinstance(expr, TupleGetItem):
+                out = calibrate_outputs[expr.tuple_value][expr.index]
+            elif isinstance(expr, Tuple):
+                out = [ calibrate_outputs[e] for e in expr.fields ]
+            else:
+                data = [ calibrate_outputs[e] for e in args(expr) ]
+                out = topi.execute(expr, data)
+                if isinstance(expr.checked_type, relay.TensorType):
+                    shape = list(expr.checked_type.concrete_shape)
+                    assert list(out.shape) == shape, expr
+                    assert str(out.dtype) == expr.checked_type.dtype
             calibrate_outputs[expr] = out
-        self.visit(_calibrate)
+        trace.visit(_calibrate)
         return calibrate_outputs
 
     def run(self,
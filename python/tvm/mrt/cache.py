@@ -0,0 +1,129 @@
+""" Persistent Calibration Cache
+
+    Calibration results are stored on disk under `MRT_MODEL_ROOT`,
+        addressed by the model fingerprint, dataset fingerprint and
+        batch index. Later runs with the same model and dataset load
+        the summaries instead of re-running inference, and only the
+        missing batches will be calibrated.
+"""
+from __future__ import annotations
+
+import typing
+import hashlib
+import os
+from os import path
+from dataclasses import dataclass
+
+import numpy as np
+
+import tvm
+
+from .symbol import *
+from .types import *
+from . import utils
+from .interop import as_numpy
+
+SummaryT = typing.Dict[str, np.ndarray]
+""" calibration summary of one tensor: min, max, absmax, hist. """
+
+def fingerprint(symbol: Symbol, params: ParametersT,
+        graph: typing.Optional[GraphIndex] = None) -> str:
+    """ Content hash of graph structure and parameter values. """
+    sha = hashlib.sha256()
+    def _update(sym: Symbol):
+        sha.update("{}={}({})/{}\n".format(
+            sym.name, sym.op_name,
+            ",".join([a.name for a in sym.args]),
+            sorted(sym.attrs.items())).encode())
+        if is_param(sym, params):
+            sha.update(as_numpy(params[sym.name]).tobytes())
+    visit(symbol, _update, graph)
+    return sha.hexdigest()
+
+def summarize(data, bins: int = 2048) -> SummaryT:
+    """ Summarize tensor with min, max and histogram of |x|. """
+    data = as_numpy(data).astype("float32")
+    absmax = float(np.abs(data).max()) if data.size else 0.
+    hist, _ = np.histogram(np.abs(data), bins=bins,
+            range=(0., absmax or 1.))
+    return {
+        "min": np.array(data.min() if data.size else 0.),
+        "max": np.array(data.max() if data.size else 0.),
+        "absmax": np.array(absmax),
+        "hist": hist.astype("int64"),
+    }
+
+def merge_summaries(summaries: typing.List[SummaryT]) -> SummaryT:
+    """ Merge summaries of multiple batches.
+
+        Histograms are re-binned into the global absmax range,
+            assuming counts are uniform inside each bin.
+    """
+    assert summaries, "empty summaries"
+    bins = summaries[0]["hist"].shape[0]
+    absmax = max([float(s["absmax"]) for s in summaries])
+    edges = np.linspace(0., absmax or 1., bins + 1)
+
+    hist = np.zeros((bins,), dtype="float64")
+    for s in summaries:
+        src_edges = np.linspace(0., float(s["absmax"]) or 1., bins + 1)
+        # cumulative counts at destination edges, by interpolation.
+        cum = np.concatenate([[0.], np.cumsum(s["hist"])])
+        hist += np.diff(np.interp(edges, src_edges, cum))
+    return {
+        "min": np.array(min([float(s["min"]) for s in summaries])),
+        "max": np.array(max([float(s["max"]) for s in summaries])),
+        "absmax": np.array(absmax),
+        "hist": np.round(hist).astype("int64"),
+    }
+
+@dataclass
+class CalibrateCache:
+    """ Calibration summaries cache of one model and dataset. """
+    model_hash: str
+    dataset_hash: str
+    bins: int = 2048
+    root: str = path.join(utils.MRT_MODEL_ROOT, "calibrate")
+
+    @property
+    def cache_dir(self) -> str:
+        return path.join(self.root, self.model_hash,
+                "{}-b{}".format(self.dataset_hash, self.bins))
+
+    def batch_path(self, index: int) -> str:
+        return path.join(self.cache_dir,
+                "batch-{:05d}.npz".format(index))
+
+    def __contains__(self, index: int) -> bool:
+        return path.exists(self.batch_path(index))
+
+    def load(self, index: int) -> typing.Optional[
+            typing.Dict[str, SummaryT]]:
+        """ Load batch summaries, None if not cached. """
+        fpath = self.batch_path(index)
+        if not path.exists(fpath):
+            return None
+        summaries = {}
+        with np.load(fpath) as data:
+            for key in data.files:
+                name, field = key.rsplit("/", 1)
+                summaries.setdefault(name, {})[field] = data[key]
+        return summaries
+
+    def save(self, index: int, summaries: typing.Dict[str, SummaryT]):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        data = {}
+        for name, summary in summaries.items():
+            for field, val in summary.items():
+                data["{}/{}".format(name, field)] = val
+        # write to temporary file and rename, to be atomic.
+        fpath = self.batch_path(index)
+        tmp_path = fpath + ".tmp.npz"
+        np.savez(tmp_path, **data)
+        os.replace(tmp_path, fpath)
+
+    def clear(self):
+        if not path.exists(self.cache_dir):
+            return
+        for fname in os.listdir(self.cache_dir):
+            os.remove(path.join(self.cache_dir, fname))
@@ -11,6 +11,7 @@ from .symbol import *
 from . import runtime
 from .transform import Transformer
 from .types import *
+from .interop import as_ndarray, randn
 
 @dataclass
 class Calibrator(Transformer):
@@ -21,19 +22,26 @@ class Calibrator(Transformer):
 
     def __call__(self,
             data: tvm.nd.NDArray | None =None,
-            data_dict: ParametersT = {}):
+            data_dict: ParametersT = {},
+            engine_outputs: typing.Dict[str, typing.Any] = {}):
+        """ Calibrate symbol output.
+
+            `engine_outputs` is the result of the whole graph
+                `runtime.CalibrateEngine.run`, the operator will
+                read output from it instead of compiling itself.
+        """
         if self.is_input():
             out = data_dict.get(self.name, data)
             if out is None:
                 # use random input data
-                out = np.random.randn(*self.shape)
-                out = out.astype(self.dtype)
-                out = tvm.nd.array(out)
+                out = as_ndarray(randn(self.shape, self.dtype))
         elif self.is_param():
             out = self.params[self.name]
         elif self.is_op(TUPLE_GET_ITEM_NAME):
             out = self.args[0].raw_output[self.attrs["index"]]
             assert isinstance(out, tvm.nd.NDArray), type(out)
+        elif self.name in engine_outputs:
+            out = engine_outputs[self.name]
         else:
             out = self.run({ a.name: a.raw_output \
                     for a in self.args })
@@ -0,0 +1,240 @@
+""" Circuit Constraint Cost Model
+
+    The proving cost of zk circuit depends on the multiplication
+        gates and range checks, instead of FLOPs: the addition and
+        multiplication by constant are linear and free, comparisons
+        and shifts are proved by range checks on the bit width of
+        values, and the non-linear float operators are table lookups.
+
+    Constraints are estimated per symbol from shapes and dtypes, and
+        aggregated per layer, where a layer is the conv2d or dense
+        with the following operators up to the next layer.
+"""
+from __future__ import annotations
+
+import typing
+import json
+from dataclasses import dataclass, field, asdict
+
+import numpy as np
+
+from .symbol import *
+from .types import *
+from .trace import Trace
+from .precision import macs
+from .interop import as_numpy
+
+@dataclass
+class ConstraintCount:
+    mul: int = 0
+    """ multiplication gates. """
+    range: int = 0
+    """ range check bits, by bit decomposition. """
+    lookup: int = 0
+    """ table lookups of non-linear operators. """
+
+    def total(self, lookup_cost: int = 1) -> int:
+        return self.mul + self.range + self.lookup * lookup_cost
+
+    def __add__(self, other: ConstraintCount) -> ConstraintCount:
+        return ConstraintCount(self.mul + other.mul,
+                self.range + other.range, self.lookup + other.lookup)
+
+CostFuncT = typing.Callable[[Symbol, ParametersT], ConstraintCount]
+
+COST_REGS: typing.Dict[str, CostFuncT] = {}
+
+def register_cost(*op_names):
+    def _wrapper(f):
+        for op_name in op_names:
+            COST_REGS[op_name] = f
+        return f
+    return _wrapper
+
+def _bits(dtype: str) -> int:
+    return np.dtype(dtype).itemsize * 8 if isinstance(dtype, str) else 32
+
+def _shape_numel(shape) -> int:
+    if shape and isinstance(shape[0], (list, tuple)):
+        return sum([ _shape_numel(s) for s in shape ])
+    return product(shape)
+
+def _numel(sym: Symbol) -> int:
+    """ output elements, summed over fields of tuple output. """
+    return _shape_numel(sym.shape)
+
+def _is_float(sym: Symbol) -> bool:
+    return str(sym.dtype).startswith("float")
+
+def _param_max(sym: Symbol, params: ParametersT) -> int:
+    return int(np.abs(as_numpy(params[sym.name])).max())
+
+def _comparison(sym: Symbol, count: int) -> ConstraintCount:
+    """ count comparisons per output element. """
+    if _is_float(sym):
+        return ConstraintCount(lookup=_numel(sym) * count)
+    return ConstraintCount(range=_numel(sym) * count * _bits(sym.dtype))
+
+@register_cost("nn.conv2d", "nn.dense")
+def _cost_layer(sym: Symbol, params: ParametersT) -> ConstraintCount:
+    return ConstraintCount(mul=macs(sym))
+
+@register_cost("nn.batch_matmul")
+def _cost_batch_matmul(sym: Symbol, params: ParametersT):
+    K = sym.args[0].shape[-2] if sym.attrs.get("transpose_a", False) \
+            else sym.args[0].shape[-1]
+    return ConstraintCount(mul=_numel(sym) * K)
+
+@register_cost("multiply")
+def _cost_multiply(sym: Symbol, params: ParametersT):
+    if any([is_param(a, params) for a in sym.args]):
+        # multiplication by constant is linear.
+        return ConstraintCount()
+    return ConstraintCount(mul=_numel(sym))
+
+@register_cost("right_shift")
+def _cost_right_shift(sym: Symbol, params: ParametersT):
+    """ x = q * 2^n + r, range check of q and r. """
+    X, N = sym.args
+    n = _param_max(N, params) if is_param(N, params) \
+            else _bits(N.dtype)
+    return ConstraintCount(range=_numel(sym) * (n + _bits(sym.dtype)))
+
+@register_cost("clip")
+def _cost_clip(sym: Symbol, params: ParametersT):
+    return _comparison(sym, 2)
+
+@register_cost("nn.relu", "maximum", "minimum")
+def _cost_relu(sym: Symbol, params: ParametersT):
+    return _comparison(sym, 1)
+
+@register_cost("nn.max_pool2d")
+def _cost_max_pool2d(sym: Symbol, params: ParametersT):
+    pool_size = [ int(k) for k in sym.attrs["pool_size"] ]
+    return _comparison(sym, product(pool_size) - 1)
+
+@register_cost("nn.global_max_pool2d")
+def _cost_global_max_pool2d(sym: Symbol, params: ParametersT):
+    return _comparison(sym, product(sym.args[0].shape[2:]) - 1)
+
+@register_cost("nn.avg_pool2d", "nn.global_avg_pool2d",
+        "nn.adaptive_avg_pool2d")
+def _cost_avg_pool2d(sym: Symbol, params: ParametersT):
+    """ division by constant, range check of remainder. """
+    if _is_float(sym):
+        return ConstraintCount(lookup=_numel(sym))
+    count = _numel(sym.args[0]) // max(_numel(sym), 1)
+    return ConstraintCount(range=_numel(sym) * (
+        int(np.ceil(np.log2(max(count, 2)))) + _bits(sym.dtype)))
+
+@register_cost("cast")
+def _cost_cast(sym: Symbol, params: ParametersT):
+    X = sym.args[0]
+    if _is_float(sym) or _is_float(X):
+        return ConstraintCount(lookup=_numel(sym))
+    if _bits(sym.dtype) < _bits(X.dtype):
+        return ConstraintCount(range=_numel(sym) * _bits(sym.dtype))
+    return ConstraintCount()
+
+@register_cost("add", "subtract", "nn.bias_add", "negative",
+        "left_shift", "reshape", "squeeze", "expand_dims",
+        "transpose", "nn.batch_flatten", "concatenate", "split",
+        "nn.dropout", TUPLE_NAME, TUPLE_GET_ITEM_NAME)
+def _cost_linear(sym: Symbol, params: ParametersT):
+    return ConstraintCount()
+
+def symbol_cost(sym: Symbol, params: ParametersT) -> ConstraintCount:
+    """ Constraints of symbol, non-linear lookup by default. """
+    if is_variable(sym, params):
+        return ConstraintCount()
+    if sym.op_name in COST_REGS:
+        return COST_REGS[sym.op_name](sym, params)
+    return ConstraintCount(lookup=_numel(sym))
+
+def layer_cost(sym: Symbol, bits: int) -> float:
+    """ CostFnT of `precision.search`: multiplications of layer, and
+            range checks of its inputs and output in bits.
+    """
+    return float(macs(sym) + bits * (
+        _numel(sym.args[0]) + _numel(sym.args[1]) + _numel(sym)))
+
+@dataclass
+class CircuitReport:
+    """ Constraint counts of trace, per symbol, layer and model. """
+    trace: Trace
+    lookup_cost: int = 1
+
+    symbols: typing.Dict[str, ConstraintCount] = \
+            field(init=False, default_factory=dict)
+    layers: typing.Dict[str, ConstraintCount] = \
+            field(init=False, default_factory=dict)
+    layer_of: typing.Dict[str, str] = \
+            field(init=False, default_factory=dict)
+
+    def __post_init__(self):
+        def _count(sym: Symbol, params: ParametersT):
+            if is_variable(sym, params):
+                return
+            if sym.op_name in ["nn.conv2d", "nn.dense"]:
+                layer = sym.name
+            else:
+                layer = "input"
+                for a in sym.args:
+                    if a.name in self.layer_of:
+                        layer = self.layer_of[a.name]
+                        break
+            self.layer_of[sym.name] = layer
+            cost = symbol_cost(sym, params)
+            self.symbols[sym.name] = cost
+            self.layers[layer] = self.layers.get(
+                    layer, ConstraintCount()) + cost
+        self.trace.visit(_count)
+
+    @property
+    def model(self) -> ConstraintCount:
+        total = ConstraintCount()
+        for cost in self.symbols.values():
+            total = total + cost
+        return total
+
+    def print(self):
+        def _print(sym: Symbol):
+            if sym.name not in self.symbols:
+                return
+            cost = self.symbols[sym.name]
+            print("{:30} = {:>15}{:30} /* constraints */ {:>12} {}".format(
+                sym.name, sym.op_name,
+                "(" + ", ".join([i.name for i in sym.args]) + ")",
+                cost.total(self.lookup_cost), asdict(cost)))
+        visit(self.trace.symbol, _print, self.trace.graph)
+        print("="*50)
+        for layer, cost in self.layers.items():
+            print("{:30} | {:>12} {}".format(layer,
+                cost.total(self.lookup_cost), asdict(cost)))
+        print("="*50)
+        model = self.model
+        print("Constraints: {} | Mul: {} | Range: {} | Lookup: {}".format(
+            model.total(self.lookup_cost),
+            model.mul, model.range, model.lookup))
+        print("="*50)
+
+    def to_json(self) -> dict:
+        def _info(cost: ConstraintCount):
+            info = asdict(cost)
+            info["total"] = cost.total(self.lookup_cost)
+            return info
+        return {
+            "name": self.trace.name,
+            "lookup_cost": self.lookup_cost,
+            "symbols": { k: dict(_info(v), layer=self.layer_of[k]) \
+                    for k, v in self.symbols.items() },
+            "layers": { k: _info(v) for k, v in self.layers.items() },
+            "model": _info(self.model),
+        }
+
+    def dump(self, fname: str):
+        with open(fname, "w") as f:
+            json.dump(self.to_json(), f, indent=2)
+
+def circuit_report(tr: Trace, lookup_cost: int = 1) -> CircuitReport:
+    return CircuitReport(tr, lookup_cost)
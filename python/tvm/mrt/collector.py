@@ -0,0 +1,195 @@
+""" Streaming Calibration Statistics
+
+    Collectors reduce each calibration output in place and keep
+        only bounded state, so the output tensor can be dropped
+        right after update. Collectors of the same type can be
+        merged, to reduce the statistics from multiple workers.
+"""
+from __future__ import annotations
+
+import typing
+import ctypes
+
+import numpy as np
+
+import tvm
+
+from .interop import as_numpy
+
+class Collector:
+    def update(self, data: np.ndarray):
+        """ reduce new tensor into collector status. """
+        raise RuntimeError("Base Collector Error")
+
+    def merge(self, other: Collector) -> Collector:
+        """ merge other collector status into self. """
+        raise RuntimeError("Base Collector Error")
+
+    def result(self) -> typing.Any:
+        """ return collected statistic. """
+        raise RuntimeError("Base Collector Error")
+
+CollectorFactoryT = typing.Callable[[], Collector]
+
+
+class MinMaxCollector(Collector):
+    def __init__(self):
+        self.min = None
+        self.max = None
+
+    def update(self, data: np.ndarray):
+        data = as_numpy(data)
+        if data.size == 0:
+            return
+        dmin, dmax = float(data.min()), float(data.max())
+        self.min = dmin if self.min is None else min(self.min, dmin)
+        self.max = dmax if self.max is None else max(self.max, dmax)
+
+    def merge(self, other: MinMaxCollector) -> MinMaxCollector:
+        for v in [other.min, other.max]:
+            if v is not None:
+                self.update(np.array(v))
+        return self
+
+    @property
+    def absmax(self) -> float:
+        if self.min is None:
+            return 0.
+        return max(abs(self.min), abs(self.max))
+
+    def result(self) -> typing.Tuple[float, float]:
+        return self.min, self.max
+
+
+class HistogramCollector(Collector):
+    """ Symmetric fixed-bin histogram in range [-thres, thres].
+
+        The range grows with data, and the counts collected
+            before are re-binned into the new range assuming
+            uniform distribution inside each bin.
+    """
+    def __init__(self, num_bins: int = 8001):
+        self.num_bins = num_bins
+        self.thres = 0.
+        self.hist = np.zeros((num_bins,), dtype="float64")
+
+    @property
+    def edges(self) -> np.ndarray:
+        return np.linspace(-self.thres, self.thres, self.num_bins + 1)
+
+    def _rebin(self, thres: float):
+        if self.thres > 0 and self.hist.any():
+            cum = np.concatenate([[0.], np.cumsum(self.hist)])
+            new_edges = np.linspace(-thres, thres, self.num_bins + 1)
+            self.hist = np.diff(np.interp(new_edges, self.edges, cum))
+        self.thres = thres
+
+    def _add(self, hist: np.ndarray, thres: float):
+        if thres > self.thres:
+            self._rebin(thres)
+        if thres < self.thres:
+            cum = np.concatenate([[0.], np.cumsum(hist)])
+            src_edges = np.linspace(-thres, thres, self.num_bins + 1)
+            hist = np.diff(np.interp(self.edges, src_edges, cum))
+        self.hist += hist
+
+    def update(self, data: np.ndarray):
+        data = as_numpy(data)
+        if data.size == 0:
+            return
+        thres = float(np.abs(data).max()) or 1e-8
+        hist, _ = np.histogram(data, bins=self.num_bins,
+                range=(-thres, thres))
+        self._add(hist.astype("float64"), thres)
+
+    def merge(self, other: HistogramCollector) -> HistogramCollector:
+        assert self.num_bins == other.num_bins
+        if other.thres > 0:
+            self._add(other.hist, other.thres)
+        return self
+
+    def result(self) -> typing.Tuple[np.ndarray, np.ndarray]:
+        return self.hist, self.edges
+
+
+class KLDivergenceCollector(HistogramCollector):
+    """ Threshold by KL-divergence minimization.
+
+        Same algorithm as `relay.quantize.kl_divergence`, but runs
+            on the streaming histogram instead of whole tensor.
+    """
+    def __init__(self, num_bins: int = 8001,
+            num_quantized_bins: int = 255):
+        super().__init__(num_bins)
+        self.num_quantized_bins = num_quantized_bins
+
+    def result(self) -> float:
+        from tvm.relay.quantize import _quantize
+
+        if self.thres == 0:
+            return 0.
+        def get_pointer(arr, ctypes_type):
+            ptr = arr.ctypes.data_as(ctypes.POINTER(ctypes_type))
+            return ctypes.cast(ptr, ctypes.c_void_p)
+
+        hist = np.round(self.hist).astype(np.int32)
+        edges = self.edges.astype(np.float32)
+        return _quantize.FindScaleByKLMinimization(
+            get_pointer(hist, ctypes.c_int),
+            get_pointer(edges, ctypes.c_float),
+            self.num_bins, self.num_quantized_bins)
+
+
+class PercentileCollector(Collector):
+    """ Percentiles of |x| estimated by reservoir sampling. """
+    def __init__(self,
+            percentiles: typing.Sequence[float] = (99.9, 99.99),
+            reservoir_size: int = 65536, seed: int = 0):
+        self.percentiles = list(percentiles)
+        self.reservoir_size = reservoir_size
+        self.reservoir = np.empty((reservoir_size,), dtype="float32")
+        self.seen = 0
+        self.rng = np.random.default_rng(seed)
+
+    @property
+    def samples(self) -> np.ndarray:
+        return self.reservoir[:min(self.seen, self.reservoir_size)]
+
+    def update(self, data: np.ndarray):
+        data = np.abs(as_numpy(data).reshape(-1)).astype("float32")
+        # fill the reservoir first.
+        fill = max(min(self.reservoir_size - self.seen, data.size), 0)
+        self.reservoir[self.seen:self.seen+fill] = data[:fill]
+        self.seen += fill
+        data = data[fill:]
+        if data.size == 0:
+            return
+
+        # algorithm R: the t-th item replaces a random slot
+        #   with probability k/t, vectorized over batch.
+        t = self.seen + np.arange(1, data.size + 1)
+        slots = (self.rng.random(data.size) * t).astype("int64")
+        accept = slots < self.reservoir_size
+        self.reservoir[slots[accept]] = data[accept]
+        self.seen += data.size
+
+    def merge(self, other: PercentileCollector) -> PercentileCollector:
+        """ merge reservoirs weighted by seen counts. """
+        total = self.seen + other.seen
+        if total == 0:
+            return self
+        size = min(self.reservoir_size, total)
+        num_self = int(round(size * self.seen / total))
+        num_self = min(num_self, self.samples.size)
+        num_other = min(size - num_self, other.samples.size)
+        self.reservoir[:num_self+num_other] = np.concatenate([
+            self.rng.choice(self.samples, num_self, replace=False),
+            self.rng.choice(other.samples, num_other, replace=False),
+        ])
+        self.seen = total
+        return self
+
+    def result(self) -> typing.List[float]:
+        if self.seen == 0:
+            return [0. for _ in self.percentiles]
+        return np.percentile(self.samples, self.percentiles).tolist()
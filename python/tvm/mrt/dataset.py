@@ -1,7 +1,11 @@
 import typing
-
+import hashlib
+import json
+import os
 from os import path
 
+import numpy as np
+
 import tvm
 
 from .types import *
@@ -15,6 +19,10 @@ class Dataset:
         """ reset dataset internal reader status. """
         raise RuntimeError("Base Dataset Error")
 
+    def fingerprint(self) -> str:
+        """ content hash of dataset, used as cache key. """
+        raise RuntimeError("Base Dataset Error")
+
 class ImageNet(Dataset):
     category_name = "imagenet_category.json"
 
@@ -46,4 +54,194 @@ class MemoryDataset(Dataset):
     def reset(self):
         self._index = 0
 
+    def fingerprint(self) -> str:
+        sha = hashlib.sha256()
+        for data, label in self.data:
+            sha.update(np.asarray(data).tobytes())
+            sha.update(np.asarray(label).tobytes())
+        return sha.hexdigest()
+
+class ShardedDataset(Dataset):
+    """ On-disk dataset of preprocessed tensor shards.
+
+        The directory contains data shards saved in npy format,
+            the labels and an `index.json` describing shards.
+            Shards are opened with `np.memmap`, batches inside
+            one shard are zero-copy slices, and only those crossing
+            the shard boundary will be copied.
+
+        Samples are split into `num_workers` contiguous ranges
+            deterministically, and the `worker_index` range will
+            be iterated.
+    """
+    index_name = "index.json"
+    label_name = "labels.npy"
+    fingerprint_chunk = 1 << 24
+    """ bytes of shard data hashed at once by fingerprint. """
+
+    def __init__(self, root: str, batch_size: int = 1,
+            num_workers: int = 1, worker_index: int = 0):
+        assert 0 <= worker_index < num_workers, (
+            "invalid worker index: {} of {}").format(
+                    worker_index, num_workers)
+        self.root = root
+        self.batch_size = batch_size
+
+        with open(path.join(root, self.index_name)) as f:
+            self.index = json.load(f)
+        self.shards: typing.List[np.memmap] = [ np.load(
+            path.join(root, s["file"]), mmap_mode="r") \
+                for s in self.index["shards"] ]
+        self.labels = np.load(
+                path.join(root, self.label_name), mmap_mode="r")
+        # global start offset of each shard, with total at last.
+        self.offsets = np.cumsum(
+                [0] + [s.shape[0] for s in self.shards])
+
+        total = int(self.offsets[-1])
+        assert total == self.labels.shape[0], (
+            "dataset size inconsistent: {} vs. {}").format(
+                    total, self.labels.shape[0])
+        self.start = total * worker_index // num_workers
+        self.stop = total * (worker_index + 1) // num_workers
+        self._index = self.start
+
+    @property
+    def data_shape(self) -> ShapeT:
+        return tuple(self.index["shape"])
+
+    @property
+    def dtype(self) -> str:
+        return self.index["dtype"]
+
+    def __len__(self):
+        return self.stop - self.start
+
+    def _locate(self, index: int) -> typing.Tuple[int, int]:
+        shard = int(np.searchsorted(self.offsets, index, side="right")) - 1
+        return shard, index - int(self.offsets[shard])
+
+    def _slice(self, start: int, stop: int) -> DataLabelT:
+        shard, offset = self._locate(start)
+        count = stop - start
+        if offset + count <= self.shards[shard].shape[0]:
+            data = self.shards[shard][offset:offset+count]
+        else:
+            parts = []
+            while count > 0:
+                part = self.shards[shard][offset:offset+count]
+                parts.append(part)
+                count -= part.shape[0]
+                shard, offset = shard + 1, 0
+            data = np.concatenate(parts)
+        return data, self.labels[start:stop]
+
+    def __getitem__(self, index: int) -> DataLabelT:
+        """ random access of sample in current worker range. """
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("dataset index out of range: {}".format(
+                index))
+        shard, offset = self._locate(self.start + index)
+        return (self.shards[shard][offset],
+                self.labels[self.start + index])
 
+    def next(self) -> typing.Optional[DataLabelT]:
+        if self._index >= self.stop:
+            return None
+        stop = min(self._index + self.batch_size, self.stop)
+        dl = self._slice(self._index, stop)
+        self._index = stop
+        return dl
+
+    def reset(self):
+        self._index = self.start
+
+    def fingerprint(self) -> str:
+        """ content hash of index, labels and the shard data of
+                current worker range, which is streamed from the
+                memmaps in chunks of about `fingerprint_chunk` bytes.
+        """
+        sha = hashlib.sha256()
+        with open(path.join(self.root, self.index_name), "rb") as f:
+            sha.update(f.read())
+        sha.update(np.asarray(self.labels).tobytes())
+        for shard, begin in zip(self.shards, self.offsets):
+            lo = max(self.start - int(begin), 0)
+            hi = min(self.stop - int(begin), shard.shape[0])
+            if lo >= hi:
+                continue
+            row_bytes = max(shard[0].nbytes, 1)
+            step = max(self.fingerprint_chunk // row_bytes, 1)
+            for i in range(lo, hi, step):
+                sha.update(shard[i:min(i+step, hi)].tobytes())
+        sha.update("{}:{}:{}".format(
+            self.start, self.stop, self.batch_size).encode())
+        return sha.hexdigest()
+
+    @staticmethod
+    def write(root: str, dataset: Dataset,
+            shard_size: int = 1024,
+            max_iter_num: typing.Optional[int] = None):
+        """ Dump dataset batches into shards directory. """
+        os.makedirs(root, exist_ok=True)
+
+        shards, labels = [], []
+        shard: typing.Optional[np.memmap] = None
+        fill = 0
+        def _open_shard(data: np.ndarray):
+            fname = "shard-{:05d}.npy".format(len(shards))
+            shards.append({ "file": fname, "count": 0 })
+            return np.lib.format.open_memmap(
+                    path.join(root, fname), mode="w+",
+                    dtype=data.dtype,
+                    shape=(shard_size,) + data.shape[1:])
+
+        dataset.reset()
+        data_shape, data_dtype = None, None
+        i = 0
+        while max_iter_num is None or i < max_iter_num:
+            dl = dataset.next()
+            if dl is None:
+                break
+            data, label = np.asarray(dl[0]), np.asarray(dl[1])
+            if data_shape is None:
+                data_shape, data_dtype = data.shape[1:], data.dtype
+            assert data.shape[1:] == data_shape, (
+                "data shape inconsistent: {} vs. {}").format(
+                        data.shape[1:], data_shape)
+            labels.append(label.reshape(data.shape[0], -1) \
+                    if label.ndim > 1 else label)
+
+            while data.shape[0] > 0:
+                if shard is None or fill == shard_size:
+                    if shard is not None:
+                        shard.flush()
+                    shard, fill = _open_shard(data), 0
+                count = min(shard_size - fill, data.shape[0])
+                shard[fill:fill+count] = data[:count]
+                shards[-1]["count"] += count
+                fill += count
+                data = data[count:]
+            i += 1
+        dataset.reset()
+
+        if shard is not None:
+            shard.flush()
+            del shard
+            # truncate the last shard to actual size.
+            last = path.join(root, shards[-1]["file"])
+            arr = np.load(last, mmap_mode="r")[:shards[-1]["count"]]
+            arr = np.array(arr)
+            np.save(last, arr)
+
+        np.save(path.join(root, ShardedDataset.label_name),
+                np.concatenate(labels) if labels \
+                        else np.zeros((0,), dtype="int64"))
+        with open(path.join(root, ShardedDataset.index_name), "w") as f:
+            json.dump({
+                "shape": list(data_shape or []),
+                "dtype": str(data_dtype),
+                "shards": shards,
+            }, f, indent=2)
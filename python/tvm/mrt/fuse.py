@@ -1,21 +1,189 @@
-from dataclasses import InitVar
+""" Operator Fusion before Quantization
+
+    Fold `nn.batch_norm` into the preceding conv2d or dense weights,
+        merge the bias_add, relu and clip chains, and drop the
+        identity reshape and dropout. Fewer operators means less
+        requantization in inference, and smaller circuit for the
+        zk backend.
+
+    The folded weights are new parameters, use `fuse` on trace
+        instead of `Trace.transform` directly, which collects them
+        into a new params dict.
+"""
+from __future__ import annotations
+
+import typing
+from collections import ChainMap
+
+import numpy as np
+
+import tvm
 
 from .symbol import *
+from .types import *
+from .transform import Transformer
+from .trace import Trace
+from .interop import as_numpy, as_ndarray
 
-@dataclass
-class FusionOp(Symbol):
+def _numpy(params: ParametersT, sym: Symbol) -> np.ndarray:
+    return as_numpy(params[sym.name])
 
-    params: InitVar[ParametersT]
+def _is_const_clip(sym: Symbol) -> bool:
+    return float(sym.attrs["a_min"]) <= float(sym.attrs["a_max"])
 
-    def __post_init__(self, params):
-        self._fuse_batch_norm()
+class FusionOp(Transformer):
+    """ Fuse operator with its inputs, return None if not fusible. """
 
+    def __call__(self) -> typing.Optional[Symbol]:
+        for fuse in [ self._fuse_batch_norm, self._fuse_bias_add,
+                self._fuse_relu, self._fuse_clip,
+                self._drop_dropout, self._drop_reshape, ]:
+            out = fuse()
+            if out is not None:
+                return out
 
-    @filter_operators("nn.batch_norm")
+    def _param(self, name: str, data: np.ndarray,
+            like: Symbol) -> Symbol:
+        """ create new parameter symbol with data.
+
+            The existing param is reused if it holds the same data,
+                otherwise a numbered suffix is appended to the name,
+                for shared weights or fusing the same trace twice.
+        """
+        data = data.astype(like.dtype)
+        base, i = name, 0
+        while name in self.params:
+            old = as_numpy(self.params[name])
+            if old.dtype == data.dtype and np.array_equal(old, data):
+                break
+            i += 1
+            name = "{}_{}".format(base, i)
+        else:
+            self.params[name] = as_ndarray(data)
+        return Symbol(name, VAR_NAME, [], {
+            "name_hint": name,
+            "shape": list(data.shape),
+            "dtype": like.dtype, })
+
+    @filter_operators(TUPLE_GET_ITEM_NAME)
     def _fuse_batch_norm(self):
+        """ y = conv(x, W * s) + (b * s + beta - mean * s),
+                where s = gamma / sqrt(var + eps).
+        """
+        bn = self.args[0]
+        if not bn.is_op("nn.batch_norm") or self.attrs["index"] != 0:
+            return
+        X, gamma, beta, mean, var = bn.args
+        if not all([is_param(p, self.params) for p in bn.args[1:]]):
+            return
+
+        op, bias = X, None
+        if X.is_op("nn.bias_add") and is_param(X.args[1], self.params):
+            op, bias = X.args[0], X.args[1]
+        if len(op.args) < 2 or not is_param(op.args[1], self.params):
+            return
+        weight = op.args[1]
+
+        axis = int(bn.attrs["axis"]) % len(X.shape)
+        if bias is not None and \
+                int(X.attrs["axis"]) % len(X.shape) != axis:
+            return
+        if op.is_op("nn.conv2d"):
+            if str(op.attrs["data_layout"]) != "NCHW" or \
+                    str(op.attrs["kernel_layout"]) != "OIHW" or \
+                    axis != 1:
+                return
+        elif op.is_op("nn.dense"):
+            if axis != len(X.shape) - 1:
+                return
+        else:
+            return
+
+        var_data = _numpy(self.params, var).astype("float64")
+        scale = 1. / np.sqrt(var_data + float(bn.attrs["epsilon"]))
+        if bool(bn.attrs["scale"]):
+            scale *= _numpy(self.params, gamma)
+        shift = - _numpy(self.params, mean) * scale
+        if bool(bn.attrs["center"]):
+            shift += _numpy(self.params, beta)
+        if bias is not None:
+            shift += _numpy(self.params, bias) * scale
+
+        W = _numpy(self.params, weight)
+        W = W * scale.reshape((-1,) + (1,) * (W.ndim - 1))
+        W = self._param("{}_bn".format(weight.name), W, weight)
+        B = self._param("{}_bn_bias".format(op.name), shift, weight)
+        op = op.clone(name="{}_bn".format(op.name),
+                args=[op.args[0], W] + op.args[2:],
+                attrs={k: v for k, v in op.attrs.items()})
+        return self.clone(op_name="nn.bias_add", args=[op, B],
+                attrs={ "axis": axis,
+                    "shape": self.shape, "dtype": self.dtype, })
+
+    @filter_operators("nn.bias_add")
+    def _fuse_bias_add(self):
+        X, B = self.args
+        if not X.is_op("nn.bias_add") or \
+                int(X.attrs["axis"]) != int(self.attrs["axis"]) or \
+                not is_param(B, self.params) or \
+                not is_param(X.args[1], self.params):
+            return
+        data = _numpy(self.params, X.args[1]) + _numpy(self.params, B)
+        B = self._param("{}_bias".format(self.name), data, B)
+        return self.clone(args=[X.args[0], B])
+
+    @filter_operators("nn.relu")
+    def _fuse_relu(self):
+        X = self.args[0]
+        if X.is_op("nn.relu"):
+            return X
+        if X.is_op("clip") and _is_const_clip(X):
+            # relu(clip(x, a, b)) = clip(x, max(a, 0), max(b, 0))
+            return self.clone(op_name="clip", args=X.args, attrs={
+                "a_min": max(float(X.attrs["a_min"]), 0.),
+                "a_max": max(float(X.attrs["a_max"]), 0.),
+                "shape": self.shape, "dtype": self.dtype, })
+
+    @filter_operators("clip")
+    def _fuse_clip(self):
         X = self.args[0]
-        assert X.is_op("nn.conv2d"), str(self)
-        print(self)
+        a_min, a_max = float(self.attrs["a_min"]), \
+                float(self.attrs["a_max"])
+        if X.is_op("nn.relu"):
+            a_min = max(a_min, 0.)
+        elif X.is_op("clip") and _is_const_clip(X):
+            a_min = max(a_min, float(X.attrs["a_min"]))
+            a_max = min(a_max, float(X.attrs["a_max"]))
+        else:
+            return
+        if a_min > a_max:
+            return
+        return self.clone(args=X.args, attrs={
+            "a_min": a_min, "a_max": a_max,
+            "shape": self.shape, "dtype": self.dtype, })
+
+    @filter_operators(TUPLE_GET_ITEM_NAME)
+    def _drop_dropout(self):
+        X = self.args[0]
+        if X.is_op("nn.dropout") and self.attrs["index"] == 0:
+            return X.args[0]
+
+    @filter_operators("reshape", "squeeze", "nn.batch_flatten")
+    def _drop_reshape(self):
+        X = self.args[0]
+        if list(X.shape) == list(self.shape):
+            return X
+
 
-        return self
+def fuse(tr: Trace) -> Trace:
+    """ Apply FusionOp on trace, with the unused params dropped. """
+    params = ChainMap({}, tr.params)
+    symbol = transform(tr.symbol,
+            lambda sym: FusionOp.apply()(sym, params), tr.graph)
 
+    fused_params = {}
+    def _collect(sym: Symbol):
+        if is_param(sym, params):
+            fused_params[sym.name] = params[sym.name]
+    visit(symbol, _collect)
+    return Trace("fuse", symbol, fused_params)
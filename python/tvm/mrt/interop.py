@@ -0,0 +1,110 @@
+""" Zero-copy Interchange between NumPy and NDArray
+
+    Host tensors cross the NumPy/TVM boundary through DLPack, so
+        the NumPy array and NDArray share one buffer. NDArray
+        requires the data to be contiguous and aligned with
+        `kAllocAlignment`, otherwise the data is copied. Use `empty`
+        to allocate host buffers that can be shared both ways.
+
+    Every conversion is counted, see `copy_stats`.
+"""
+from __future__ import annotations
+
+import typing
+import threading
+
+import numpy as np
+
+import tvm
+from tvm import runtime
+
+ALLOC_ALIGNMENT = 64
+""" kAllocAlignment of NDArray. """
+
+_COPY_STATS = {
+    "numpy_view": 0, "numpy_copy": 0,
+    "ndarray_view": 0, "ndarray_copy": 0,
+    "copy_bytes": 0,
+}
+_COPY_STATS_LOCK = threading.Lock()
+
+def copy_stats() -> typing.Dict[str, int]:
+    """ conversion counts, and total bytes copied. """
+    with _COPY_STATS_LOCK:
+        return dict(_COPY_STATS)
+
+def reset_copy_stats():
+    with _COPY_STATS_LOCK:
+        for k in _COPY_STATS:
+            _COPY_STATS[k] = 0
+
+def record_copy(kind: str, nbytes: int = 0):
+    with _COPY_STATS_LOCK:
+        _COPY_STATS[kind] += 1
+        _COPY_STATS["copy_bytes"] += nbytes
+
+def _is_host(device: runtime.Device) -> bool:
+    return device.device_type == runtime.cpu(0).device_type
+
+def _nbytes(data: tvm.nd.NDArray) -> int:
+    return int(np.prod(data.shape)) * tvm.DataType(data.dtype).bits // 8
+
+def as_numpy(data) -> np.ndarray:
+    """ NumPy view of host NDArray, copy for other devices.
+
+        The view is read-only, write into NDArray with `copyfrom`.
+    """
+    if isinstance(data, np.ndarray):
+        return data
+    if isinstance(data, tvm.nd.NDArray):
+        if _is_host(data.device) and hasattr(np, "from_dlpack"):
+            try:
+                out = np.from_dlpack(data)
+                record_copy("numpy_view")
+                return out
+            except (TypeError, BufferError, RuntimeError):
+                # old numpy or unsupported dtype, such as bool.
+                pass
+        record_copy("numpy_copy", _nbytes(data))
+        return data.numpy()
+    return np.asarray(data)
+
+def is_shareable(data: np.ndarray) -> bool:
+    """ whether NDArray can be created on the buffer without copy. """
+    return data.flags["C_CONTIGUOUS"] and data.flags["WRITEABLE"] \
+            and data.ctypes.data % ALLOC_ALIGNMENT == 0 \
+            and data.dtype.kind in "iuf"
+
+def as_ndarray(data, device: runtime.Device = runtime.cpu(0),
+) -> tvm.nd.NDArray:
+    """ NDArray sharing the host buffer if possible. """
+    if isinstance(data, tvm.nd.NDArray):
+        return data
+    data = np.asarray(data)
+    if _is_host(device) and is_shareable(data):
+        try:
+            out = tvm.nd.from_dlpack(data)
+            record_copy("ndarray_view")
+            return out
+        except (TypeError, BufferError, AttributeError):
+            pass
+    record_copy("ndarray_copy", data.nbytes)
+    return tvm.nd.array(data, device)
+
+def empty(shape, dtype: str = "float32") -> np.ndarray:
+    """ aligned host buffer, shared with NDArray by `as_ndarray`.
+
+        Allocated by numpy instead of viewing `tvm.nd.empty`, since
+            the DLPack views of NDArray are read-only.
+    """
+    dtype = np.dtype(dtype)
+    nbytes = int(np.prod(shape)) * dtype.itemsize
+    raw = np.empty((nbytes + ALLOC_ALIGNMENT,), dtype="uint8")
+    offset = -raw.ctypes.data % ALLOC_ALIGNMENT
+    return raw[offset:offset+nbytes].view(dtype).reshape(shape)
+
+def randn(shape, dtype: str = "float32") -> np.ndarray:
+    """ random normal data in aligned host buffer. """
+    data = empty(shape, dtype)
+    data[...] = np.random.randn(*shape)
+    return data
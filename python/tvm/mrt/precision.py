@@ -0,0 +1,223 @@
+""" Per-layer Precision Search
+
+    The sensitivity of each layer is probed independently: the
+        layer's cached float inputs and weights are fake quantized
+        into each candidate bit width and only that operator is
+        re-executed with `topi`, and its noise to signal ratio
+        against the cached float output is recorded. With the noise
+        approximated as additive across layers, the bit widths are
+        chosen to minimize the cost model under the noise budget.
+
+    The result is a precision map keyed by layer name, which is the
+        `precisions` argument of `transformers.integer_quantize`.
+"""
+from __future__ import annotations
+
+import typing
+from dataclasses import dataclass, field
+
+import numpy as np
+
+import tvm
+
+from .symbol import *
+from .types import *
+from .trace import Trace
+from . import topi
+from .interop import as_numpy
+from .transformers.quantize import PrecisionMapT
+
+SensitivityT = typing.Dict[str, typing.Dict[int, float]]
+CostFnT = typing.Callable[[Symbol, int], float]
+""" cost of layer symbol quantized with bits. """
+
+LAYER_OPS = [ "nn.conv2d", "nn.dense", ]
+
+def layer_symbols(tr: Trace) -> typing.List[Symbol]:
+    """ quantizable layers, with weight in params. """
+    layers = []
+    def _layer(sym: Symbol, params: ParametersT):
+        if sym.op_name in LAYER_OPS and is_param(sym.args[1], params):
+            layers.append(sym)
+    tr.visit(_layer)
+    return layers
+
+def macs(sym: Symbol) -> int:
+    """ multiply-accumulate count of layer. """
+    W = sym.args[1]
+    if sym.is_op("nn.conv2d"):
+        # Cg * KH * KW for each output element.
+        return product(sym.shape) * product(W.shape[1:])
+    if sym.is_op("nn.dense"):
+        return product(sym.shape) * W.shape[-1]
+    raise RuntimeError("unsupported layer: {}".format(sym.op_name))
+
+def mac_bits_cost(sym: Symbol, bits: int) -> float:
+    return float(macs(sym) * bits)
+
+def fake_quantize(data: np.ndarray, bits: int,
+        absmax: float) -> np.ndarray:
+    """ symmetric quantize and dequantize in float. """
+    qmax = 2 ** (bits - 1) - 1
+    scale = qmax / absmax if absmax > 0 else 1.
+    return (np.clip(np.round(data * scale), -qmax, qmax) / scale
+            ).astype(data.dtype)
+
+@dataclass
+class PrecisionSearch:
+    """ Sensitivity probes and cost-aware bit width solver.
+
+        `outputs` is the cached float outputs of calibration, such
+            as the result of `Trace.calibrate`, and the activation
+            ranges default to the absmax of the outputs.
+    """
+    trace: Trace
+    outputs: typing.Dict[str, typing.Any]
+    ranges: typing.Dict[str, float] = field(default_factory=dict)
+    candidates: typing.Sequence[int] = (4, 6, 8, 16)
+    cost_fn: CostFnT = mac_bits_cost
+
+    layers: typing.List[Symbol] = field(init=False)
+    sensitivity: SensitivityT = field(init=False, default_factory=dict)
+
+    def __post_init__(self):
+        self.layers = layer_symbols(self.trace)
+        self.candidates = sorted(set(self.candidates))
+
+    def _absmax(self, name: str) -> float:
+        if name not in self.ranges:
+            self.ranges[name] = float(np.abs(
+                as_numpy(self.outputs[name])).max())
+        return self.ranges[name]
+
+    def probe(self) -> SensitivityT:
+        """ noise to signal ratio of each layer and bit width. """
+        for sym in self.layers:
+            X, W = sym.args[0], sym.args[1]
+            x = as_numpy(self.outputs[X.name])
+            w = as_numpy(self.trace.params[W.name])
+            ref = as_numpy(self.outputs[sym.name]).astype("float64")
+            power = float(np.mean(ref ** 2)) or 1.
+            w_absmax = float(np.abs(w).max())
+
+            self.sensitivity[sym.name] = {}
+            for bits in self.candidates:
+                out = topi.run_op(sym.op_name, [
+                    fake_quantize(x, bits, self._absmax(X.name)),
+                    fake_quantize(w, bits, w_absmax),
+                    ] + [ as_numpy(self.outputs[a.name]) \
+                            for a in sym.args[2:] ],
+                    op_attrs(sym))
+                noise = float(np.mean((out - ref) ** 2))
+                self.sensitivity[sym.name][bits] = noise / power
+        return self.sensitivity
+
+    def _greedy(self, budget: float) -> PrecisionMapT:
+        """ lower the bits with best cost saving per noise.
+
+            Moves that do not increase the noise are always taken
+                first, so the result is within budget whenever the
+                least noisy choice is.
+        """
+        choice = { s.name: len(self.candidates) - 1 \
+                for s in self.layers }
+        noise = sum([ self.sensitivity[s.name][self.candidates[-1]] \
+                for s in self.layers ])
+        while True:
+            best, best_key = None, None
+            for sym in self.layers:
+                i = choice[sym.name]
+                if i == 0:
+                    continue
+                cur, low = self.candidates[i], self.candidates[i-1]
+                d_noise = self.sensitivity[sym.name][low] - \
+                        self.sensitivity[sym.name][cur]
+                d_cost = self.cost_fn(sym, cur) - self.cost_fn(sym, low)
+                if d_noise <= 0:
+                    key = (1, d_cost, -d_noise)
+                elif noise + d_noise > budget:
+                    continue
+                else:
+                    key = (0, d_cost / d_noise, 0.)
+                if best_key is None or key > best_key:
+                    best, best_key = (sym, d_noise), key
+            if best is None:
+                break
+            choice[best[0].name] -= 1
+            noise += best[1]
+        if noise > budget:
+            raise RuntimeError(
+                "noise budget {} is infeasible".format(budget))
+        return { k: self.candidates[i] for k, i in choice.items() }
+
+    def _weight(self, sym: Symbol, bits: int, budget: float,
+            resolution: int) -> int:
+        """ noise discretized in units of budget / resolution. """
+        noise = self.sensitivity[sym.name][bits]
+        if budget <= 0:
+            return 0 if noise <= 0 else resolution + 1
+        return int(np.ceil(noise / budget * resolution))
+
+    def _knapsack(self, budget: float,
+            resolution: int = 1000) -> PrecisionMapT:
+        """ multiple-choice knapsack over the discretized budget. """
+        dp = np.zeros((resolution + 1,), dtype="float64")
+        choices = []
+        for sym in self.layers:
+            new_dp = np.full_like(dp, np.inf)
+            choice = np.zeros((resolution + 1,), dtype="int32")
+            for i, bits in enumerate(self.candidates):
+                w = self._weight(sym, bits, budget, resolution)
+                if w > resolution:
+                    continue
+                cand = np.full_like(dp, np.inf)
+                cand[w:] = dp[:resolution + 1 - w] + \
+                        self.cost_fn(sym, bits)
+                better = cand < new_dp
+                new_dp[better] = cand[better]
+                choice[better] = i
+            dp = new_dp
+            choices.append(choice)
+
+        if not np.isfinite(dp).any():
+            raise RuntimeError(
+                "noise budget {} is infeasible".format(budget))
+        u = int(np.argmin(dp))
+        result = {}
+        for sym, choice in zip(reversed(self.layers), reversed(choices)):
+            bits = self.candidates[choice[u]]
+            result[sym.name] = bits
+            u -= self._weight(sym, bits, budget, resolution)
+        return result
+
+    def solve(self, budget: float,
+            solver: str = "greedy") -> PrecisionMapT:
+        """ precision map minimizing cost with noise <= budget. """
+        if not self.sensitivity:
+            self.probe()
+        if solver == "greedy":
+            return self._greedy(budget)
+        elif solver == "knapsack":
+            return self._knapsack(budget)
+        raise RuntimeError("unknown solver: {}".format(solver))
+
+    def report(self, precisions: PrecisionMapT) -> typing.Dict[str, float]:
+        return {
+            "noise": sum([ self.sensitivity[k][b] \
+                    for k, b in precisions.items() ]),
+            "cost": sum([ self.cost_fn(s, precisions[s.name]) \
+                    for s in self.layers ]),
+        }
+
+def search(tr: Trace, outputs: typing.Dict[str, typing.Any],
+        budget: float, solver: str = "greedy",
+        candidates: typing.Sequence[int] = (4, 6, 8, 16),
+        cost_fn: CostFnT = mac_bits_cost,
+        ranges: typing.Dict[str, float] = {},
+) -> PrecisionMapT:
+    """ Search per-layer bit widths under the noise budget. """
+    searcher = PrecisionSearch(tr, outputs, dict(ranges),
+            candidates=candidates, cost_fn=cost_fn)
+    precisions = searcher.solve(budget, solver)
+    print("precision search: {}".format(searcher.report(precisions)))
+    return precisions
@@ -1,24 +1,35 @@
+from __future__ import annotations
+
 import typing
+import os
+import threading
+import queue
+import time
+from multiprocessing import shared_memory, resource_tracker
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from dataclasses import dataclass, field
 
 import numpy as np
 
 import tvm
 from tvm import relay, ir, runtime
 from tvm.contrib import graph_executor
+from tvm.contrib.popen_pool import PopenPoolExecutor
 from tvm.ir import RelayExpr
 
 from .types import *
 from .dataset import Dataset
 from .stats import Statistics
 from . import symbol
+from .interop import as_numpy
 
-__all__ = ["infer"]
+__all__ = ["infer", "executor_cache_info", "clear_executor_cache"]
 
 def create_executor(
         expr: RelayExpr, params: ParametersT, device=runtime.cpu(0),
-        opt_level=0
+        opt_level=0, target="llvm",
 ) -> relay.build_module.GraphExecutor:
-    target = "llvm"
     with tvm.transform.PassContext(opt_level=opt_level):
         lib = relay.build_module.build(
                 ir.IRModule.from_expr(expr),
@@ -30,83 +41,779 @@ def create_executor(
 
 OutputDataType = typing.List[np.ndarray]
 
+EXECUTOR_CACHE_SIZE = 64
+""" max number of compiled modules kept in executor cache. """
+
+@dataclass
+class _CacheEntry:
+    expr: RelayExpr
+    mod: graph_executor.GraphModule
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+_EXECUTOR_CACHE: "OrderedDict[tuple, _CacheEntry]" = OrderedDict()
+_EXECUTOR_CACHE_LOCK = threading.Lock()
+_EXECUTOR_CACHE_STATS = { "hit": 0, "miss": 0 }
+
+def executor_cache_info() -> typing.Dict[str, int]:
+    """ Return the executor cache hit/miss counters and size. """
+    with _EXECUTOR_CACHE_LOCK:
+        info = dict(_EXECUTOR_CACHE_STATS)
+        info["size"] = len(_EXECUTOR_CACHE)
+    return info
+
+def clear_executor_cache():
+    with _EXECUTOR_CACHE_LOCK:
+        _EXECUTOR_CACHE.clear()
+        _EXECUTOR_CACHE_STATS.update(hit=0, miss=0)
+
+def _get_cached_executor(
+        expr: RelayExpr, params: ParametersT, device, target,
+) -> _CacheEntry:
+    """ Compiled module keyed by expr structure, target and the
+            params' shape and dtype, values are set as inputs.
+
+        Free vars are compared by position, since each call may
+            create new vars, and their names are part of the key
+            for set_input.
+    """
+    free_names = tuple(
+            v.name_hint for v in relay.analysis.free_vars(expr))
+    param_types = tuple(sorted(
+        (k, tuple(v.shape), str(v.dtype)) for k, v in params.items()))
+    key = (tvm.ir.structural_hash(expr, map_free_vars=True),
+            free_names, str(target), str(device), param_types)
+
+    with _EXECUTOR_CACHE_LOCK:
+        entry = _EXECUTOR_CACHE.get(key, None)
+        if entry is not None and tvm.ir.structural_equal(
+                entry.expr, expr, map_free_vars=True):
+            _EXECUTOR_CACHE.move_to_end(key)
+            _EXECUTOR_CACHE_STATS["hit"] += 1
+            return entry
+        _EXECUTOR_CACHE_STATS["miss"] += 1
+
+    # build without params, which are bound via set_input.
+    mod = create_executor(expr, {}, device=device, target=target)
+    entry = _CacheEntry(expr, mod)
+    with _EXECUTOR_CACHE_LOCK:
+        _EXECUTOR_CACHE[key] = entry
+        _EXECUTOR_CACHE.move_to_end(key)
+        while len(_EXECUTOR_CACHE) > EXECUTOR_CACHE_SIZE:
+            _EXECUTOR_CACHE.popitem(last=False)
+    return entry
+
 def infer(expr: RelayExpr, params: ParametersT,
-        device=runtime.cpu(0)) -> OutputDataType:
-    # #  target = "llvm"
-    # target = tvm.target.cuda()
-    # with tvm.transform.PassContext(opt_level=3):
-    #     lib = relay.build_module.build(
-    #             ir.IRModule.from_expr(expr),
-    #             target=target,
-    #             params=params)
-
-    # rt_mod: relay.build_module.GraphExecutor = graph_executor.GraphModule(lib["default"](device))
-    # #  rt_mod.set_input("input", data)
-    # rt_mod.run()
-    # return [rt_mod.get_output(i).numpy() \
-    #         for i in range(rt_mod.get_num_outputs())]
-
-    result = tvm.relay.create_executor(
-        "graph", mod=ir.IRModule.from_expr(expr),
-        device=device, target="llvm",
-    ).evaluate()(**params)
-    return result
-    # if isinstance(result, tvm.runtime.NDArray):
-    #     result = [ result, ]
-    # return [ r.numpy() for r in result ]
+        device=runtime.cpu(0), target="llvm",
+) -> typing.Union[runtime.NDArray, typing.List[runtime.NDArray]]:
+    """ Run expr with compiled module cache.
+
+        The params contain both model parameters and input data,
+            repeated inference with same expr and data shapes will
+            reuse the compiled module. Entries that are not free
+            vars of expr are ignored.
+    """
+    free_names = [ v.name_hint for v in relay.analysis.free_vars(expr) ]
+    params = { k: params[k] for k in free_names if k in params }
+    entry = _get_cached_executor(expr, params, device, target)
+    with entry.lock:
+        mod = entry.mod
+        mod.set_input(**params)
+        mod.run()
+        # copy out, since the module's output storage is reused.
+        result = [ mod.get_output(i).copyto(runtime.cpu(0)) \
+                for i in range(mod.get_num_outputs()) ]
+    return result[0] if len(result) == 1 else result
+
+
+@dataclass
+class CalibrateEngine:
+    """ Whole graph calibration executor.
+
+        The symbol graph is compiled once, with every intermediate
+            symbol exposed as graph output, like the output dump
+            of the debug executor. Calibration batches are then
+            streamed through the single compiled module, instead
+            of building one executor per operator.
+    """
+    symbol: symbol.Symbol
+    params: ParametersT
+    device: runtime.Device = runtime.cpu(0)
+    target: str = "llvm"
+    graph: typing.Optional[symbol.GraphIndex] = None
+
+    input_names: typing.List[str] = field(init=False)
+    output_keys: typing.List[typing.Tuple[str, typing.Optional[int]]] \
+            = field(init=False)
+    """ (symbol name, tuple index) of each graph output. """
+    mod: graph_executor.GraphModule = field(init=False)
+
+    def __post_init__(self):
+        self.graph = self.graph or symbol.GraphIndex(self.symbol)
+
+        expr_map = {}
+        symbol.symbol2expr(self.symbol, expr_map)
+        # symbol2expr removes type attrs, so map by name.
+        expr_map = {s.name: e for s, e in expr_map.items()}
+
+        outputs = []
+        self.input_names = []
+        self.output_keys = []
+        for sym in self.graph:
+            if symbol.is_input(sym, self.params):
+                self.input_names.append(sym.name)
+            if symbol.is_variable(sym) or sym.is_op(symbol.TUPLE_NAME):
+                continue
+
+            expr = expr_map[sym.name]
+            if isinstance(sym.dtype, (list, tuple)):
+                for i in range(len(sym.dtype)):
+                    outputs.append(relay.TupleGetItem(expr, i))
+                    self.output_keys.append((sym.name, i))
+            else:
+                outputs.append(expr)
+                self.output_keys.append((sym.name, None))
+
+        body = relay.Tuple(outputs)
+        func = relay.Function(relay.analysis.free_vars(body), body)
+        self.mod = create_executor(func, self.params,
+                device=self.device, target=self.target)
+
+    def run(self,
+            data: typing.Optional[np.ndarray] = None,
+            data_dict: ParametersT = {},
+    ) -> typing.Dict[str, typing.Union[
+            runtime.NDArray, typing.List[runtime.NDArray]]]:
+        """ Run one batch, return all symbols' outputs by name. """
+        for name in self.input_names:
+            val = data_dict.get(name, data)
+            assert val is not None, "input: {} not set".format(name)
+            self.mod.set_input(name, val)
+        self.mod.run()
+
+        outputs = {}
+        for i, (name, index) in enumerate(self.output_keys):
+            # graph executor reuses output storage, copy it out.
+            out = self.mod.get_output(i).copyto(runtime.cpu(0))
+            if index is None:
+                outputs[name] = out
+            else:
+                outputs.setdefault(name, []).append(out)
+        for sym in self.graph:
+            if sym.is_op(symbol.TUPLE_NAME):
+                outputs[sym.name] = [outputs[a.name] for a in sym.args]
+        return outputs
+
+    def stream(self, dataset: Dataset,
+            max_iter_num: typing.Optional[int] = None,
+    ) -> typing.Iterator[typing.Dict[str, runtime.NDArray]]:
+        """ Stream dataset batches through the compiled module. """
+        i = 0
+        while max_iter_num is None or i < max_iter_num:
+            dl = dataset.next()
+            if dl is None:
+                break
+            yield self.run(dl[0])
+            i += 1
+
+
+def _nbytes(data) -> int:
+    if isinstance(data, (list, tuple)):
+        return sum([_nbytes(d) for d in data])
+    return int(np.prod(data.shape)) * np.dtype(data.dtype).itemsize
+
+def op_expr(sym: symbol.Symbol) -> RelayExpr:
+    """ Single operator expr, with args as variables.
+
+        Tuple args are kept as tuple of variables.
+    """
+    args = []
+    for a in sym.args:
+        if a.is_op(symbol.TUPLE_NAME):
+            a = a.clone(args=[ t.as_parameter() for t in a.args ])
+        else:
+            a = a.as_parameter()
+        args.append(a)
+    return symbol.symbol2expr(sym.clone(args=args))
+
+def op_inputs(sym: symbol.Symbol, outputs: typing.Dict[str, typing.Any],
+) -> ParametersT:
+    """ Input data of `op_expr` from symbols' outputs. """
+    inputs = {}
+    for a in sym.args:
+        if a.is_op(symbol.TUPLE_NAME):
+            inputs.update({ t.name: v \
+                    for t, v in zip(a.args, outputs[a.name]) })
+        else:
+            inputs[a.name] = outputs[a.name]
+    return inputs
+
+@dataclass
+class LivenessExecutor:
+    """ Operator by operator executor with liveness release.
+
+        The last consumer of each symbol is computed from the graph,
+            and intermediate outputs are released as soon as they
+            are dead. Operators are executed via `infer`, so the
+            compiled modules are cached across batches.
+
+        `peak_bytes` records the peak resident bytes of the
+            intermediate outputs in last run, params not included.
+    """
+    symbol: symbol.Symbol
+    params: ParametersT
+    device: runtime.Device = runtime.cpu(0)
+    graph: typing.Optional[symbol.GraphIndex] = None
+
+    last_use: typing.Dict[str, int] = field(init=False)
+    """ topological position of the symbol's last consumer. """
+    peak_bytes: int = field(init=False, default=0)
+    _exprs: typing.Dict[str, RelayExpr] = field(
+            init=False, default_factory=dict)
+
+    def __post_init__(self):
+        self.graph = self.graph or symbol.GraphIndex(self.symbol)
+        pos = {s.name: i for i, s in enumerate(self.graph)}
+        self.last_use = {}
+        for sym in self.graph:
+            self.last_use[sym.name] = max([ pos[c.name] \
+                for c in self.graph.consumers[sym.name]],
+                default=len(self.graph))
+        # graph output is always alive.
+        self.last_use[self.symbol.name] = len(self.graph)
+
+    def _expr(self, sym: symbol.Symbol) -> RelayExpr:
+        if sym.name not in self._exprs:
+            self._exprs[sym.name] = op_expr(sym)
+        return self._exprs[sym.name]
+
+    def _inputs(self, sym: symbol.Symbol, live) -> ParametersT:
+        return op_inputs(sym, live)
+
+    def run(self,
+            data: typing.Optional[np.ndarray] = None,
+            data_dict: ParametersT = {},
+            callback: typing.Optional[typing.Callable[
+                [symbol.Symbol, typing.Any], None]] = None,
+    ):
+        """ Run graph, `callback` is invoked with each symbol's
+                output before it may be released.
+        """
+        live, owned = {}, {}
+        resident, self.peak_bytes = 0, 0
+        for i, sym in enumerate(self.graph):
+            if symbol.is_param(sym, self.params):
+                out = self.params[sym.name]
+            elif symbol.is_input(sym, self.params):
+                out = data_dict.get(sym.name, data)
+                assert out is not None, \
+                        "input: {} not set".format(sym.name)
+            elif sym.is_op(symbol.TUPLE_GET_ITEM_NAME):
+                out = live[sym.args[0].name][sym.attrs["index"]]
+            elif sym.is_op(symbol.TUPLE_NAME):
+                out = [ live[a.name] for a in sym.args ]
+            else:
+                out = infer(self._expr(sym),
+                        self._inputs(sym, live), device=self.device)
+                owned[sym.name] = _nbytes(out)
+                resident += owned[sym.name]
+                self.peak_bytes = max(self.peak_bytes, resident)
+
+            if callback is not None:
+                callback(sym, out)
+            live[sym.name] = out
+
+            for a in sym.args:
+                if self.last_use[a.name] == i and a.name in live:
+                    del live[a.name]
+                    resident -= owned.pop(a.name, 0)
+        return live[self.symbol.name]
+
+
+ShmSpecT = typing.Tuple[str, typing.Tuple[int], str]
+""" shared memory tensor spec: (shm name, shape, dtype). """
+
+def _attach_shm(name: str) -> shared_memory.SharedMemory:
+    shm = shared_memory.SharedMemory(name=name)
+    # the block is owned by creator, don't let resource tracker
+    #   of attaching process unlink it.
+    try:
+        resource_tracker.unregister(shm._name, "shared_memory")
+    except Exception:
+        pass
+    return shm
+
+def _parallel_worker(
+        expr_json: str,
+        inputs: typing.Dict[str, ShmSpecT],
+        outputs: typing.List[ShmSpecT]):
+    """ Run operator in pool worker, tensors in shared memory. """
+    expr = tvm.ir.load_json(expr_json)
+    blocks = []
+    def _view(spec: ShmSpecT) -> np.ndarray:
+        shm = _attach_shm(spec[0])
+        blocks.append(shm)
+        return np.ndarray(spec[1], dtype=spec[2], buffer=shm.buf)
+
+    data = { k: _view(v) for k, v in inputs.items() }
+    result = infer(expr, data)
+    if not isinstance(result, (list, tuple)):
+        result = [ result, ]
+    assert len(result) == len(outputs)
+    for out, spec in zip(result, outputs):
+        _view(spec)[...] = as_numpy(out)
+
+    # release views before closing the blocks.
+    del data, _view
+    for shm in blocks:
+        shm.close()
+
+@dataclass
+class ParallelExecutor:
+    """ Execute independent operators concurrently in process pool.
+
+        Ready symbols of graph are scheduled to the workers of
+            `PopenPoolExecutor` once their inputs are computed.
+            Tensors are passed by shared memory blocks instead of
+            pickling, and blocks are unlinked once all consumers
+            are done. Each worker caches the compiled operators
+            via `infer`.
 
+        Params are published into shared memory once at creation,
+            only the inputs are copied per batch. Use `close` or the
+            with statement to stop the workers and free the params.
+    """
+    symbol: symbol.Symbol
+    params: ParametersT
+    num_workers: int = 0
+    graph: typing.Optional[symbol.GraphIndex] = None
+    timeout: typing.Optional[float] = None
+
+    pool: PopenPoolExecutor = field(init=False, repr=False)
+    _exprs: typing.Dict[str, str] = field(
+            init=False, default_factory=dict)
+    _param_shms: typing.Dict[str, shared_memory.SharedMemory] = \
+            field(init=False, default_factory=dict, repr=False)
+    _param_specs: typing.Dict[str, ShmSpecT] = \
+            field(init=False, default_factory=dict, repr=False)
+
+    def __post_init__(self):
+        self.graph = self.graph or symbol.GraphIndex(self.symbol)
+        self.num_workers = self.num_workers or os.cpu_count()
+        try:
+            for sym in self.graph:
+                if symbol.is_param(sym, self.params):
+                    self._publish_param(sym.name)
+        except BaseException:
+            self._free_params()
+            raise
+        self.pool = PopenPoolExecutor(
+                max_workers=self.num_workers, timeout=self.timeout)
+
+    def _publish_param(self, name: str):
+        val = as_numpy(self.params[name])
+        shm = shared_memory.SharedMemory(create=True,
+                size=max(val.nbytes, 1))
+        self._param_shms[shm.name] = shm
+        spec = (shm.name, tuple(val.shape), str(val.dtype))
+        np.ndarray(spec[1], dtype=spec[2], buffer=shm.buf)[...] = val
+        self._param_specs[name] = spec
+
+    def _free_params(self):
+        for shm in self._param_shms.values():
+            shm.close()
+            shm.unlink()
+        self._param_shms.clear()
+        self._param_specs.clear()
+
+    def close(self):
+        """ Stop the pool workers and unlink the params. """
+        if getattr(self, "pool", None) is not None:
+            self.pool.shutdown()
+            self.pool = None
+        self._free_params()
+
+    def __enter__(self) -> ParallelExecutor:
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _expr_json(self, sym: symbol.Symbol) -> str:
+        if sym.name not in self._exprs:
+            self._exprs[sym.name] = tvm.ir.save_json(op_expr(sym))
+        return self._exprs[sym.name]
+
+    def run(self,
+            data: typing.Optional[np.ndarray] = None,
+            data_dict: ParametersT = {},
+    ) -> typing.Dict[str, typing.Union[
+            np.ndarray, typing.List[np.ndarray]]]:
+        """ Run one batch, return all operators' outputs by name. """
+        assert self.pool is not None, "executor is closed"
+        shms: typing.Dict[str, shared_memory.SharedMemory] = {}
+        blocks: typing.Dict[str, typing.List[str]] = {}
+        """ symbol name to the owned shared memory names. """
+        specs: typing.Dict[str, typing.Any] = {}
+        owners: typing.Dict[str, typing.List[str]] = {}
+        """ symbol name to the symbols owning its blocks. """
+        refs: typing.Dict[str, int] = {}
+
+        def _alloc(name, shape, dtype) -> ShmSpecT:
+            size = max(int(np.prod(shape)) * np.dtype(dtype).itemsize, 1)
+            shm = shared_memory.SharedMemory(create=True, size=size)
+            shms[shm.name] = shm
+            blocks.setdefault(name, []).append(shm.name)
+            return (shm.name, tuple(shape), dtype)
+
+        def _view(spec: ShmSpecT) -> np.ndarray:
+            shm = shms.get(spec[0]) or self._param_shms[spec[0]]
+            return np.ndarray(spec[1], dtype=spec[2], buffer=shm.buf)
+
+        def _release(name):
+            for shm_name in blocks.pop(name, []):
+                shm = shms.pop(shm_name)
+                shm.close()
+                shm.unlink()
+
+        def _consume(sym: symbol.Symbol):
+            for a in sym.args:
+                for o in owners[a.name]:
+                    refs[o] -= 1
+                    if refs[o] == 0:
+                        _release(o)
+
+        consumers = self.graph.consumers
+        pending = { s.name: len(s.args) for s in self.graph }
+        ready = deque()
+        outputs = {}
+
+        def _finish(sym: symbol.Symbol):
+            _consume(sym)
+            for c in consumers[sym.name]:
+                pending[c.name] -= 1
+                if pending[c.name] == 0:
+                    ready.append(c)
+
+        running = {}
+        try:
+            for sym in self.graph:
+                if not symbol.is_variable(sym):
+                    if not sym.args:
+                        ready.append(sym)
+                    continue
+                if sym.name in self._param_specs:
+                    # published once, never released per batch.
+                    specs[sym.name] = self._param_specs[sym.name]
+                    owners[sym.name] = []
+                    continue
+                val = data_dict.get(sym.name, data)
+                assert val is not None, \
+                        "input: {} not set".format(sym.name)
+                val = as_numpy(val)
+                specs[sym.name] = _alloc(
+                        sym.name, val.shape, str(val.dtype))
+                _view(specs[sym.name])[...] = val
+                owners[sym.name] = [ sym.name ]
+                refs[sym.name] = len(consumers[sym.name])
+            for sym in self.graph:
+                if symbol.is_variable(sym):
+                    _finish(sym)
+
+            while ready or running:
+                while ready:
+                    sym = ready.popleft()
+                    if sym.is_op(symbol.TUPLE_GET_ITEM_NAME) or \
+                            sym.is_op(symbol.TUPLE_NAME):
+                        arg_specs = [ specs[a.name] for a in sym.args ]
+                        specs[sym.name] = \
+                            arg_specs[0][sym.attrs["index"]] \
+                            if sym.is_op(symbol.TUPLE_GET_ITEM_NAME) \
+                            else arg_specs
+                        owners[sym.name] = list(set(sum(
+                            [owners[a.name] for a in sym.args], [])))
+                        for o in owners[sym.name]:
+                            refs[o] += len(consumers[sym.name])
+                        _finish(sym)
+                        continue
+
+                    if isinstance(sym.dtype, (list, tuple)):
+                        out_specs = [ _alloc(sym.name, s, d) \
+                                for s, d in zip(sym.shape, sym.dtype) ]
+                        specs[sym.name] = out_specs
+                    else:
+                        out_specs = [ _alloc(
+                            sym.name, sym.shape, sym.dtype) ]
+                        specs[sym.name] = out_specs[0]
+                    owners[sym.name] = [ sym.name ]
+                    refs[sym.name] = len(consumers[sym.name])
+
+                    inputs = op_inputs(sym, specs)
+                    future = self.pool.submit(_parallel_worker,
+                            self._expr_json(sym), inputs, out_specs)
+                    running[future] = (sym, out_specs)
+
+                if not running:
+                    break
+                finished, _ = wait(list(running.keys()),
+                        return_when=FIRST_COMPLETED)
+                for future in finished:
+                    sym, out_specs = running.pop(future)
+                    future.result()
+                    out = [ np.array(_view(spec)) for spec in out_specs ]
+                    outputs[sym.name] = out if isinstance(
+                            sym.dtype, (list, tuple)) else out[0]
+                    _finish(sym)
+        finally:
+            for future in running:
+                future.cancel()
+            for name in list(blocks.keys()):
+                _release(name)
+
+        for sym in self.graph:
+            if sym.is_op(symbol.TUPLE_GET_ITEM_NAME):
+                outputs[sym.name] = outputs[sym.args[0].name][
+                        sym.attrs["index"]]
+            elif sym.is_op(symbol.TUPLE_NAME):
+                outputs[sym.name] = [ outputs[a.name] for a in sym.args ]
+        return outputs
+
+
+@dataclass
+class _ValidateModule:
+    """ Compiled module with preallocated outputs. """
+    mod: graph_executor.GraphModule
+    outputs: typing.List[runtime.NDArray]
+
+    @staticmethod
+    def build(expr: RelayExpr, params: ParametersT,
+            device, opt_level, target) -> _ValidateModule:
+        mod = create_executor(expr, params, device=device,
+                opt_level=opt_level, target=target)
+        outputs = []
+        for i in range(mod.get_num_outputs()):
+            out = mod.get_output(i)
+            outputs.append(tvm.nd.empty(out.shape, out.dtype, device))
+        return _ValidateModule(mod, outputs)
+
+    def run(self, inputs: typing.Dict[str, np.ndarray],
+    ) -> typing.List[np.ndarray]:
+        for k, v in inputs.items():
+            self.mod.set_input(k, v)
+        self.mod.run()
+        for i, out in enumerate(self.outputs):
+            self.mod.get_output(i, out)
+        return [ out.numpy() for out in self.outputs ]
 
 def validator(expr: RelayExpr, params: ParametersT, name: str,
-        device=runtime.cpu(0), ):
-    target = "llvm"
-    with tvm.transform.PassContext(opt_level=3):
-        lib = relay.build_module.build(
-                ir.IRModule.from_expr(expr),
-                target=target,
-                params=params)
-    mod: relay.build_module.GraphExecutor = graph_executor.GraphModule(lib["default"](device))
+        device=runtime.cpu(0), opt_level=3, target="llvm",
+        remainder: str = "pad",
+) -> ValidateFunctionT:
+    """ Create validate function of expr with any batch size.
+
+        The data of DataLabelT can be an array for single input, or
+            a list/dict of arrays for multiple inputs. Batches larger
+            than the compiled batch are split into chunks, and the
+            remainder smaller batch is either zero padded, or run
+            by another module compiled for that batch size when
+            `remainder` is "module".
+
+        The output is an array for single output model, or a list
+            of arrays for multiple outputs.
+    """
+    assert remainder in ["pad", "module"], remainder
+    input_vars = [ v for v in relay.analysis.free_vars(expr) \
+            if v.name_hint not in params ]
+    assert input_vars, "no input in expr"
+    input_names = [ v.name_hint for v in input_vars ]
+    input_shapes = [ list(v.type_annotation.concrete_shape) \
+            for v in input_vars ]
+    input_dtypes = [ v.type_annotation.dtype for v in input_vars ]
+    batch = input_shapes[0][0]
 
-    input_names = []
-    for v in relay.analysis.free_vars(expr):
-        if v.name_hint not in params:
-            input_names.append(v.name_hint)
+    modules = { batch: _ValidateModule.build(
+        expr, params, device, opt_level, target) }
+    # preallocated padding buffers.
+    pad_buffers = [ np.zeros(s, dtype=d) \
+            for s, d in zip(input_shapes, input_dtypes) ]
 
-    assert len(input_names) == 1
-    assert mod.get_num_outputs() == 1
-    input_name = input_names[0]
+    def _module(size: int) -> _ValidateModule:
+        if size not in modules:
+            binds = { v: relay.var(v.name_hint,
+                shape=[size] + s[1:], dtype=d) \
+                    for v, s, d in zip(
+                        input_vars, input_shapes, input_dtypes) }
+            modules[size] = _ValidateModule.build(
+                    relay.bind(expr, binds), params,
+                    device, opt_level, target)
+        return modules[size]
+
+    def _inputs(data) -> typing.List[np.ndarray]:
+        if isinstance(data, dict):
+            return [ np.asarray(data[n]) for n in input_names ]
+        if isinstance(data, (list, tuple)):
+            assert len(data) == len(input_names)
+            return [ np.asarray(d) for d in data ]
+        assert len(input_names) == 1, \
+            "multiple inputs: {}".format(input_names)
+        return [ np.asarray(data) ]
+
+    def _run_chunk(datas: typing.List[np.ndarray]):
+        size = datas[0].shape[0]
+        if size == batch:
+            return modules[batch].run(dict(zip(input_names, datas)))
+        if remainder == "module":
+            return _module(size).run(dict(zip(input_names, datas)))
+        for buf, d in zip(pad_buffers, datas):
+            buf[:size] = d
+            buf[size:] = 0
+        outs = modules[batch].run(dict(zip(input_names, pad_buffers)))
+        return [ o[:size] for o in outs ]
 
     def _run(dl: DataLabelT) -> DataLabelT:
         data, label = dl
-        mod.set_input(input_name, dl)
-        mod.run()
-        return mod.get_output(0).numpy, dl
+        datas = _inputs(data)
+        total = datas[0].shape[0]
+        chunks = [ _run_chunk([ d[i:i+batch] for d in datas ]) \
+                for i in range(0, total, batch) ]
+        outs = chunks[0] if len(chunks) == 1 else \
+                [ np.concatenate(o) for o in zip(*chunks) ]
+        return (outs[0] if len(outs) == 1 else outs), label
     _run.__name__ = name
     return _run
 
 
 ValidateFunctionT = typing.Callable[[DataLabelT], DataLabelT]
 
+@dataclass
+class _StageTimer:
+    """ Accumulated busy time and processed images of stage. """
+    name: str
+    seconds: float = 0.
+    images: int = 0
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def add(self, seconds: float, images: int):
+        with self.lock:
+            self.seconds += seconds
+            self.images += images
+
+    def info(self) -> str:
+        rate = self.images / self.seconds if self.seconds > 0 else 0.
+        return "{}: {:.2f} images/s".format(self.name, rate)
+
+def _batch_size(dl: DataLabelT) -> int:
+    data = dl[0]
+    return data.shape[0] if hasattr(data, "shape") else len(data)
+
 def multiple_validate(
         base_func: ValidateFunctionT,
         dataset: Dataset, stats_type: typing.Type[Statistics],
         *comp_funcs: typing.List[ValidateFunctionT],
         max_iter_num: typing.Optional[int] = None,
+        prefetch: int = 4,
+        max_inflight: int = 2,
 ):
+    """ Pipelined validation of multiple functions.
+
+        A loader thread prefetches at most `prefetch` batches from
+            dataset into a bounded queue, and each function runs
+            with its own statistics on a separate single-thread
+            executor, so loading, inference of the compared
+            functions and statistics merge overlap. At most
+            `max_inflight` batches are in flight, iteration logs
+            are printed in order.
+    """
     all_funcs = [ base_func, ] + list(comp_funcs)
     all_stats = [stats_type() for _ in all_funcs]
 
     log_str = "Iteration: {:3d} | "
     for func in all_funcs:
         log_str += func.__name__ + ": {} | "
-    for i in range(max_iter_num):
-        dl = dataset.next()
-        if dl is None:
-            break
-        for func, stats in zip(all_funcs, all_stats):
-            out_dl = func(dl)
-            stats.merge(out_dl)
-        msg = log_str.format(i, *[s.info() for s in all_stats])
-        print(msg)
 
-    print("Multiple Validation Done!")
+    load_timer = _StageTimer("loader")
+    func_timers = [_StageTimer(f.__name__) for f in all_funcs]
+    merge_timers = [_StageTimer(f.__name__ + ".merge") \
+            for f in all_funcs]
+
+    dl_queue = queue.Queue(maxsize=max(prefetch, 1))
+    stop_event = threading.Event()
+    def _put(item) -> bool:
+        while not stop_event.is_set():
+            try:
+                dl_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _load():
+        i = 0
+        try:
+            while max_iter_num is None or i < max_iter_num:
+                start = time.perf_counter()
+                dl = dataset.next()
+                if dl is None:
+                    break
+                load_timer.add(time.perf_counter() - start,
+                        _batch_size(dl))
+                if not _put(dl):
+                    return
+                i += 1
+        except Exception as e:
+            _put(e)
+            return
+        _put(None)
+    loader = threading.Thread(target=_load,
+            name="mrt-validate-loader", daemon=True)
+
+    def _run(func, stats, func_timer, merge_timer, dl):
+        batch = _batch_size(dl)
+        start = time.perf_counter()
+        out_dl = func(dl)
+        func_timer.add(time.perf_counter() - start, batch)
 
+        start = time.perf_counter()
+        stats.merge(out_dl)
+        info = stats.info()
+        merge_timer.add(time.perf_counter() - start, batch)
+        return info
+
+    executors = [ ThreadPoolExecutor(max_workers=1,
+        thread_name_prefix="mrt-validate-" + f.__name__) \
+                for f in all_funcs ]
+
+    def _log(i, futures):
+        print(log_str.format(i, *[f.result() for f in futures]))
+
+    total_start = time.perf_counter()
+    pending = deque()
+    loader.start()
+    try:
+        i = 0
+        while True:
+            dl = dl_queue.get()
+            if dl is None:
+                break
+            if isinstance(dl, Exception):
+                raise dl
+            pending.append((i, [ ex.submit(_run, *args, dl) \
+                    for ex, *args in zip(executors, all_funcs,
+                        all_stats, func_timers, merge_timers) ]))
+            while len(pending) >= max(max_inflight, 1):
+                _log(*pending.popleft())
+            i += 1
+        while pending:
+            _log(*pending.popleft())
+    finally:
+        stop_event.set()
+        for ex in executors:
+            ex.shutdown(wait=True)
+    total_time = time.perf_counter() - total_start
+
+    images = func_timers[0].images
+    print("Multiple Validation Done!")
+    print("Throughput | total: {:.2f} images/s | {} | {} | {}".format(
+        images / total_time if total_time > 0 else 0.,
+        load_timer.info(),
+        " | ".join([t.info() for t in func_timers]),
+        " | ".join([t.info() for t in merge_timers])))
@@ -0,0 +1,161 @@
+""" Trace Serialization
+
+    The symbol graph is dumped into json, and the params into the
+        `runtime.save_param_dict` binary format. Params file is
+        opened with mmap and each NDArray is loaded on first access,
+        so resuming a quantization pipeline only reads the weights
+        actually used.
+"""
+from __future__ import annotations
+
+import typing
+import json
+import mmap
+import struct
+from collections.abc import Mapping
+
+import numpy as np
+
+import tvm
+from tvm import runtime
+
+from .symbol import *
+from .types import *
+from .interop import as_ndarray
+
+_NDARRAY_LIST_MAGIC = 0xF7E58D4F05049CB7
+_NDARRAY_MAGIC = 0xDD5E40F096B4A13F
+
+_DLPACK_TYPE_CODES = { 0: "int", 1: "uint", 2: "float", }
+
+def _attr_to_json(val: typing.Any) -> typing.Any:
+    if val is None or isinstance(val, (bool, int, float, str)):
+        return val
+    if isinstance(val, (tvm.tir.IntImm, tvm.tir.FloatImm)):
+        return val.value
+    if isinstance(val, (list, tuple, tvm.ir.container.Array)):
+        return [ _attr_to_json(v) for v in val ]
+    if isinstance(val, (dict, tvm.ir.container.Map)):
+        return { str(k): _attr_to_json(v) for k, v in val.items() }
+    if isinstance(val, np.ndarray):
+        return val.tolist()
+    if isinstance(val, np.generic):
+        return val.item()
+    # String, DataType and other printable objects.
+    return str(val)
+
+def symbol_to_json(symbol: Symbol,
+        graph: typing.Optional[GraphIndex] = None) -> typing.List[dict]:
+    """ Symbols in topological order, args referred by name. """
+    nodes = []
+    def _cast(sym: Symbol):
+        nodes.append({
+            "name": sym.name,
+            "op_name": sym.op_name,
+            "args": [ a.name for a in sym.args ],
+            "attrs": { k: _attr_to_json(v) \
+                    for k, v in sym.attrs.items() },
+        })
+    visit(symbol, _cast, graph)
+    return nodes
+
+def symbol_from_json(nodes: typing.List[dict]) -> Symbol:
+    sym_map: typing.Dict[str, Symbol] = {}
+    for node in nodes:
+        sym_map[node["name"]] = Symbol(
+                node["name"], node["op_name"],
+                [ sym_map[a] for a in node["args"] ],
+                dict(node["attrs"]))
+    return sym_map[nodes[-1]["name"]]
+
+def save_params(fname: str, params: ParametersT):
+    with open(fname, "wb") as f:
+        f.write(runtime.save_param_dict(
+            {k: v for k, v in params.items()}))
+
+class LazyParams(Mapping):
+    """ Params of `runtime.save_param_dict` format loaded lazily.
+
+        The file is memory mapped and only the array headers are
+            parsed while opening. Each NDArray is created on first
+            access and then cached.
+    """
+    def __init__(self, fname: str):
+        self.fname = fname
+        with open(fname, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._entries: typing.Dict[str, typing.Tuple[
+            int, typing.Tuple[int], str]] = {}
+        self._cache: typing.Dict[str, tvm.nd.NDArray] = {}
+        self._parse()
+
+    def _parse(self):
+        buf, offset = self._mmap, 0
+        def _read(fmt):
+            nonlocal offset
+            vals = struct.unpack_from("<" + fmt, buf, offset)
+            offset += struct.calcsize("<" + fmt)
+            return vals
+
+        header, _ = _read("QQ")
+        assert header == _NDARRAY_LIST_MAGIC, \
+                "invalid params file: {}".format(self.fname)
+        names = []
+        for _ in range(_read("Q")[0]):
+            size = _read("Q")[0]
+            names.append(bytes(buf[offset:offset+size]).decode())
+            offset += size
+        assert _read("Q")[0] == len(names), \
+                "invalid params file: {}".format(self.fname)
+
+        for name in names:
+            header, _ = _read("QQ")
+            assert header == _NDARRAY_MAGIC, \
+                    "invalid ndarray: {} in {}".format(name, self.fname)
+            _read("ii") # device, always saved as cpu
+            ndim = _read("i")[0]
+            code, bits, lanes = _read("BBH")
+            shape = _read("q" * ndim) if ndim else ()
+            nbytes = _read("q")[0]
+            if code == 1 and bits == 1:
+                dtype = "bool"
+            elif code in _DLPACK_TYPE_CODES and lanes == 1:
+                dtype = "{}{}".format(_DLPACK_TYPE_CODES[code], bits)
+            else:
+                raise TypeError("unsupported dtype of {}: {}".format(
+                    name, (code, bits, lanes)))
+            self._entries[name] = (offset, tuple(shape), dtype)
+            offset += nbytes
+
+    def shape_of(self, name: str) -> typing.Tuple[int]:
+        return self._entries[name][1]
+
+    def dtype_of(self, name: str) -> str:
+        return self._entries[name][2]
+
+    def numpy(self, name: str) -> np.ndarray:
+        """ zero-copy read-only view of the mapped file. """
+        offset, shape, dtype = self._entries[name]
+        count = int(np.prod(shape)) if shape else 1
+        return np.frombuffer(self._mmap, dtype=dtype,
+                count=count, offset=offset).reshape(shape)
+
+    def __getitem__(self, name: str) -> tvm.nd.NDArray:
+        if name not in self._cache:
+            if name not in self._entries:
+                raise KeyError(name)
+            self._cache[name] = as_ndarray(self.numpy(name))
+        return self._cache[name]
+
+    def __contains__(self, name) -> bool:
+        return name in self._entries
+
+    def __iter__(self):
+        return iter(self._entries)
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def loaded(self) -> typing.List[str]:
+        return list(self._cache.keys())
@@ -1,3 +1,5 @@
+from __future__ import annotations
+
 from os import path
 import enum
 
@@ -39,18 +41,32 @@ class Statistics:
         """ return current DataLabel information. """
         raise RuntimeError("Accuracy Type Error")
 
+    def reduce(self, other: Statistics) -> Statistics:
+        """ reduce other statistic status into self. """
+        raise RuntimeError("Accuracy Type Error")
+
 
 class ClassificationOutput(Statistics):
-    def __init__(self):
+    """ Top-k accuracy of classification output.
+
+        The top-k indexes are computed with `np.argpartition`
+            over the whole batch. Set `debug` to capture the raw
+            output values of top-k for `dl_info`.
+    """
+    topk = 5
+
+    def __init__(self, debug: bool = False):
+        self.debug = debug
         self.num_classes = None
         self.data, self.label = None, None
+        self.batch = 0
 
         self.top1_hit = 0
         self.top5_hit = 0
         self.dl_total = 0
 
-        self.dl_top1, self.top1_raw = [], []
-        self.dl_top5, self.top5_raw = [], []
+        self.dl_top1, self.top1_raw = None, None
+        self.dl_top5, self.top5_raw = None, None
 
     def reset(self):
         self.top1_hit = 0
@@ -59,14 +75,7 @@ class ClassificationOutput(Statistics):
 
     def merge(self, dl: DataLabelT):
         data, label = dl
-        self.argsort = [ np.argsort(d).tolist() for d in data]
-
-        self.dl_top1 = [a[-1] for a in self.argsort]
-        self.dl_top5 = [a[-5:] for a in self.argsort]
-        self.top1_raw = [ data[i][b] \
-                for i, b in enumerate(self.dl_top1) ]
-        self.top5_raw = [ [data[i][a] for a in b] \
-                for i, b in enumerate(self.dl_top5) ]
+        data, label = np.asarray(data), np.asarray(label)
 
         assert len(data.shape) == 2
         self.batch = data.shape[0]
@@ -77,13 +86,32 @@ class ClassificationOutput(Statistics):
         else:
             assert self.num_classes == data.shape[1]
 
-        label = label.tolist()
+        k = min(self.topk, self.num_classes)
+        topk = np.argpartition(data, -k, axis=1)[:, -k:]
+        # sort top-k in ascending order, the last is top1.
+        topk_raw = np.take_along_axis(data, topk, axis=1)
+        order = np.argsort(topk_raw, axis=1)
+        self.dl_top5 = np.take_along_axis(topk, order, axis=1)
+        self.dl_top1 = self.dl_top5[:, -1]
+        if self.debug:
+            self.top5_raw = np.take_along_axis(topk_raw, order, axis=1)
+            self.top1_raw = self.top5_raw[:, -1]
+
+        label = label.astype("int64")
         self.dl_total += self.batch
-        for d, l in zip(self.dl_top1, label):
-            self.top1_hit += (d == int(l))
+        self.top1_hit += int(np.count_nonzero(self.dl_top1 == label))
+        self.top5_hit += int(np.count_nonzero(
+            (self.dl_top5 == label[:, None]).any(axis=1)))
 
-        for d, l in zip(self.dl_top5, label):
-            self.top5_hit += (int(l) in d)
+    def reduce(self, other: ClassificationOutput) -> ClassificationOutput:
+        if self.num_classes is None:
+            self.num_classes = other.num_classes
+        elif other.num_classes is not None:
+            assert self.num_classes == other.num_classes
+        self.top1_hit += other.top1_hit
+        self.top5_hit += other.top5_hit
+        self.dl_total += other.dl_total
+        return self
 
     def dl_info(self):
         print("=" * 50)
@@ -92,12 +120,14 @@ class ClassificationOutput(Statistics):
         top1, top1_raw = self.dl_top1, self.top1_raw
         top5, top5_raw = self.dl_top5, self.top5_raw
         for i in range(self.batch):
+            if not self.debug:
+                print("{:5} Top1: {:3} | Top5: {}".format(
+                    i, top1[i], top5[i].tolist()))
+                continue
             print("{:5} Top1: {:3} | Raw: {}".format(
                 i, top1[i], top1_raw[i]))
             print("{:5} Top5: {} | Raw: {}".format(
-                i, top5[i], top5_raw[i]))
-            # print("{:5} Top1: {:3} | Top5: {}".format(
-            #     i, top1[i], top5[i]))
+                i, top5[i].tolist(), top5_raw[i].tolist()))
         print("=" * 50)
 
     def info(self):
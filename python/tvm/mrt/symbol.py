@@ -1,8 +1,9 @@
 from __future__ import annotations
 import typing
 
-from dataclasses import dataclass, fields, is_dataclass
-from functools import wraps
+from dataclasses import dataclass, field, fields, is_dataclass, \
+        Field, MISSING
+from functools import wraps, lru_cache
 import json
 
 import tvm
@@ -27,6 +28,15 @@ VAR_NAME = "var"
 TUPLE_GET_ITEM_NAME = "TupleGetItem"
 TUPLE_NAME = "Tuple"
 
+DTYPE_ATTR_OPS = [ "cast", "zeros", "ones", "full", "arange", ]
+""" operators with the output dtype in relay attrs. """
+
+def op_attrs(symbol: Symbol) -> AttrsT:
+    """ operator attrs without the symbol's type info. """
+    return { k: v for k, v in symbol.attrs.items() \
+            if k != "shape" and (k != "dtype" or \
+                symbol.op_name in DTYPE_ATTR_OPS) }
+
 def is_operator(symbol: Symbol, params: ParametersT = {}):
     return symbol.op_name != VAR_NAME
 
@@ -41,6 +51,10 @@ def is_param(symbol: Symbol, params: ParametersT):
 
 _CopyAttrsT = typing.Union[typing.List[str], str]
 
+@lru_cache(maxsize=None)
+def _field_names(cls) -> typing.Tuple[str]:
+    return tuple([f.name for f in fields(cls)])
+
 @dataclass
 class Symbol:
     """ Uniform Symbol Representation for RelayExpr
@@ -64,7 +78,9 @@ class Symbol:
     attrs: typing.Dict[str, typing.Any]
 
     def __hash__(self) -> int:
-        return hash(str(self))
+        # symbol name is unique in graph, and stable across clones,
+        #   which avoids the expensive attrs formatting.
+        return hash(self.name)
 
     @staticmethod
     def variable(name):
@@ -88,8 +104,9 @@ class Symbol:
         assert is_dataclass(cls)
 
         data = {}
-        for k in [f.name for f in fields(cls)]:
-            if k in [f.name for f in fields(self)]:
+        self_fields = _field_names(type(self))
+        for k in _field_names(cls):
+            if k in self_fields:
                 data[k] = getattr(self, k)
         data.update(kw)
 
@@ -110,7 +127,14 @@ class Symbol:
         return self.attrs["dtype"]
 
     def __eq__(self, other: Symbol):
-        return self.args == other.args and hash(self) == hash(other)
+        if self is other:
+            return True
+        if not isinstance(other, Symbol):
+            return False
+        return self.name == other.name \
+                and self.op_name == other.op_name \
+                and self.args == other.args \
+                and str(self.attrs) == str(other.attrs)
 
     def __str__(self):
         args_info= ["{}@{}".format(
@@ -122,12 +146,69 @@ class Symbol:
             self.attrs)
 
 
-def _topo_sort(symbol: Symbol, sym_list: typing.List[Symbol]):
-    if sym_list.count(symbol) > 0:
-        return
-    for c in symbol.args:
-        _topo_sort(c, sym_list)
-    sym_list.append(symbol)
+def sym2list(symbol: Symbol) -> typing.List[Symbol]:
+    """ Iterative topological sort of symbol graph.
+
+        Symbols are deduplicated by name, the order is the same
+            as post-order depth first search of args.
+    """
+    sym_list: typing.List[Symbol] = []
+    visited = set()
+    stack = [ (symbol, False), ]
+    while stack:
+        sym, expanded = stack.pop()
+        if expanded:
+            sym_list.append(sym)
+            continue
+        if sym.name in visited:
+            continue
+        visited.add(sym.name)
+        stack.append((sym, True))
+        for c in reversed(sym.args):
+            if c.name not in visited:
+                stack.append((c, False))
+    return sym_list
+
+@dataclass
+class GraphIndex:
+    """ Cached graph information for symbol.
+
+        The index is only valid for the graph structure while
+            creation, and should be rebuilt after the symbol's
+            args have been modified. Transform pass always
+            creates new symbols, so the index of the original
+            graph can be reused until then.
+    """
+    symbol: Symbol
+
+    sym_list: typing.List[Symbol] = field(init=False)
+    """ symbols in topological order. """
+    sym_map: typing.Dict[str, Symbol] = field(init=False)
+    """ symbol name to symbol map. """
+    consumers: typing.Dict[str, typing.List[Symbol]] = field(init=False)
+    """ symbol name to the symbols use it as input. """
+
+    def __post_init__(self):
+        self.sym_list = sym2list(self.symbol)
+        self.sym_map = {}
+        self.consumers = {}
+        for sym in self.sym_list:
+            self.sym_map[sym.name] = sym
+            self.consumers[sym.name] = []
+            for c in sym.args:
+                self.consumers[c.name].append(sym)
+
+    def __len__(self):
+        return len(self.sym_list)
+
+    def __iter__(self):
+        return iter(self.sym_list)
+
+    def __getitem__(self, name: str) -> Symbol:
+        return self.sym_map[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.sym_map
 
 _VisitorT = typing.Callable[[Symbol], None]
 _TransformerT = typing.Callable[[Symbol], typing.Optional[Symbol]]
@@ -137,32 +218,77 @@ _TransformerT = typing.Callable[[Symbol], typing.Optional[Symbol]]
         or just return None for symbol visit.
 """
 
-def visit(symbol: Symbol, callback: _VisitorT):
+def _sym_list(symbol: Symbol, graph: typing.Optional[GraphIndex]):
+    if graph is None:
+        return sym2list(symbol)
+    assert graph.symbol is symbol, (
+        "graph index mismatch with symbol: {}").format(symbol.name)
+    return graph.sym_list
+
+def visit(symbol: Symbol, callback: _VisitorT,
+        graph: typing.Optional[GraphIndex] = None):
     """ Visitor mode, possible modify symbol itself. """
-    sym_list: typing.List[Symbol] = []
-    _topo_sort(symbol, sym_list)
-    for sym in sym_list:
+    for sym in _sym_list(symbol, graph):
         callback(sym)
 
 
-def transform(symbol: Symbol, callback: _TransformerT) -> Symbol:
+def _field_default(f: Field) -> typing.Any:
+    if f.default_factory is not MISSING:
+        return f.default_factory()
+    return f.default
+
+def is_unchanged(new: Symbol, old: Symbol) -> bool:
+    """ Whether the pre-cloned symbol is left untouched.
+
+        Fields are compared instead of types, so the symbol cloned
+            into a Transformer is unchanged if the fields of old
+            are untouched and the extra fields keep their defaults.
+            Fields with `compare=False` are pass context and skipped.
+    """
+    old_fields = _field_names(type(old))
+    for f in fields(new):
+        if not f.compare:
+            continue
+        nv = getattr(new, f.name)
+        if f.name not in old_fields:
+            if nv != _field_default(f):
+                return False
+            continue
+        ov = getattr(old, f.name)
+        if f.name == "args":
+            if len(nv) != len(ov) or any(
+                    [a is not b for a, b in zip(nv, ov)]):
+                return False
+        elif f.name == "attrs":
+            if nv.keys() != ov.keys() or any(
+                    [nv[a] is not ov[a] for a in ov]):
+                return False
+        elif nv is not ov and nv != ov:
+            return False
+    return True
+
+def transform(symbol: Symbol, callback: _TransformerT,
+        graph: typing.Optional[GraphIndex] = None) -> Symbol:
     """ Transform symbol from old to new, with inputs updated.
 
         Only the return value indicates mutation, while changing
         attributes in parameter passed in args does nothing.
-    """
-    sym_list: typing.List[Symbol] = []
-    _topo_sort(symbol, sym_list)
 
+        Copy on write: the original symbol is reused if neither
+            itself nor its inputs are modified, so only the paths
+            from modified symbols to output are materialized.
+    """
     sym_map = {}
-    for sym in sym_list:
+    for sym in _sym_list(symbol, graph):
         args = [sym_map[c.name] for c in sym.args]
         # pre-clone symbol, to avoid misleading usage in callback
-        sym = sym.clone(
+        new = sym.clone(
                 args=args,
                 attrs={k: v for k, v in sym.attrs.items()})
-        out = callback(sym) or sym
+        out = callback(new) or new
         assert isinstance(out, Symbol)
+        if out is new and is_unchanged(new, sym):
+            out = sym
         sym_map[sym.name] = out
     return sym_map[symbol.name]
 
@@ -175,7 +301,8 @@ def filter_operators(*op_names: typing.List[str]):
         return _wrapper
     return _pass
 
-def simple_raw_print(symbol: Symbol, params: ParametersT ={}):
+def simple_raw_print(symbol: Symbol, params: ParametersT ={},
+        graph: typing.Optional[GraphIndex] = None):
     info = { "op": 0, "param": 0 }
     def _simple_visit(sym):
         if is_param(sym, params):
@@ -187,7 +314,7 @@ def simple_raw_print(symbol: Symbol, params: ParametersT ={}):
             "(" + ", ".join([i.name for i in sym.args]) + ")",
             sym.attrs,
         ))
-    transform(symbol, _simple_visit)
+    visit(symbol, _simple_visit, graph)
     print("="*50)
     print("Operators: {} | Parameters: {}".format(
         info["op"], info["param"]))
@@ -252,6 +379,75 @@ def expr2symbol(expr: RelayExpr) -> Symbol:
         relay.analysis.post_order_visit(expr, _cast_expr)
     return symbol_map[expr]
 
+_INFER_TYPE_CACHE: typing.Dict[str, typing.Tuple[typing.Any, typing.Any]] = {}
+
+def _infer_op_type(sym: Symbol):
+    """ Infer operator's (shape, dtype) with args' types.
+
+        Results are cached by operator signature, which is shared
+            by the repeated blocks in model.
+    """
+    attrs = op_attrs(sym)
+    key = "{}/{}/{}".format(sym.op_name, attrs,
+            [(a.attrs["shape"], a.attrs["dtype"]) for a in sym.args])
+    if key in _INFER_TYPE_CACHE:
+        return _INFER_TYPE_CACHE[key]
+
+    args = []
+    for a in sym.args:
+        if a.is_op(TUPLE_NAME):
+            a = a.clone(args=[ t.as_parameter() for t in a.args ])
+        else:
+            a = a.as_parameter()
+        args.append(a)
+    expr = symbol2expr(sym.clone(args=args, attrs=attrs))
+    mod = relay.transform.InferType()(ir.IRModule.from_expr(expr))
+    checked_type = mod["main"].body.checked_type
+    result = (list(expr_type(checked_type, "concrete_shape")),
+            expr_type(checked_type, "dtype"))
+    _INFER_TYPE_CACHE[key] = result
+    return result
+
+def infer_type(symbol: Symbol,
+        graph: typing.Optional[GraphIndex] = None) -> Symbol:
+    """ Infer shape and dtype of modified symbols.
+
+        The graph is the index of the original graph before
+            transform, whose symbols are reused by copy on write
+            transform, and the types of those untouched subgraphs
+            are kept. Types of all operators are inferred if graph
+            is None.
+    """
+    clean = set() if graph is None else \
+            set([id(s) for s in graph.sym_list])
+    dirty = set([s.name for s in sym2list(symbol) \
+            if id(s) not in clean and not is_variable(s)])
+
+    def _infer(sym: Symbol):
+        if sym.name not in dirty:
+            return
+        if sym.is_op(TUPLE_GET_ITEM_NAME):
+            arg, index = sym.args[0], sym.attrs["index"]
+            shape = arg.attrs["shape"][index]
+            dtype = arg.attrs["dtype"][index]
+        elif sym.is_op(TUPLE_NAME):
+            shape = [ a.attrs["shape"] for a in sym.args ]
+            dtype = [ a.attrs["dtype"] for a in sym.args ]
+        else:
+            shape, dtype = _infer_op_type(sym)
+        sym.attrs["shape"] = list(shape)
+        sym.attrs["dtype"] = dtype
+
+    def _clone_dirty(sym: Symbol):
+        # materialize the dirty symbols, to avoid modifying
+        #   the ones shared with the caller's graph.
+        if sym.name in dirty:
+            return sym.clone()
+
+    symbol = transform(symbol, _clone_dirty)
+    visit(symbol, _infer)
+    return symbol
+
 def symbol2expr(symbol: Symbol, expr_map={}) -> RelayExpr:
     # operator creator don't need shape or dtype attrs,
     #   except for the variable.
@@ -261,7 +457,8 @@ def symbol2expr(symbol: Symbol, expr_map={}) -> RelayExpr:
 
         if "shape" in sym.attrs:
             del sym.attrs["shape"]
-        if "dtype" in sym.attrs:
+        if "dtype" in sym.attrs and \
+                sym.op_name not in DTYPE_ATTR_OPS:
             del sym.attrs["dtype"]
         return sym
     symbol = transform(symbol, _remove_type)
@@ -1,33 +1,413 @@
+""" NumPy Reference Execution of MRT Operators
+
+    Vectorized NumPy implementations of the operators emitted by
+        MRT, including the integer variants of simulated quantized
+        graph, where the int8 inputs are accumulated in int32 with
+        `out_dtype`. Convolution is computed with im2col windows
+        and einsum instead of the naive `conv2d_nchw_python`.
+
+    The results are expected to be bit-exact with TVM's llvm target
+        for integer operators, which enables checking MRT passes
+        without any compilation.
+"""
 import typing
 from functools import wraps
 
 import numpy as np
+from numpy.lib.stride_tricks import as_strided
 
 import tvm
 from tvm.ir import RelayExpr
-from tvm.topi import testing
 
 from .extool import *
+from .types import *
+from . import symbol as _sym
+from .interop import as_numpy
 
 TOPI_REGS = {}
 
 DataType = typing.List[np.ndarray]
+OutputT = typing.Union[np.ndarray, typing.List[np.ndarray]]
 
-def register_topi(op_name):
+def register_topi(*op_names):
     def _wrapper(f):
-        TOPI_REGS[op_name] = f
+        for op_name in op_names:
+            TOPI_REGS[op_name] = f
         return f
     return _wrapper
 
+def _ints(val) -> typing.List[int]:
+    if isinstance(val, (int, np.integer)) or hasattr(val, "value"):
+        return [ int(val) ]
+    return [ int(v) for v in val ]
+
+def _dtype(dtype, default) -> str:
+    dtype = str(dtype) if dtype is not None else ""
+    return dtype or str(default)
+
+def _acc_dtype(*dtypes) -> str:
+    """ accumulation dtype, int64 for integers to avoid overflow. """
+    if all([np.issubdtype(np.dtype(d), np.integer) for d in dtypes]):
+        return "int64"
+    return "float64" if "float64" in [str(d) for d in dtypes] \
+            else "float32"
+
+def _trunc_div(a: np.ndarray, b) -> np.ndarray:
+    """ integer division rounding toward zero, as tvm div. """
+    return np.sign(a) * np.sign(b) * (np.abs(a) // np.abs(b))
+
+def _pad_tuple(padding, ndim=2) -> typing.List[int]:
+    """ padding to (begin..., end...) format. """
+    padding = _ints(padding)
+    if len(padding) == 1:
+        padding = padding * ndim * 2
+    elif len(padding) == ndim:
+        padding = padding * 2
+    assert len(padding) == ndim * 2, padding
+    return padding
+
+def _windows(data: np.ndarray, kernel, strides, dilation):
+    """ sliding windows view of NCHW data: (N, C, OH, OW, KH, KW). """
+    N, C, H, W = data.shape
+    KH, KW = kernel
+    sh, sw = strides
+    dh, dw = dilation
+    OH = (H - dh * (KH - 1) - 1) // sh + 1
+    OW = (W - dw * (KW - 1) - 1) // sw + 1
+    sN, sC, sH, sW = data.strides
+    return as_strided(data, (N, C, OH, OW, KH, KW),
+            (sN, sC, sH * sh, sW * sw, sH * dh, sW * dw),
+            writeable=False)
+
 @register_topi("nn.conv2d")
 def run_conv2d(data: DataType, attrs: AttrsT):
-    dw_np = topi.testing.dilate_python()
-    return testing.conv2d_nchw_python(*data, **attrs)
+    x, w = data
+    assert attrs.get("data_layout", "NCHW") == "NCHW"
+    assert attrs.get("kernel_layout", "OIHW") == "OIHW"
+    out_dtype = _dtype(attrs.get("out_dtype"), x.dtype)
+    acc = _acc_dtype(x.dtype, w.dtype)
+    groups = int(attrs.get("groups", 1))
+    pt, pl, pb, pr = _pad_tuple(attrs.get("padding", 0))
+
+    x = np.pad(x.astype(acc, copy=False),
+            ((0, 0), (0, 0), (pt, pb), (pl, pr)))
+    O, Cg, KH, KW = w.shape
+    cols = _windows(x, (KH, KW),
+            _ints(attrs.get("strides", (1, 1))),
+            _ints(attrs.get("dilation", (1, 1))))
+    N, C, OH, OW = cols.shape[:4]
+    cols = cols.reshape(N, groups, Cg, OH, OW, KH, KW)
+    w = w.astype(acc, copy=False).reshape(groups, O // groups, Cg, KH, KW)
+    out = np.einsum("ngchwij,gocij->ngohw", cols, w, optimize=True)
+    return out.reshape(N, O, OH, OW).astype(out_dtype)
+
+@register_topi("nn.dense")
+def run_dense(data: DataType, attrs: AttrsT):
+    x, w = data
+    out_dtype = _dtype(attrs.get("out_dtype"), x.dtype)
+    acc = _acc_dtype(x.dtype, w.dtype)
+    out = np.matmul(x.astype(acc, copy=False), w.astype(acc, copy=False).T)
+    return out.astype(out_dtype)
+
+@register_topi("nn.batch_matmul")
+def run_batch_matmul(data: DataType, attrs: AttrsT):
+    x, y = data
+    out_dtype = _dtype(attrs.get("out_dtype"), x.dtype)
+    acc = _acc_dtype(x.dtype, y.dtype)
+    x, y = x.astype(acc, copy=False), y.astype(acc, copy=False)
+    if attrs.get("transpose_a", False):
+        x = x.transpose(0, 2, 1)
+    if attrs.get("transpose_b", True):
+        y = y.transpose(0, 2, 1)
+    return np.matmul(x, y).astype(out_dtype)
+
+def _expand_axis(vec: np.ndarray, ndim: int, axis: int) -> np.ndarray:
+    shape = [1] * ndim
+    shape[axis] = -1
+    return vec.reshape(shape)
+
+@register_topi("nn.bias_add")
+def run_bias_add(data: DataType, attrs: AttrsT):
+    x, b = data
+    axis = int(attrs.get("axis", 1)) % x.ndim
+    return (x + _expand_axis(b, x.ndim, axis)).astype(x.dtype)
+
+@register_topi("nn.batch_norm")
+def run_batch_norm(data: DataType, attrs: AttrsT):
+    x, gamma, beta, mean, var = data
+    axis = int(attrs.get("axis", 1)) % x.ndim
+    eps = float(attrs.get("epsilon", 1e-5))
+    scale = 1. / np.sqrt(var + eps)
+    if attrs.get("scale", True):
+        scale = scale * gamma
+    shift = - mean * scale
+    if attrs.get("center", True):
+        shift = shift + beta
+    out = x * _expand_axis(scale, x.ndim, axis) + \
+            _expand_axis(shift, x.ndim, axis)
+    return [ out.astype(x.dtype), mean, var ]
+
+@register_topi("nn.relu")
+def run_relu(data: DataType, attrs: AttrsT):
+    return np.maximum(data[0], 0).astype(data[0].dtype)
+
+@register_topi("nn.leaky_relu")
+def run_leaky_relu(data: DataType, attrs: AttrsT):
+    x = data[0]
+    alpha = float(attrs.get("alpha", 0.01))
+    return np.where(x > 0, x, x * alpha).astype(x.dtype)
+
+def _pool_windows(x, attrs, pad_value):
+    assert attrs.get("layout", "NCHW") == "NCHW"
+    KH, KW = _ints(attrs["pool_size"]) * (2 // len(_ints(attrs["pool_size"])))
+    sh, sw = _ints(attrs.get("strides", (1, 1)))
+    dilation = _ints(attrs.get("dilation", (1, 1)))
+    pt, pl, pb, pr = _pad_tuple(attrs.get("padding", 0))
+    H, W = x.shape[2:]
+    if attrs.get("ceil_mode", False):
+        # extra end padding to cover the last partial window.
+        def _extra(size, k, s, d, b, e):
+            eff = (k - 1) * d + 1
+            out = -(-(size + b + e - eff) // s) + 1
+            return max((out - 1) * s + eff - (size + b + e), 0)
+        pb += _extra(H, KH, sh, dilation[0], pt, pb)
+        pr += _extra(W, KW, sw, dilation[1], pl, pr)
+    x = np.pad(x, ((0, 0), (0, 0), (pt, pb), (pl, pr)),
+            constant_values=pad_value)
+    return _windows(x, (KH, KW), (sh, sw), dilation), (pt, pl, pb, pr)
+
+@register_topi("nn.max_pool2d")
+def run_max_pool2d(data: DataType, attrs: AttrsT):
+    x = data[0]
+    pad_value = np.iinfo(x.dtype).min \
+            if np.issubdtype(x.dtype, np.integer) else -np.inf
+    cols, _ = _pool_windows(x, attrs, pad_value)
+    return cols.max(axis=(4, 5)).astype(x.dtype)
+
+@register_topi("nn.avg_pool2d")
+def run_avg_pool2d(data: DataType, attrs: AttrsT):
+    x = data[0]
+    acc = _acc_dtype(x.dtype)
+    cols, padding = _pool_windows(x.astype(acc), attrs, 0)
+    total = cols.sum(axis=(4, 5))
+    if attrs.get("count_include_pad", False):
+        count = cols.shape[4] * cols.shape[5]
+    else:
+        ones = np.ones((1, 1) + x.shape[2:], dtype=acc)
+        count, _ = _pool_windows(ones, attrs, 0)
+        count = count.sum(axis=(4, 5))
+    if np.issubdtype(x.dtype, np.integer):
+        return _trunc_div(total, count).astype(x.dtype)
+    return (total / count).astype(x.dtype)
+
+@register_topi("nn.global_avg_pool2d")
+def run_global_avg_pool2d(data: DataType, attrs: AttrsT):
+    x = data[0]
+    total = x.sum(axis=(2, 3), keepdims=True, dtype=_acc_dtype(x.dtype))
+    count = x.shape[2] * x.shape[3]
+    if np.issubdtype(x.dtype, np.integer):
+        return _trunc_div(total, count).astype(x.dtype)
+    return (total / count).astype(x.dtype)
+
+@register_topi("nn.global_max_pool2d")
+def run_global_max_pool2d(data: DataType, attrs: AttrsT):
+    x = data[0]
+    return x.max(axis=(2, 3), keepdims=True)
+
+@register_topi("nn.adaptive_avg_pool2d")
+def run_adaptive_avg_pool2d(data: DataType, attrs: AttrsT):
+    x = data[0]
+    assert attrs.get("layout", "NCHW") == "NCHW"
+    H, W = x.shape[2:]
+    OH, OW = _ints(attrs.get("output_size") or (1, 1)) * \
+            (2 // len(_ints(attrs.get("output_size") or (1, 1))))
+    out = np.empty(x.shape[:2] + (OH, OW), dtype=x.dtype)
+    for i in range(OH):
+        hs, he = (i * H) // OH, -(-((i + 1) * H) // OH)
+        for j in range(OW):
+            ws, we = (j * W) // OW, -(-((j + 1) * W) // OW)
+            out[:, :, i, j] = x[:, :, hs:he, ws:we].mean(axis=(2, 3))
+    return out
+
+@register_topi("nn.batch_flatten")
+def run_batch_flatten(data: DataType, attrs: AttrsT):
+    return data[0].reshape(data[0].shape[0], -1)
+
+@register_topi("nn.dropout")
+def run_dropout(data: DataType, attrs: AttrsT):
+    return [ data[0], np.ones_like(data[0]) ]
+
+@register_topi("nn.softmax")
+def run_softmax(data: DataType, attrs: AttrsT):
+    x = data[0]
+    axis = int(attrs.get("axis", -1))
+    e = np.exp(x - x.max(axis=axis, keepdims=True))
+    return (e / e.sum(axis=axis, keepdims=True)).astype(x.dtype)
+
+@register_topi("reshape")
+def run_reshape(data: DataType, attrs: AttrsT):
+    """ reshape with relay special values, see relay.reshape. """
+    x = data[0]
+    src, dst = list(x.shape), []
+    newshape = _ints(attrs["newshape"])
+    i, j = 0, 0
+    while i < len(newshape):
+        s = newshape[i]
+        if s == 0:
+            dst.append(src[j])
+            j += 1
+        elif s == -1:
+            dst.append(-1)
+            j += 1
+        elif s == -2:
+            dst.extend(src[j:])
+            j = len(src)
+        elif s == -3:
+            dst.append(src[j] * src[j + 1])
+            j += 2
+        elif s == -4:
+            # split src[j] into the next two values, one may be -1.
+            d1, d2 = newshape[i + 1], newshape[i + 2]
+            assert d1 != -1 or d2 != -1, "reshape -4 with two -1"
+            d1 = src[j] // d2 if d1 == -1 else d1
+            d2 = src[j] // d1 if d2 == -1 else d2
+            assert d1 * d2 == src[j], \
+                "reshape -4 cannot split {} into {}x{}".format(
+                        src[j], d1, d2)
+            dst.extend([ d1, d2 ])
+            i, j = i + 2, j + 1
+        else:
+            dst.append(s)
+            j += 1
+        i += 1
+    return x.reshape(dst)
+
+@register_topi("squeeze")
+def run_squeeze(data: DataType, attrs: AttrsT):
+    axis = attrs.get("axis", None)
+    axis = None if axis is None else tuple(_ints(axis))
+    return np.squeeze(data[0], axis=axis)
+
+@register_topi("expand_dims")
+def run_expand_dims(data: DataType, attrs: AttrsT):
+    x, axis = data[0], int(attrs["axis"])
+    for _ in range(int(attrs.get("num_newaxis", 1))):
+        x = np.expand_dims(x, axis)
+    return x
+
+@register_topi("transpose")
+def run_transpose(data: DataType, attrs: AttrsT):
+    axes = attrs.get("axes", None)
+    axes = None if axes is None else _ints(axes)
+    return np.transpose(data[0], axes)
+
+@register_topi("concatenate")
+def run_concatenate(data: DataType, attrs: AttrsT):
+    return np.concatenate(data[0], axis=int(attrs.get("axis", 0)))
+
+def _binary(func):
+    def _run(data: DataType, attrs: AttrsT):
+        a, b = data
+        return func(a, b).astype(np.result_type(a, b))
+    return _run
+
+register_topi("add")(_binary(np.add))
+register_topi("subtract")(_binary(np.subtract))
+register_topi("multiply")(_binary(np.multiply))
+register_topi("maximum")(_binary(np.maximum))
+register_topi("minimum")(_binary(np.minimum))
+register_topi("right_shift")(_binary(np.right_shift))
+register_topi("left_shift")(_binary(np.left_shift))
+
+@register_topi("divide")
+def run_divide(data: DataType, attrs: AttrsT):
+    a, b = data
+    if np.issubdtype(a.dtype, np.integer):
+        # truncated division, same as c semantic.
+        return _trunc_div(a, b).astype(a.dtype)
+    return (a / b).astype(a.dtype)
+
+def _unary(func):
+    def _run(data: DataType, attrs: AttrsT):
+        return func(data[0]).astype(data[0].dtype)
+    return _run
+
+register_topi("negative")(_unary(np.negative))
+register_topi("abs")(_unary(np.abs))
+register_topi("exp")(_unary(np.exp))
+register_topi("sqrt")(_unary(np.sqrt))
+register_topi("tanh")(_unary(np.tanh))
+register_topi("floor")(_unary(np.floor))
+register_topi("ceil")(_unary(np.ceil))
+register_topi("sigmoid")(_unary(lambda x: 1. / (1. + np.exp(-x))))
+# llvm.round: half away from zero, different from np.round.
+register_topi("round")(_unary(
+    lambda x: np.sign(x) * np.floor(np.abs(x) + 0.5)))
+
+@register_topi("clip")
+def run_clip(data: DataType, attrs: AttrsT):
+    x = data[0]
+    a_min, a_max = float(attrs["a_min"]), float(attrs["a_max"])
+    if np.issubdtype(x.dtype, np.integer):
+        info = np.iinfo(x.dtype)
+        a_min, a_max = max(a_min, info.min), min(a_max, info.max)
+    return np.clip(x, a_min, a_max).astype(x.dtype)
+
+@register_topi("cast")
+def run_cast(data: DataType, attrs: AttrsT):
+    return data[0].astype(str(attrs["dtype"]))
+
+def _reduce(func):
+    def _run(data: DataType, attrs: AttrsT):
+        x = data[0]
+        axis = attrs.get("axis", None)
+        axis = tuple(range(x.ndim)) if axis is None \
+                else tuple([a % x.ndim for a in _ints(axis)])
+        if attrs.get("exclude", False):
+            axis = tuple([a for a in range(x.ndim) if a not in axis])
+        keepdims = bool(attrs.get("keepdims", False))
+        return np.asarray(func(x, axis=axis, keepdims=keepdims))
+    return _run
+
+register_topi("sum")(_reduce(
+    lambda x, **kw: np.sum(x, dtype=x.dtype, **kw)))
+register_topi("max")(_reduce(np.max))
+register_topi("min")(_reduce(np.min))
+register_topi("mean")(_reduce(
+    lambda x, **kw: np.mean(x, **kw).astype(x.dtype)))
+
+def run_op(op_name: str, data: DataType, attrs: AttrsT) -> OutputT:
+    if op_name not in TOPI_REGS:
+        raise NotImplementedError(
+            "numpy reference of {} not implemented".format(op_name))
+    return TOPI_REGS[op_name](data, attrs)
 
-@register_topi("nn.batchnorm")
-def run_batchnorm(data: DataType, attrs: AttrsT):
-    return testing.batch_norm(*data, **attrs)
+def execute(expr: RelayExpr, data: DataType) -> OutputT:
+    """ Execute relay operator with input data. """
+    return run_op(op_name(expr), data, attrs(expr))
 
-# def execute(op_name: str, attrs: AttrsT, data: DataType) -> np.ndarray:
-#     eval("relay." + op_name)(op_name, )
-#     return TOPI_REGS[op_name](data, attrs)
+def run_symbol(symbol: _sym.Symbol, params: ParametersT,
+        data: typing.Optional[np.ndarray] = None,
+        data_dict: typing.Dict[str, np.ndarray] = {},
+        graph: typing.Optional[_sym.GraphIndex] = None,
+) -> typing.Dict[str, OutputT]:
+    """ Reference execution of symbol graph, return all outputs. """
+    outputs: typing.Dict[str, OutputT] = {}
+    def _run(sym: _sym.Symbol):
+        if _sym.is_param(sym, params):
+            out = as_numpy(params[sym.name])
+        elif _sym.is_input(sym, params):
+            out = data_dict.get(sym.name, data)
+            assert out is not None, "input: {} not set".format(sym.name)
+            out = as_numpy(out)
+        elif sym.is_op(_sym.TUPLE_GET_ITEM_NAME):
+            out = outputs[sym.args[0].name][sym.attrs["index"]]
+        elif sym.is_op(_sym.TUPLE_NAME):
+            out = [ outputs[a.name] for a in sym.args ]
+        else:
+            out = run_op(sym.op_name,
+                    [ outputs[a.name] for a in sym.args ],
+                    _sym.op_attrs(sym))
+        outputs[sym.name] = out
+    _sym.visit(symbol, _run, graph)
+    return outputs
@@ -1,5 +1,7 @@
 from __future__ import annotations
 import typing
+import json
+from os import path
 
 from dataclasses import dataclass, field
 from functools import wraps
@@ -13,6 +15,12 @@ from .symbol import *
 from .types import *
 from . import topi
 from . import runtime
+from . import cache
+from . import collector
+from . import serialize
+from . import utils
+from .interop import as_numpy, as_ndarray, randn
+from .dataset import Dataset
 
 Visitor = typing.Callable[[Symbol, ParametersT], None]
 Transformer = typing.Callable[[Symbol, ParametersT], typing.Optional[Symbol]]
@@ -28,8 +36,19 @@ class Trace:
 
     sym_inputs: typing.List[Symbol] = field(init=False)
     sym_params: typing.List[Symbol] = field(init=False)
+    graph: GraphIndex = field(init=False, repr=False)
+    """ cached graph index, Trace's symbol should not be
+            modified in place, use transform instead. """
+    calibrate_engine: typing.Optional[runtime.CalibrateEngine] = \
+            field(init=False, default=None, repr=False)
+    """ whole graph calibration module, compiled on first use. """
+    _parallel_executor: typing.Optional[runtime.ParallelExecutor] = \
+            field(init=False, default=None, repr=False)
+    _fingerprint: typing.Optional[str] = \
+            field(init=False, default=None, repr=False)
 
     def __post_init__(self):
+        self.graph = GraphIndex(self.symbol)
         self.sym_inputs = []
         self.sym_params = []
         def _init(sym: Symbol):
@@ -37,13 +56,15 @@ class Trace:
                 self.sym_inputs.append(sym)
             elif is_param(sym, self.params):
                 sym_shape = list(sym.attrs["shape"])
-                param_shape = self.params[sym.name].shape
+                param_shape = self.params.shape_of(sym.name) \
+                    if isinstance(self.params, serialize.LazyParams) \
+                    else self.params[sym.name].shape
                 assert sym_shape == list(param_shape), (
                     "param:{} shape inconsistent: {} vs. {}"
                 ).format(sym.name, sym_shape, param_shape)
                 # sym.attrs["shape"] = self.params[sym.name].shape
                 self.sym_params.append(sym)
-        visit(self.symbol, _init)
+        visit(self.symbol, _init, self.graph)
 
     @property
     def input_names(self) -> typing.List[str]:
@@ -58,16 +79,39 @@ class Trace:
         for sym in self.sym_inputs:
             shape = sym.attrs["shape"]
             dtype = sym.attrs["dtype"]
-            np_data = np.random.randn(*shape).astype(dtype)
-            data[sym.name] = tvm.nd.array(np_data)
+            data[sym.name] = as_ndarray(randn(shape, dtype))
         return data
 
+    def _get_calibrate_engine(self, device) -> runtime.CalibrateEngine:
+        engine = self.calibrate_engine
+        if engine is None or engine.device != device:
+            engine = runtime.CalibrateEngine(
+                    self.symbol, self.params,
+                    device=device, graph=self.graph)
+            self.calibrate_engine = engine
+        return engine
+
     def calibrate(self,
             data: typing.Optional[np.ndarray] = None,
             data_dict: typing.Dict[str, np.ndarray] = {},
+            device: tvm.runtime.Device = tvm.runtime.cpu(0),
+            whole_graph: bool = True,
+            num_workers: int = 1,
         ) -> typing.Dict[str, np.ndarray]:
+        """ Calibrate all symbols' outputs.
+
+            By default the whole graph is compiled once and cached
+                in trace, so that calling calibrate with different
+                batches skips the compilation. Set `whole_graph`
+                to False to execute operators one by one, which is
+                useful to locate the failed operator.
+
+            Set `num_workers` greater than 1 to execute independent
+                operators concurrently in a process pool, see
+                `runtime.ParallelExecutor`, the pool is kept in trace.
+        """
         calibrate_outputs: typing.Dict[str, np.ndarray] = {
-                k: v.numpy() for k, v in self.params.items()}
+                k: as_numpy(v) for k, v in self.params.items()}
 
         # set input data
         for v in self.sym_inputs:
@@ -95,16 +139,33 @@ class Trace:
                 assert expect == val
 
         def _get_type(out, key):
-            if isinstance(out, tvm.runtime.NDArray):
+            if isinstance(out, (tvm.runtime.NDArray, np.ndarray)):
                 return getattr(out, key)
             return [ _get_type(o, key) for o in out ]
 
+        engine_outputs = {}
+        if num_workers > 1:
+            executor = self._parallel_executor
+            if executor is None or executor.num_workers != num_workers:
+                if executor is not None:
+                    executor.close()
+                executor = runtime.ParallelExecutor(
+                        self.symbol, self.params,
+                        num_workers=num_workers, graph=self.graph)
+                self._parallel_executor = executor
+            engine_outputs = executor.run(data_dict=calibrate_outputs)
+        elif whole_graph:
+            engine = self._get_calibrate_engine(device)
+            engine_outputs = engine.run(data_dict=calibrate_outputs)
+
         def _calibrate(sym: Symbol, params: ParametersT):
             global TUPLE_GET_ITEM_NAME
 
             if is_variable(sym, params):
                 return
-            if sym.op_name == TUPLE_GET_ITEM_NAME:
+            if sym.name in engine_outputs:
+                out = engine_outputs[sym.name]
+            elif sym.op_name == TUPLE_GET_ITEM_NAME:
                 out = calibrate_outputs[sym.args[0].name][sym.attrs['index']]
             else:
                 out = _execute(sym, calibrate_outputs)
@@ -116,6 +177,123 @@ class Trace:
         self.visit(_calibrate)
         return calibrate_outputs
 
+    def collect(self,
+            dataset: Dataset,
+            factory: collector.CollectorFactoryT,
+            max_iter_num: typing.Optional[int] = None,
+            device: tvm.runtime.Device = tvm.runtime.cpu(0),
+            release: bool = False,
+    ) -> typing.Dict[str, collector.Collector]:
+        """ Streaming calibration statistics over dataset.
+
+            Each symbol's output is reduced into its collector, which
+                is created by `factory`, and dropped after the batch,
+                so the memory is bounded by one batch. Tuple output
+                is collected per field, named `name[index]`.
+
+            Set `release` to execute operators one by one with
+                `runtime.LivenessExecutor`, where intermediates are
+                released once dead, for deep models whose whole
+                batch outputs don't fit in memory.
+        """
+        collectors: typing.Dict[str, collector.Collector] = {}
+        def _update(name, out):
+            if isinstance(out, (list, tuple)):
+                for j, o in enumerate(out):
+                    _update("{}[{}]".format(name, j), o)
+                return
+            if name not in collectors:
+                collectors[name] = factory()
+            collectors[name].update(out)
+
+        for name, val in self.params.items():
+            _update(name, val)
+
+        if not release:
+            engine = self._get_calibrate_engine(device)
+            for outputs in engine.stream(dataset, max_iter_num):
+                for name, out in outputs.items():
+                    _update(name, out)
+                del outputs
+            return collectors
+
+        executor = runtime.LivenessExecutor(
+                self.symbol, self.params,
+                device=device, graph=self.graph)
+        def _callback(sym: Symbol, out):
+            if not is_param(sym, self.params):
+                _update(sym.name, out)
+
+        peak_bytes, i = 0, 0
+        while max_iter_num is None or i < max_iter_num:
+            dl = dataset.next()
+            if dl is None:
+                break
+            executor.run(dl[0], callback=_callback)
+            peak_bytes = max(peak_bytes, executor.peak_bytes)
+            i += 1
+        print("collect peak resident: {:.2f} MB".format(
+            peak_bytes / 1024 / 1024))
+        return collectors
+
+    def fingerprint(self) -> str:
+        """ content hash of symbol graph and params. """
+        if self._fingerprint is None:
+            self._fingerprint = cache.fingerprint(
+                    self.symbol, self.params, self.graph)
+        return self._fingerprint
+
+    def calibrate_stats(self,
+            dataset: Dataset,
+            max_iter_num: typing.Optional[int] = None,
+            bins: int = 2048,
+            device: tvm.runtime.Device = tvm.runtime.cpu(0),
+            use_cache: bool = True,
+            cache_root: typing.Optional[str] = None,
+    ) -> typing.Dict[str, cache.SummaryT]:
+        """ Calibrate summaries over dataset with disk cache.
+
+            Batches cached for the same trace fingerprint and
+                dataset fingerprint are loaded from disk, and only
+                the missing batches are calibrated. Tuple output
+                is summarized per field, named `name[index]`.
+
+            The cache is stored under `cache_root`, which defaults
+                to `calibrate` in `MRT_MODEL_ROOT`.
+        """
+        cache_root = path.join(utils.MRT_MODEL_ROOT, "calibrate") \
+                if cache_root is None else cache_root
+        calib_cache = cache.CalibrateCache(
+                self.fingerprint(), dataset.fingerprint(),
+                bins=bins, root=cache_root)
+
+        all_summaries: typing.Dict[str, typing.List[cache.SummaryT]] = {}
+        dataset.reset()
+        i = 0
+        while max_iter_num is None or i < max_iter_num:
+            dl = dataset.next()
+            if dl is None:
+                break
+
+            summaries = calib_cache.load(i) if use_cache else None
+            if summaries is None:
+                outputs = self.calibrate(dl[0], device=device)
+                summaries = {}
+                for name, out in outputs.items():
+                    if isinstance(out, (list, tuple)):
+                        for j, o in enumerate(out):
+                            summaries["{}[{}]".format(name, j)] = \
+                                    cache.summarize(o, bins)
+                    else:
+                        summaries[name] = cache.summarize(out, bins)
+                calib_cache.save(i, summaries)
+
+            for name, summary in summaries.items():
+                all_summaries.setdefault(name, []).append(summary)
+            i += 1
+        return { k: cache.merge_summaries(v) \
+                for k, v in all_summaries.items() }
+
     def run(self,
             data: typing.Optional[tvm.nd.NDArray] = None,
             data_dict: ParametersT = {},
@@ -133,44 +311,68 @@ class Trace:
             assert dtype == val.dtype
             params[sym.name] = val
 
-        return runtime.infer(self.to_mod(), params, device=device)
+        return runtime.infer(self.to_expr(), params, device=device)
 
     def random_run(self) -> typing.List[tvm.nd.NDArray]:
         data = {}
         for sym in self.sym_inputs:
             shape = sym.attrs["shape"]
             dtype = sym.attrs["dtype"]
-            np_data = np.random.randn(*shape).astype(dtype)
-            data[sym.name] = tvm.nd.array(np_data)
+            data[sym.name] = as_ndarray(randn(shape, dtype))
         return self.run(data_dict=data)
 
     def set_input_shape(self,
             shape = None, shape_dict = {}) -> Trace:
-       shape_dict["common_shape"] = shape
+       """ Update input shapes, only the types of symbols that
+               depend on the modified inputs are re-inferred.
+       """
        def _set_shape(sym: Symbol):
            if is_input(sym, self.params):
-               shape = shape_dict.get(
-                       sym.name, shape_dict["common_shape"])
-               if shape is not None:
-                   sym.attrs["shape"] = shape
+               shape_ = shape_dict.get(sym.name, shape)
+               if shape_ is not None and \
+                       list(shape_) != list(sym.attrs["shape"]):
+                   sym.attrs["shape"] = list(shape_)
            return sym
 
-       symbol = transform(self.symbol, _set_shape)
-       return Trace.from_expr(symbol2expr(symbol), self.params)
+       symbol = transform(self.symbol, _set_shape, self.graph)
+       symbol = infer_type(symbol, self.graph)
+       return Trace("set_input_shape", symbol, self.params)
 
     def print(self):
-        simple_raw_print(self.symbol, self.params)
+        simple_raw_print(self.symbol, self.params, self.graph)
 
     def visit(self, callback: Visitor):
         def _visitor(sym: Symbol):
             callback(sym, self.params)
-        visit(self.symbol, _visitor)
+        visit(self.symbol, _visitor, self.graph)
 
     def transform(self, callback: Transformer) -> Trace:
         def _tfm(sym: Symbol):
             return callback(sym, self.params)
         return Trace(callback.__name__,
-                transform(self.symbol, _tfm), self.params)
+                transform(self.symbol, _tfm, self.graph),
+                self.params)
+
+    def dump(self, prefix: str):
+        """ Dump trace into `prefix.json` and `prefix.params`. """
+        sym_file, params_file = utils.extend_fname(prefix)
+        with open(sym_file, "w") as f:
+            json.dump({
+                "name": self.name,
+                "symbols": serialize.symbol_to_json(
+                    self.symbol, self.graph),
+            }, f)
+        serialize.save_params(params_file, self.params)
+
+    @staticmethod
+    def load(prefix: str) -> Trace:
+        """ Load dumped trace, params are loaded lazily. """
+        sym_file, params_file = utils.extend_fname(prefix)
+        with open(sym_file, "r") as f:
+            data = json.load(f)
+        symbol = serialize.symbol_from_json(data["symbols"])
+        return Trace(data["name"], symbol,
+                serialize.LazyParams(params_file))
 
     def to_expr(self, expr_map={}) -> ir.RelayExpr:
         return symbol2expr(self.symbol, expr_map)
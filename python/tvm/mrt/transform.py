@@ -14,7 +14,8 @@ from .trace import *
 class Transformer(Symbol):
     """ Type TransformerT for Trace """
 
-    params: ParametersT = field(default_factory=dict)
+    params: ParametersT = field(default_factory=dict, compare=False)
+    """ pass context, not the state of symbol. """
 
     def is_input(self) -> bool:
         return is_input(self, self.params)
@@ -29,7 +30,11 @@ class Transformer(Symbol):
     def apply(cls, *args, **kw):
         def _tfm(symbol: Symbol, params: ParametersT):
             ins = symbol.clone(cls, params=params)
-            return ins(*args, **kw) or ins
+            out = ins(*args, **kw) or ins
+            # keep the input symbol for copy on write transform.
+            if out is ins and is_unchanged(ins, symbol):
+                return symbol
+            return out
         return _tfm
 
     def __call__(self, *args, **kw) -> Symbol:
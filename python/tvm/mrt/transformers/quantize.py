@@ -1,9 +1,386 @@
+""" Integer-only Quantization
 
+    Rewrite the calibrated float trace into integer arithmetic with
+        symmetric quantization, where the real value is `q / scale`.
+        The conv2d and dense take int8 inputs and accumulate in
+        int32, and the int32 outputs are requantized into int8 with
+        integer multiply and rounding right shift:
+
+            q_out = (q_in * M + 2^(n-1)) >> n, M / 2^n ~ S_out / S_in
+
+    In "power2" mode, all scales are powers of two, so M is 1 and the
+        requantization is a pure shift. In "fixed_point" mode, M has
+        `requant_bits` precision. The graph input is quantized at
+        entry and the output dequantized at exit, operators without
+        integer lowering run in float between dequantize and quantize.
+
+    Run `fuse.fuse` before quantization to fold the batch norms.
+"""
+from __future__ import annotations
+
+import typing
+from dataclasses import dataclass, field
+
+import numpy as np
+
+import tvm
 from tvm import relay, ir
 
-def quantize_conv2d(expr: relay.Call, attrs):
-    """ quantize by scale. """
-    assert isinstance(expr, relay.Call)
-    expr.op
-    pass
+from ..symbol import *
+from ..types import *
+from ..trace import Trace
+from ..dataset import Dataset
+from ..stats import Statistics
+from .. import runtime
+from ..interop import as_numpy, as_ndarray
+
+RangesT = typing.Dict[str, float]
+""" calibrated absmax of each symbol's float output. """
+
+def summary_ranges(summaries: typing.Dict[str, typing.Any]) -> RangesT:
+    """ ranges from `Trace.calibrate_stats` summaries. """
+    return { k: float(s["absmax"]) for k, s in summaries.items() }
+
+PrecisionMapT = typing.Dict[str, int]
+""" bit width of the quantized inputs, keyed by consumer symbol. """
+
+def _qmax(bits: int) -> int:
+    return 2 ** (min(bits, 32) - 1) - 1
+
+def _qdtype(bits: int) -> str:
+    """ storage dtype of the quantized value. """
+    if bits <= 8:
+        return "int8"
+    return "int16" if bits <= 16 else "int32"
+
+@dataclass
+class QuantInfo:
+    """ Quantized symbol and its scale, real = q / scale. """
+    symbol: Symbol
+    scale: float
+    dtype: str
+    bits: int = 32
+    """ value range bit width, |q| <= 2^(bits-1) - 1. """
+
+    @property
+    def is_float(self) -> bool:
+        """ float or tuple output, not quantized. """
+        return not isinstance(self.dtype, str) or \
+                self.dtype.startswith("float")
+
+@dataclass
+class IntegerQuantizer:
+    """ Rewrite float trace into integer-only trace.
+
+        The inputs of each operator are quantized to the bit width
+            in `precisions` keyed by the operator's name, or the
+            default `bits`. Accumulation is in int32 for inputs up
+            to 8 bits, and int64 for wider ones.
+    """
+    trace: Trace
+    ranges: RangesT
+    mode: str = "fixed_point"
+    bits: int = 8
+    requant_bits: int = 16
+    precisions: PrecisionMapT = field(default_factory=dict)
+
+    params: ParametersT = field(init=False, default_factory=dict)
+    infos: typing.Dict[str, typing.Any] = \
+            field(init=False, default_factory=dict)
+    qinfos: typing.Dict[typing.Tuple[str, int], QuantInfo] = \
+            field(init=False, default_factory=dict)
+    """ requantized symbols shared by consumers of same bits. """
+
+    def __post_init__(self):
+        assert self.mode in ["fixed_point", "power2"], self.mode
+
+    def _bits(self, sym: Symbol) -> int:
+        return int(self.precisions.get(sym.name, self.bits))
+
+    def _scale(self, absmax: float, bits: int) -> float:
+        scale = _qmax(bits) / absmax if absmax > 0 else 1.
+        if self.mode == "power2":
+            scale = 2. ** np.floor(np.log2(scale))
+        return float(scale)
+
+    def _name(self, sym: Symbol, tag: str) -> str:
+        name = "{}_{}".format(sym.name, tag)
+        index = 0
+        while name in self.params or name in self.infos:
+            index += 1
+            name = "{}_{}{}".format(sym.name, tag, index)
+        return name
+
+    def _const(self, name: str, data: np.ndarray) -> Symbol:
+        self.params[name] = as_ndarray(data)
+        return Symbol(name, VAR_NAME, [], {
+            "name_hint": name,
+            "shape": list(data.shape),
+            "dtype": str(data.dtype), })
+
+    def _op(self, sym: Symbol, tag: str, op_name: str,
+            args: typing.List[Symbol], **attrs) -> Symbol:
+        out = Symbol(self._name(sym, tag), op_name, args, attrs)
+        self.infos[out.name] = None
+        return out
+
+    def _quantize_param(self, sym: Symbol, scale: float,
+            bits: int, dtype: str) -> QuantInfo:
+        data = as_numpy(self.trace.params[sym.name]).astype("float64")
+        bound = _qmax(bits)
+        data = np.clip(np.round(data * scale), -bound, bound)
+        return QuantInfo(self._const(self._name(sym, "q"),
+            data.astype(dtype)), scale, dtype, min(bits, 32))
+
+    def _quantize(self, sym: Symbol, info: QuantInfo,
+            scale: float, bits: int) -> QuantInfo:
+        """ quantize float value at entry. """
+        S = self._const(self._name(sym, "scale"),
+                np.array(scale, dtype=info.dtype))
+        out = self._op(sym, "mul", "multiply", [info.symbol, S])
+        out = self._op(sym, "round", "round", [out])
+        out = self._op(sym, "clip", "clip", [out],
+                a_min=-_qmax(bits), a_max=_qmax(bits))
+        out = self._op(sym, "q", "cast", [out], dtype=_qdtype(bits))
+        return QuantInfo(out, scale, _qdtype(bits), bits)
+
+    def _dequantize(self, sym: Symbol, info: QuantInfo) -> QuantInfo:
+        if info.is_float:
+            return info
+        out = self._op(sym, "cast", "cast", [info.symbol],
+                dtype="float32")
+        S = self._const(self._name(sym, "rscale"),
+                np.array(1. / info.scale, dtype="float32"))
+        out = self._op(sym, "dq", "multiply", [out, S])
+        return QuantInfo(out, 1., "float32")
+
+    def _cast(self, sym: Symbol, info: QuantInfo,
+            dtype: str) -> QuantInfo:
+        if info.dtype == dtype:
+            return info
+        out = self._op(sym, "cast", "cast", [info.symbol], dtype=dtype)
+        return QuantInfo(out, info.scale, dtype, info.bits)
+
+    def _multiplier(self, ratio: float) -> typing.Tuple[int, int]:
+        """ ratio ~ M / 2^n, with M of requant_bits precision. """
+        if ratio == 1:
+            return 1, 0
+        if self.mode == "power2":
+            return 1, -int(round(np.log2(ratio)))
+        exp = int(np.floor(np.log2(ratio)))
+        n = self.requant_bits - 1 - exp
+        M = int(round(ratio * 2. ** n))
+        if M >= 2 ** self.requant_bits:
+            M, n = M // 2, n - 1
+        return M, n
+
+    def _requantize(self, sym: Symbol, info: QuantInfo,
+            scale: float, bits: int, dtype: str) -> QuantInfo:
+        """ integer requantization from info.scale into scale. """
+        if info.is_float:
+            return self._cast(sym,
+                    self._quantize(sym, info, scale, bits), dtype)
+        M, n = self._multiplier(scale / info.scale)
+        if M == 1 and n == 0 and info.bits <= bits:
+            return self._cast(sym, info, dtype)
+
+        acc = "int64" if M != 1 or info.dtype == "int64" else "int32"
+        out = self._cast(sym, info, acc).symbol
+        if M != 1:
+            out = self._op(sym, "rq_mul", "multiply", [out,
+                self._const(self._name(sym, "rq_M"),
+                    np.array(M, dtype=acc))])
+        if n > 0:
+            out = self._op(sym, "rq_round", "add", [out,
+                self._const(self._name(sym, "rq_bias"),
+                    np.array(1 << (n - 1), dtype=acc))])
+            out = self._op(sym, "rq_shift", "right_shift", [out,
+                self._const(self._name(sym, "rq_n"),
+                    np.array(n, dtype=acc))])
+        elif n < 0:
+            out = self._op(sym, "rq_shift", "left_shift", [out,
+                self._const(self._name(sym, "rq_n"),
+                    np.array(-n, dtype=acc))])
+        out = self._op(sym, "rq_clip", "clip", [out],
+                a_min=-_qmax(bits), a_max=_qmax(bits))
+        out = self._op(sym, "rq", "cast", [out], dtype=dtype)
+        # the effective scale of power2 shift.
+        return QuantInfo(out, info.scale * M / 2. ** n, dtype, bits)
+
+    def _to_qdtype(self, sym: Symbol, arg: Symbol) -> QuantInfo:
+        """ arg quantized in the bits of consumer sym. """
+        bits = self._bits(sym)
+        if is_param(arg, self.trace.params):
+            absmax = float(np.abs(
+                as_numpy(self.trace.params[arg.name])).max())
+            return self._quantize_param(arg,
+                    self._scale(absmax, bits), bits, _qdtype(bits))
+        info = self.infos[arg.name]
+        if not info.is_float and info.bits <= bits:
+            return self._cast(arg, info, _qdtype(bits))
+        key = (arg.name, bits)
+        if key not in self.qinfos:
+            self.qinfos[key] = self._requantize(arg, info,
+                    self._scale(self.ranges[arg.name], bits),
+                    bits, _qdtype(bits))
+        return self.qinfos[key]
+
+    def _to_int32(self, sym: Symbol, arg: Symbol,
+            scale: float) -> QuantInfo:
+        if is_param(arg, self.trace.params):
+            return self._quantize_param(arg, scale, 32, "int32")
+        info = self.infos[arg.name]
+        if info.is_float:
+            info = self._to_qdtype(sym, arg)
+        return self._requantize(arg, info, scale, 32, "int32")
+
+    def _float(self, sym: Symbol) -> Symbol:
+        """ float value of sym, tuple fields are dequantized. """
+        if is_param(sym, self.trace.params):
+            self.params[sym.name] = self.trace.params[sym.name]
+            return sym
+        if sym.is_op(TUPLE_NAME):
+            return sym.clone(Symbol,
+                    args=[ self._float(a) for a in sym.args ])
+        return self._dequantize(sym, self.infos[sym.name]).symbol
+
+    def _fallback(self, sym: Symbol) -> QuantInfo:
+        """ float execution between dequantize and quantize. """
+        args = [ self._float(a) for a in sym.args ]
+        out = sym.clone(Symbol, args=args, attrs=op_attrs(sym))
+        return QuantInfo(out, 1., sym.dtype)
+
+    def _quantize_op(self, sym: Symbol) -> typing.Any:
+        if is_input(sym, self.trace.params):
+            return QuantInfo(sym, 1., sym.dtype)
+        if is_param(sym, self.trace.params) or sym.is_op(TUPLE_NAME):
+            # quantized by consumers.
+            return None
+        if sym.op_name in ["nn.conv2d", "nn.dense"] and \
+                is_param(sym.args[1], self.trace.params):
+            X = self._to_qdtype(sym, sym.args[0])
+            W = self._to_qdtype(sym, sym.args[1])
+            acc = "int32" if max(X.bits, W.bits) <= 8 else "int64"
+            attrs = op_attrs(sym)
+            attrs["out_dtype"] = acc
+            out = Symbol(sym.name, sym.op_name,
+                    [X.symbol, W.symbol], attrs)
+            return QuantInfo(out, X.scale * W.scale, acc, int(acc[3:]))
+        if sym.is_op("nn.bias_add") and \
+                is_param(sym.args[1], self.trace.params):
+            X = self.infos[sym.args[0].name]
+            if X.is_float:
+                X = self._to_qdtype(sym, sym.args[0])
+            if X.dtype not in ["int32", "int64"]:
+                X = self._cast(sym.args[0], X, "int32")
+            B = self._quantize_param(sym.args[1], X.scale, 32, X.dtype)
+            out = Symbol(sym.name, sym.op_name, [X.symbol, B.symbol],
+                    { "axis": sym.attrs["axis"] })
+            return QuantInfo(out, X.scale, X.dtype, X.bits)
+        if sym.op_name in ["add", "subtract"]:
+            infos = [ self.infos.get(a.name, None) for a in sym.args ]
+            scales = [ i.scale for i in infos \
+                    if i is not None and not i.is_float ]
+            scale = min(scales) if scales else \
+                    self._scale(self.ranges[sym.name], self._bits(sym))
+            A, B = [ self._to_int32(sym, a, scale) for a in sym.args ]
+            out = Symbol(sym.name, sym.op_name, [A.symbol, B.symbol], {})
+            return QuantInfo(out, scale, "int32")
+        if sym.is_op("multiply"):
+            A, B = [ self._to_qdtype(sym, a) for a in sym.args ]
+            acc = "int32" if max(A.bits, B.bits) <= 8 else "int64"
+            A, B = self._cast(sym, A, acc), self._cast(sym, B, acc)
+            out = Symbol(sym.name, sym.op_name, [A.symbol, B.symbol], {})
+            return QuantInfo(out, A.scale * B.scale, acc, int(acc[3:]))
+        if sym.is_op("concatenate"):
+            bits = self._bits(sym)
+            scale = self._scale(self.ranges[sym.name], bits)
+            fields = [ self._quantize_param(t, scale, bits,
+                _qdtype(bits)) if is_param(t, self.trace.params) else \
+                self._requantize(t, self.infos[t.name],
+                    scale, bits, _qdtype(bits)) \
+                for t in sym.args[0].args ]
+            tup = sym.args[0].clone(Symbol,
+                    args=[ f.symbol for f in fields ], attrs={})
+            out = Symbol(sym.name, sym.op_name, [tup],
+                    { "axis": sym.attrs["axis"] })
+            return QuantInfo(out, scale, _qdtype(bits), bits)
+        if sym.op_name in ["nn.avg_pool2d", "nn.global_avg_pool2d",
+                "nn.adaptive_avg_pool2d"]:
+            X = self.infos[sym.args[0].name]
+            if not X.is_float:
+                if X.dtype in ["int8", "int16"]:
+                    X = self._cast(sym.args[0], X, "int32")
+                return self._passthrough(sym, X)
+        if sym.op_name in ["nn.relu", "nn.max_pool2d",
+                "nn.global_max_pool2d", "nn.batch_flatten",
+                "reshape", "transpose", "squeeze", "expand_dims"]:
+            X = self.infos[sym.args[0].name]
+            if not X.is_float:
+                return self._passthrough(sym, X)
+        if sym.is_op("clip"):
+            X = self.infos[sym.args[0].name]
+            if not X.is_float:
+                bound = _qmax(X.bits)
+                out = Symbol(sym.name, sym.op_name, [X.symbol], {
+                    "a_min": float(max(np.round(
+                        float(sym.attrs["a_min"]) * X.scale), -bound)),
+                    "a_max": float(min(np.round(
+                        float(sym.attrs["a_max"]) * X.scale), bound)), })
+                return QuantInfo(out, X.scale, X.dtype, X.bits)
+        return self._fallback(sym)
+
+    def _passthrough(self, sym: Symbol, X: QuantInfo) -> QuantInfo:
+        """ scale-invariant operators. """
+        out = Symbol(sym.name, sym.op_name, [X.symbol] + sym.args[1:],
+                op_attrs(sym))
+        return QuantInfo(out, X.scale, X.dtype, X.bits)
+
+    def __call__(self) -> Trace:
+        def _quantize(sym: Symbol):
+            self.infos[sym.name] = self._quantize_op(sym)
+        visit(self.trace.symbol, _quantize, self.trace.graph)
+
+        symbol = infer_type(self._float(self.trace.symbol))
+        return Trace("quantize", symbol, self.params)
+
+def integer_quantize(tr: Trace, ranges: RangesT,
+        mode: str = "fixed_point", bits: int = 8,
+        requant_bits: int = 16,
+        precisions: PrecisionMapT = {}) -> Trace:
+    """ Integer-only trace from calibrated ranges.
+
+        `precisions` overrides the bit width per operator, such as
+            the result of `precision.search`.
+    """
+    return IntegerQuantizer(tr, ranges, mode=mode,
+            bits=bits, requant_bits=requant_bits,
+            precisions=dict(precisions))()
+
+def benchmark(float_tr: Trace, int_tr: Trace,
+        dataset: Dataset, stats_type: typing.Type[Statistics],
+        max_iter_num: typing.Optional[int] = None,
+        device: tvm.runtime.Device = tvm.runtime.cpu(0),
+        target: str = "llvm", number: int = 10, repeat: int = 3,
+) -> typing.Dict[str, float]:
+    """ Compare latency and accuracy of float and integer trace. """
+    latency = {}
+    for name, tr in [("fp32", float_tr), ("int", int_tr)]:
+        mod = runtime.create_executor(tr.to_expr(), tr.params,
+                device=device, opt_level=3, target=target)
+        for k, v in tr.random_inputs().items():
+            mod.set_input(k, v)
+        result = mod.benchmark(device, number=number, repeat=repeat)
+        latency[name] = result.mean * 1e3
+        print("{} latency: {:.3f} ms".format(name, latency[name]))
+    print("speedup: {:.2f}x".format(latency["fp32"] / latency["int"]))
 
+    dataset.reset()
+    runtime.multiple_validate(
+        runtime.validator(float_tr.to_expr(), float_tr.params, "fp32",
+            device=device, target=target),
+        dataset, stats_type,
+        runtime.validator(int_tr.to_expr(), int_tr.params, "int",
+            device=device, target=target),
+        max_iter_num=max_iter_num)
+    return latency
@@ -1177,8 +1177,8 @@ class LegalizeQnnOpForTachikoma(DFPatternCallback):
         pat = is_op("qnn.requantize")(
             pat, self.rq_in_scl, self.rq_in_zp, self.rq_out_scl, self.rq_out_zp
         )
-        pat = is_op("clip")(pat)
-        cast = is_op("cast")(pat)
+        self.act = is_op("clip")(pat)
+        cast = is_op("cast")(self.act)
         pat = is_op("qnn.add")(
             cast,
             self.sum_src,
@@ -1202,6 +1202,7 @@ class LegalizeQnnOpForTachikoma(DFPatternCallback):
         rq_in_zp = node_map[self.rq_in_zp][0]
         rq_out_scl = node_map[self.rq_out_scl][0]
         rq_out_zp = node_map[self.rq_out_zp][0]
+        act = node_map[self.act][0]
 
         final_dtype = node_map[self.pattern][0].checked_type.dtype
 
@@ -1270,7 +1271,8 @@ class LegalizeQnnOpForTachikoma(DFPatternCallback):
         gr = relay.op.cast(gr, dtype="float32")
         gr = gr + bias
         gr = gr * o_scl
-        gr = relay.op.clip(gr, 0, 255) * act_scl
+        # keep the range of requantized dst, u8 or s8
+        gr = relay.op.clip(gr, act.attrs.a_min, act.attrs.a_max) * act_scl
         gr = gr + sum_scl * cast_fp(sum_src) if sum_src else gr
         gr = gr + dst_zp
         gr = relay.op.cast(gr, dtype=final_dtype)
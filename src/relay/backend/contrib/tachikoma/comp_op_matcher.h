@@ -25,6 +25,7 @@
 #ifndef TVM_RELAY_BACKEND_CONTRIB_TACHIKOMA_COMP_OP_MATCHER_H_
 #define TVM_RELAY_BACKEND_CONTRIB_TACHIKOMA_COMP_OP_MATCHER_H_
 
+#include <tvm/relay/attrs/transform.h>
 #include <tvm/relay/function.h>
 
 #include <string>
@@ -112,14 +113,15 @@ const tvm::relay::CallNode* ParseQnnConvComp(const tvm::relay::FunctionNode& com
   auto dst_zp = IsConstant();
 
   DFPattern cnv;
+  DFPattern act;
   DFPattern pat;
 
   cnv = IsOp("qnn.conv2d")({src, wgh, IsConstant(), IsConstant(), IsConstant(), IsConstant()});
   pat = IsOp("cast")({cnv});
   pat = IsOp("add")({pat, bias}) || pat;
   pat = IsOp("multiply")({pat, o_scl});
-  pat = IsOp("clip")({pat});
-  pat = IsOp("multiply")({pat, act_scl}) || pat;
+  act = IsOp("clip")({pat});
+  pat = IsOp("multiply")({act, act_scl}) || act;
   pat = IsOp("add")({pat, sum_scl * IsOp("cast")({sum_src})}) || pat;
   pat = IsOp("add")({pat, dst_zp}) || pat;
   pat = IsOp("cast")({pat});
@@ -147,12 +149,14 @@ const tvm::relay::CallNode* ParseQnnConvComp(const tvm::relay::FunctionNode& com
   arg_holder.Put(find(sum_scl), "sum_scl_idx");
   arg_holder.Put(find(dst_zp), "dst_zp_idx");
 
-  // Activation. Default clip to simulate relu via uint8 cast
+  // Activation. Clip bounds keep the range of requantized dst, u8 or s8
+  auto clip_attrs = map.at(act)[0].as<CallNode>()->attrs.as<ClipAttrs>();
+  ICHECK(clip_attrs);
   std::vector<std::string> clip_attr{"clip"};
   auto act_scl_val = map.count(act_scl) ? find(act_scl) : constant(1.0);
-  clip_attr.push_back(std::to_string(arg_holder.Put(act_scl_val)));      // act_scale
-  clip_attr.push_back(std::to_string(arg_holder.Put(constant(0.0))));    // alpha
-  clip_attr.push_back(std::to_string(arg_holder.Put(constant(255.0))));  // beta
+  clip_attr.push_back(std::to_string(arg_holder.Put(act_scl_val)));  // act_scale
+  clip_attr.push_back(std::to_string(arg_holder.Put(constant(clip_attrs->a_min))));  // alpha
+  clip_attr.push_back(std::to_string(arg_holder.Put(constant(clip_attrs->a_max))));  // beta
   (*ext_attrs)["activation"] = dmlc_attr(clip_attr);
 
   return map.at(cnv)[0].as<CallNode>();
@@ -180,8 +184,8 @@ const tvm::relay::CallNode* ParseQnnDenseComp(const tvm::relay::FunctionNode& co
   pat = IsOp("cast")({dns});
   pat = IsOp("add")({pat, bias}) || pat;
   pat = IsOp("multiply")({pat, o_scl});
-  pat = IsOp("clip")({pat});
-  pat = IsOp("multiply")({pat, act_scl}) || pat;
+  act = IsOp("clip")({pat});
+  pat = IsOp("multiply")({act, act_scl}) || act;
   pat = IsOp("add")({pat, sum_scl * IsOp("cast")({sum_src})}) || pat;
   pat = IsOp("add")({pat, dst_zp}) || pat;
   pat = IsOp("cast")({pat});
@@ -209,12 +213,14 @@ const tvm::relay::CallNode* ParseQnnDenseComp(const tvm::relay::FunctionNode& co
   arg_holder.Put(find(sum_scl), "sum_scl_idx");
   arg_holder.Put(find(dst_zp), "dst_zp_idx");
 
-  // Activation. Default clip to simulate relu via uint8 cast
+  // Activation. Clip bounds keep the range of requantized dst, u8 or s8
+  auto clip_attrs = memo.at(act)[0].as<CallNode>()->attrs.as<ClipAttrs>();
+  ICHECK(clip_attrs);
   std::vector<std::string> clip_attr{"clip"};
   auto act_scl_val = memo.count(act_scl) ? find(act_scl) : constant(1.0);
-  clip_attr.push_back(std::to_string(arg_holder.Put(act_scl_val)));      // act_scale
-  clip_attr.push_back(std::to_string(arg_holder.Put(constant(0.0))));    // alpha
-  clip_attr.push_back(std::to_string(arg_holder.Put(constant(255.0))));  // beta
+  clip_attr.push_back(std::to_string(arg_holder.Put(act_scl_val)));  // act_scale
+  clip_attr.push_back(std::to_string(arg_holder.Put(constant(clip_attrs->a_min))));  // alpha
+  clip_attr.push_back(std::to_string(arg_holder.Put(constant(clip_attrs->a_max))));  // beta
   (*ext_attrs)["activation"] = dmlc_attr(clip_attr);
 
   return memo.at(dns)[0].as<CallNode>();
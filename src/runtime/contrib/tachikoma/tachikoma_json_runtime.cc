@@ -22,12 +22,18 @@
  * \brief A simple JSON runtime for Tachikoma. Based on DNNL
  */
 
+#include <dmlc/parameter.h>
 #include <tvm/runtime/ndarray.h>
 #include <tvm/runtime/registry.h>
 
+#include <algorithm>
+#include <condition_variable>
 #include <cstddef>
+#include <memory>
+#include <mutex>
 #include <regex>
 #include <string>
+#include <thread>
 #include <vector>
 
 #include "../json/json_node.h"
@@ -57,6 +63,11 @@ class TachikomaJSONRuntime : public JSONRuntimeBase {
         next_unique_eid_offset_(data_entry_.size()),
         run_arg_eid_(input_var_eid_) {
     for (const auto e : outputs_) run_arg_eid_.push_back(EntryID(e));
+
+    // Max number of Run calls executed in parallel, 0 means the number of cores.
+    int max_concurrency = dmlc::GetEnv("TVM_TACHIKOMA_MAX_CONCURRENCY", 1);
+    if (max_concurrency <= 0) max_concurrency = std::thread::hardware_concurrency();
+    max_contexts_ = std::max(max_concurrency, 1);
   }
 
   const char* type_key() const override { return "tachikoma_json"; }
@@ -73,20 +84,23 @@ class TachikomaJSONRuntime : public JSONRuntimeBase {
   /* Unused stub implementation */
   void Run() override { LOG(FATAL) << "Unreachable code"; }
 
-  /* Thread safe implementation of Run. Keep runtime instance immutable */
+  /*
+   * Thread safe implementation of Run. Each call takes an execution context from the pool, and
+   * only patches IO data handles of its frozen plan. Up to max_contexts_ calls run in parallel.
+   */
   void Run(const TVMArgs& args) const {
-    auto arg_data_provider = makeIODataProvider(args);
-    auto mem_solver = tensor_registry_.MakeSolver(arg_data_provider);
-    // Execute primitives one by one
-    for (const auto& act : net_) {
-      auto prim = std::get<0>(act);
-      auto arg_reqs = std::get<1>(act);
-
-      // Find proper tachikoma::memory buffers
-      std::unordered_map<int, tachikoma::memory> mem_args;
-      for (const auto& kvp : arg_reqs) mem_args[kvp.first] = mem_solver(kvp.second);
-      prim.execute(stream_, mem_args);
+    auto ctx = AcquireContext();
+    try {
+      for (size_t i = 0; i < run_arg_eid_.size(); i++) {
+        ctx->plan.BindIO(i, ExtractDLTensor(args[i])->data);
+      }
+      ctx->plan.Execute(ctx->stream);
+      ctx->stream.wait();
+    } catch (...) {
+      ReleaseContext(std::move(ctx));
+      throw;
     }
+    ReleaseContext(std::move(ctx));
   }
 
   /* Override GetFunction to reimplement Run method */
@@ -100,27 +114,76 @@ class TachikomaJSONRuntime : public JSONRuntimeBase {
 
         Run(args);
       });
+    } else if (name == "get_arena_size") {
+      // Bytes of intermediate arena of one execution context.
+      return PackedFunc([sptr_to_self, this](TVMArgs args, TVMRetValue* rv) {
+        *rv = static_cast<int64_t>(this->arena_size_);
+      });
+    } else if (name == "get_naive_memory_size") {
+      // Bytes of intermediate buffers if allocated separately.
+      return PackedFunc([sptr_to_self, this](TVMArgs args, TVMRetValue* rv) {
+        *rv = static_cast<int64_t>(this->naive_size_);
+      });
     } else {
       return JSONRuntimeBase::GetFunction(name, sptr_to_self);
     }
   }
 
-  /* Same as makeInitDataProvider but in case of InputOutput return real DLTensor */
-  TensorRegistry::DLTensorProvider makeIODataProvider(const TVMArgs& args) const {
-    auto extract_dl_tensor = [](const TVMArgValue& val) -> const DLTensor* {
-      ICHECK(val.type_code() == kTVMNDArrayHandle || val.type_code() == kTVMDLTensorHandle)
-          << "Expect NDArray or DLTensor";
-      return val.IsObjectRef<NDArray>() ? val.operator NDArray().operator->()
-                                        : val.operator DLTensor*();
-    };
+  /* Stream and execution plan with own intermediate buffers, used by one Run at a time */
+  struct ExecutionContext {
+    tachikoma::stream stream;
+    TensorRegistry::ExecutionPlan plan;
+  };
+
+  std::unique_ptr<ExecutionContext> MakeContext() const {
+    auto ctx = std::make_unique<ExecutionContext>();
+    ctx->stream = tachikoma::stream(engine_);
+    ctx->plan = tensor_registry_.MakePlan(net_, run_arg_eid_);
+    return ctx;
+  }
 
-    std::map<uint32_t, const DLTensor*> io_map;  // eid to dl tensor map
-    for (size_t i = 0; i < run_arg_eid_.size(); i++) {
-      io_map[run_arg_eid_[i]] = extract_dl_tensor(args[i]);
+  /* Take idle context, or create new one under the limit, otherwise wait for release */
+  std::unique_ptr<ExecutionContext> AcquireContext() const {
+    {
+      std::unique_lock<std::mutex> lock(pool_mutex_);
+      pool_cv_.wait(lock, [this] {
+        return !idle_contexts_.empty() || num_contexts_ < max_contexts_;
+      });
+      if (!idle_contexts_.empty()) {
+        auto ctx = std::move(idle_contexts_.back());
+        idle_contexts_.pop_back();
+        return ctx;
+      }
+      num_contexts_++;
+    }
+    // Allocate intermediate buffers outside of the lock. Give the slot back on failure,
+    // otherwise waiters may block forever once the limit is reached.
+    try {
+      return MakeContext();
+    } catch (...) {
+      {
+        std::lock_guard<std::mutex> lock(pool_mutex_);
+        num_contexts_--;
+      }
+      pool_cv_.notify_one();
+      throw;
+    }
+  }
+
+  void ReleaseContext(std::unique_ptr<ExecutionContext> ctx) const {
+    {
+      std::lock_guard<std::mutex> lock(pool_mutex_);
+      idle_contexts_.push_back(std::move(ctx));
     }
+    pool_cv_.notify_one();
+  }
 
-    // lambda with captured IO data handlers
-    return [io_map](uint32_t eid) -> const DLTensor* { return io_map.at(eid); };
+  /* Return real DLTensor of InputOutput argument */
+  static const DLTensor* ExtractDLTensor(const TVMArgValue& val) {
+    ICHECK(val.type_code() == kTVMNDArrayHandle || val.type_code() == kTVMDLTensorHandle)
+        << "Expect NDArray or DLTensor";
+    return val.IsObjectRef<NDArray>() ? val.operator NDArray().operator->()
+                                      : val.operator DLTensor*();
   }
 
  private:
@@ -239,7 +302,6 @@ class TachikomaJSONRuntime : public JSONRuntimeBase {
   // Build up the engine based on the input graph.
   void BuildEngine() {
     engine_ = tachikoma::engine(tachikoma::engine::kind::cpu, 0);
-    stream_ = tachikoma::stream(engine_);
 
     std::set<uint32_t> io_eid_set(run_arg_eid_.begin(), run_arg_eid_.end());
     tensor_registry_ = TensorRegistry(engine_, io_eid_set);
@@ -287,6 +349,17 @@ class TachikomaJSONRuntime : public JSONRuntimeBase {
         }
       }
     }
+
+    // Freeze memory bindings of all primitives. First context is created eagerly.
+    idle_contexts_.push_back(MakeContext());
+    num_contexts_ = 1;
+
+    const auto& plan = idle_contexts_.back()->plan;
+    arena_size_ = plan.ArenaSize();
+    naive_size_ = plan.NaiveSize();
+    LOG(INFO) << "Tachikoma subgraph " << symbol_name_ << ": intermediate arena " << arena_size_
+              << " bytes vs. naive " << naive_size_ << " bytes, " << plan.NumInplace()
+              << " primitives in place";
   }
 
   void Convolution(const size_t& nid) {
@@ -862,7 +935,7 @@ class TachikomaJSONRuntime : public JSONRuntimeBase {
       prim_arg_id[key] = arg_id;
     }
 
-    // Simulate inplace primitive
+    // Simulate inplace primitive. Execution plan drops the copy if source dies here.
     if (auto tr = inplace_conf.first) {
       auto arg_id = tensor_registry_.Register(tr, &net_);
       auto dst_tr = tr_args.at(inplace_conf.second);
@@ -885,12 +958,21 @@ class TachikomaJSONRuntime : public JSONRuntimeBase {
 
   /* The tachikoma engine. */
   tachikoma::engine engine_;
-  /* The tachikoma stream. */
-  tachikoma::stream stream_;
   /* The network layers that are represented in tachikoma primitives. */
   TensorRegistry::ActionQue net_;
   /* Storage for all memory objects */
   TensorRegistry tensor_registry_;
+  /* Pool of execution contexts not used by any Run call */
+  mutable std::vector<std::unique_ptr<ExecutionContext>> idle_contexts_;
+  /* Number of created execution contexts */
+  mutable int num_contexts_ = 0;
+  /* Limit of execution contexts, i.e. parallel Run calls */
+  int max_contexts_ = 1;
+  /* Memory plan report, arena size and naive sum of intermediate buffers */
+  size_t arena_size_ = 0;
+  size_t naive_size_ = 0;
+  mutable std::mutex pool_mutex_;
+  mutable std::condition_variable pool_cv_;
   /* Generator of new unique eid which doesn't match with existing data entry */
   uint32_t next_unique_eid_offset_;
   /* Map of Run arg idx to corresponding eid */
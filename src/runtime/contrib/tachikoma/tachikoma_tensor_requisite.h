@@ -31,11 +31,15 @@
 
 #include <algorithm>
 #include <cstdint>
+#include <cstring>
+#include <functional>
 #include <limits>
 #include <map>
 #include <memory>
+#include <mutex>
 #include <set>
 #include <string>
+#include <string_view>
 #include <tuple>
 #include <unordered_map>
 #include <utility>
@@ -405,6 +409,25 @@ class TensorRequisite {
     return {};
   }
 
+  /*! \brief Check if const data is produced by reorder into a new buffer. */
+  bool IsReorderedConst() const { return orig_ && !reinterpret_ && IsConstant(); }
+
+  /*! \brief Descs from the source const memory to this TR, with reinterpretation flags. */
+  using TransformChain = std::vector<std::pair<tachikoma::memory::desc, bool>>;
+
+  /*!
+   * \brief Source const memory of TR and the chain of transformations applied to it.
+   *
+   * Same source content and chain means same resulting data, independent of which buffer holds
+   * the source. So the constants of different module instances of the same subgraph match.
+   */
+  tachikoma::memory ConstDataSource(TransformChain* chain) const {
+    ICHECK(IsConstant());
+    auto src = mem_ ? mem_ : orig_->ConstDataSource(chain);
+    chain->push_back({t_desc_, reinterpret_});
+    return src;
+  }
+
   /*!
    * \brief Return const data memory in form of vector.
    *
@@ -484,6 +507,70 @@ class TensorRequisite {
   friend class TensorRegistry;
 };
 
+/*!
+ * \brief Process wide cache of reordered constant data.
+ *
+ * Weights reordered into the preferred layouts of primitives are shared by all module instances
+ * of the same subgraph in the process, so only the first instance pays for the reorder and the
+ * memory. The hash of source content only selects the bucket. Entries keep a copy of the source
+ * bytes and the transformation chain, and a hit requires both to be equal. Entries expire with
+ * the last registry holding them.
+ */
+class ConstDataCache {
+ public:
+  using DataPtr = std::shared_ptr<const tachikoma::memory>;
+
+  static ConstDataCache* Global() {
+    static ConstDataCache inst;
+    return &inst;
+  }
+
+  /*! \brief Return cached const data of TR, or reorder and cache it. */
+  DataPtr GetOrCreate(const TensorRequisite& tr) {
+    TensorRequisite::TransformChain chain;
+    auto src = tr.ConstDataSource(&chain);
+    auto src_ptr = static_cast<const char*>(src.get_data_handle());
+    auto src_size = src.get_desc().get_size();
+    auto kind = src.get_engine().get_kind();
+    auto hash = std::hash<std::string_view>()(std::string_view(src_ptr, src_size));
+
+    std::lock_guard<std::mutex> lock(mutex_);
+    if (entries_.count(hash)) {
+      for (const auto& entry : entries_.at(hash)) {
+        if (entry.kind != kind || entry.chain != chain || entry.src.size() != src_size ||
+            std::memcmp(entry.src.data(), src_ptr, src_size) != 0)
+          continue;
+        if (auto data = entry.data.lock()) return data;
+      }
+    }
+
+    // Drop entries of unloaded modules.
+    for (auto it = entries_.begin(); it != entries_.end();) {
+      auto& bucket = it->second;
+      bucket.erase(std::remove_if(bucket.begin(), bucket.end(),
+                                  [](const Entry& entry) { return entry.data.expired(); }),
+                   bucket.end());
+      it = bucket.empty() ? entries_.erase(it) : std::next(it);
+    }
+    auto data = std::make_shared<const tachikoma::memory>(tr.GetConstData());
+    entries_[hash].push_back({kind, chain, std::vector<char>(src_ptr, src_ptr + src_size), data});
+    return data;
+  }
+
+ private:
+  struct Entry {
+    tachikoma::engine::kind kind;
+    TensorRequisite::TransformChain chain;
+    std::vector<char> src;
+    std::weak_ptr<const tachikoma::memory> data;
+  };
+
+  ConstDataCache() = default;
+
+  std::mutex mutex_;
+  std::unordered_map<size_t, std::vector<Entry>> entries_;
+};
+
 /*!
  * \brief The registry of tensors. Implement matching of provided TRs and real memory buffers.
  *
@@ -527,7 +614,14 @@ class TensorRegistry {
    * \return associated ArgId. Should be used as argument for MemSolver.
    */
   ArgId Register(const TensorRequisite& tr, ActionQue* action) {
-    // 1) Constant tensor. Direct reference
+    // 1) Constant tensor. Direct reference, reordered data is shared with other instances.
+    if (tr.IsReorderedConst()) {
+      auto const_data = ConstDataCache::Global()->GetOrCreate(tr);
+      const_data_holder_.push_back(const_data);
+      auto idx = const_mem_collection_.size();
+      const_mem_collection_.push_back(*const_data);
+      return MakeArgReq(ArgReqFlag::CONST, static_cast<uint32_t>(idx));
+    }
     if (auto const_data = tr.GetConstData()) {
       auto idx = const_mem_collection_.size();
       const_mem_collection_.push_back(const_data);
@@ -591,6 +685,233 @@ class TensorRegistry {
                          tmp_mem_collection_, tmp_mem_mapping_);
   }
 
+  /*!
+   * \brief Frozen execution plan of action queue.
+   *
+   * All ArgIds are resolved once. Constant and intermediate memory objects are bound into
+   * per primitive argument maps at construction. Memory objects of external IO tensors are
+   * shared by these maps, so each run only patches their data handles with BindIO.
+   *
+   * Intermediate buffers are placed into one arena by liveness, buffers which are never alive
+   * at the same primitive share memory. Copies and eltwise/binary primitives whose source dies
+   * at this primitive write in place of the source, and the pure copies are dropped.
+   *
+   * \note Plan owns intermediate buffers, it should not be executed concurrently.
+   */
+  class ExecutionPlan {
+   public:
+    ExecutionPlan() = default;
+
+    /*! \brief Patch data handle of IO tensor at position pos of io_eids */
+    void BindIO(size_t pos, void* data) {
+      ICHECK(data);
+      for (auto idx : io_pos2ext_mems_.at(pos)) ext_mems_[idx].set_data_handle(data);
+    }
+
+    /*! \brief Execute all primitives on provided stream */
+    void Execute(const tachikoma::stream& strm) const {
+      for (size_t i = 0; i < prims_.size(); i++) prims_[i].execute(strm, args_[i]);
+    }
+
+    /*! \brief Size in bytes of the arena shared by intermediate buffers */
+    size_t ArenaSize() const { return arena_size_; }
+
+    /*! \brief Size in bytes of intermediate buffers if allocated separately */
+    size_t NaiveSize() const { return naive_size_; }
+
+    /*! \brief Number of primitives executed in place of their source */
+    size_t NumInplace() const { return num_inplace_; }
+
+   private:
+    ExecutionPlan(const TensorRegistry& registry, const ActionQue& actions,
+                  const std::vector<uint32_t>& io_eids) {
+      const auto& tmp_descs = registry.tmp_mem_collection_;
+      const size_t num_tmp = tmp_descs.size();
+      const int64_t num_actions = static_cast<int64_t>(actions.size());
+
+      // Root buffer of each intermediate. Mapped ones reuse data of already registered buffer.
+      std::vector<size_t> root(num_tmp);
+      for (size_t i = 0; i < num_tmp; i++) {
+        auto found = registry.tmp_mem_mapping_.find(i);
+        root[i] = found != registry.tmp_mem_mapping_.end() ? root[found->second] : i;
+      }
+
+      // Groups of roots sharing the same memory, merged by in place execution.
+      std::vector<size_t> parent(num_tmp);
+      for (size_t i = 0; i < num_tmp; i++) parent[i] = i;
+      auto group_of = [&](const ArgId& ar) {
+        auto g = root[ar.idx_];
+        while (parent[g] != g) g = parent[g] = parent[parent[g]];
+        return g;
+      };
+
+      // Live range of each group in terms of action index.
+      std::vector<int64_t> first(num_tmp, num_actions), last(num_tmp, -1);
+      for (int64_t i = 0; i < num_actions; i++) {
+        for (const auto& kvp : std::get<1>(actions[i])) {
+          if (kvp.second.flag_ != TMP_STORAGE) continue;
+          auto g = group_of(kvp.second);
+          first[g] = std::min(first[g], i);
+          last[g] = std::max(last[g], i);
+        }
+      }
+
+      // Write dst in place of src if src dies here and dst is born here with the same layout.
+      // Zero group is the shared scratchpad, it never takes part in this.
+      std::vector<bool> dropped(actions.size(), false);
+      for (int64_t i = 0; i < num_actions; i++) {
+        const auto& prim = std::get<0>(actions[i]);
+        const auto& args = std::get<1>(actions[i]);
+        auto kind = prim.get_kind();
+        if (kind != tachikoma::primitive::kind::reorder &&
+            kind != tachikoma::primitive::kind::eltwise &&
+            kind != tachikoma::primitive::kind::binary)
+          continue;
+
+        // DNNL_ARG_FROM/DNNL_ARG_SRC_0 and DNNL_ARG_TO are aliases of DNNL_ARG_SRC and DST.
+        auto src_it = args.find(DNNL_ARG_SRC);
+        auto dst_it = args.find(DNNL_ARG_DST);
+        if (src_it == args.end() || dst_it == args.end()) continue;
+        const auto& src = src_it->second;
+        const auto& dst = dst_it->second;
+        if (src.flag_ != TMP_STORAGE || dst.flag_ != TMP_STORAGE) continue;
+        if (!(tmp_descs[src.idx_] == tmp_descs[dst.idx_])) continue;
+
+        auto src_g = group_of(src);
+        auto dst_g = group_of(dst);
+        if (src_g == dst_g || src_g == 0 || dst_g == 0) continue;
+        if (last[src_g] != i || first[dst_g] != i) continue;
+
+        // Other inputs, like broadcasted second operand, should not read the overwritten data.
+        bool src_shared = false;
+        for (const auto& kvp : args) {
+          if (kvp.first == DNNL_ARG_SRC || kvp.first == DNNL_ARG_DST) continue;
+          if (kvp.second.flag_ == TMP_STORAGE && group_of(kvp.second) == src_g) src_shared = true;
+        }
+        if (src_shared) continue;
+
+        parent[dst_g] = src_g;
+        last[src_g] = last[dst_g];
+        dropped[i] = kind == tachikoma::primitive::kind::reorder;
+        num_inplace_++;
+      }
+
+      // Greedy placement by size, each group takes the lowest offset free during its life.
+      std::vector<size_t> group_size(num_tmp, 0);
+      for (size_t i = 0; i < num_tmp; i++) {
+        if (root[i] != i) continue;
+        auto size = tmp_descs[i].get_size();
+        naive_size_ += size;
+        auto g = group_of({TMP_STORAGE, static_cast<uint32_t>(i)});
+        group_size[g] = std::max(group_size[g], AlignUp(size));
+      }
+      std::vector<size_t> order;
+      for (size_t g = 0; g < num_tmp; g++) {
+        if (parent[g] == g && group_size[g] > 0 && last[g] >= 0) order.push_back(g);
+      }
+      std::stable_sort(order.begin(), order.end(),
+                       [&](size_t a, size_t b) { return group_size[a] > group_size[b]; });
+
+      std::vector<size_t> offset(num_tmp, 0);
+      std::vector<size_t> placed;
+      for (auto g : order) {
+        std::vector<std::pair<size_t, size_t>> busy;
+        for (auto p : placed) {
+          if (first[p] <= last[g] && first[g] <= last[p])
+            busy.push_back({offset[p], offset[p] + group_size[p]});
+        }
+        std::sort(busy.begin(), busy.end());
+        size_t off = 0;
+        for (const auto& b : busy) {
+          if (off + group_size[g] <= b.first) break;
+          off = std::max(off, b.second);
+        }
+        offset[g] = off;
+        arena_size_ = std::max(arena_size_, off + group_size[g]);
+        placed.push_back(g);
+      }
+
+      uint8_t* base = nullptr;
+      if (arena_size_ > 0) {
+        arena_ = tachikoma::memory({{static_cast<tachikoma::memory::dim>(arena_size_)},
+                                    tachikoma::memory::data_type::u8,
+                                    tachikoma::memory::format_tag::a},
+                                   registry.eng_);
+        base = static_cast<uint8_t*>(arena_.get_data_handle());
+      }
+      std::vector<tachikoma::memory> tmp_mems(num_tmp);
+      for (size_t i = 0; i < num_tmp; i++) {
+        auto g = group_of({TMP_STORAGE, static_cast<uint32_t>(i)});
+        void* hdl = base ? base + offset[g] : DNNL_MEMORY_NONE;
+        tmp_mems[i] = tachikoma::memory(tmp_descs[i], registry.eng_, hdl);
+      }
+
+      // IO memory objects without data. Handles are patched by BindIO.
+      std::unordered_map<uint32_t, size_t> eid2pos;
+      for (size_t pos = 0; pos < io_eids.size(); pos++) eid2pos[io_eids[pos]] = pos;
+      io_pos2ext_mems_.resize(io_eids.size());
+      for (const auto& eid_and_desc : registry.ext_mem_collection_) {
+        io_pos2ext_mems_[eid2pos.at(eid_and_desc.first)].push_back(ext_mems_.size());
+        ext_mems_.push_back(
+            tachikoma::memory(eid_and_desc.second, registry.eng_, DNNL_MEMORY_NONE));
+      }
+
+      auto resolve = [&](const ArgId& ar) -> tachikoma::memory {
+        switch (ar.flag_) {
+          case CONST:
+            return registry.const_mem_collection_.at(ar.idx_);
+          case TMP_STORAGE:
+            return tmp_mems.at(ar.idx_);
+          case EXT_EID:
+            return ext_mems_.at(ar.idx_);
+        }
+        return {};
+      };
+
+      prims_.reserve(actions.size());
+      args_.reserve(actions.size());
+      for (size_t i = 0; i < actions.size(); i++) {
+        if (dropped[i]) continue;
+        std::unordered_map<int, tachikoma::memory> mem_args;
+        for (const auto& kvp : std::get<1>(actions[i])) mem_args[kvp.first] = resolve(kvp.second);
+        prims_.push_back(std::get<0>(actions[i]));
+        args_.push_back(std::move(mem_args));
+      }
+    }
+
+    /* Round size up to alignment of buffers in arena */
+    static size_t AlignUp(size_t size) {
+      constexpr size_t kAlignment = 64;
+      return (size + kAlignment - 1) / kAlignment * kAlignment;
+    }
+
+    /* Primitives in execution order */
+    std::vector<tachikoma::primitive> prims_;
+    /* Pre-bound memory arguments of each primitive */
+    std::vector<std::unordered_map<int, tachikoma::memory>> args_;
+    /* Memory objects of external IO tensors, shared with args_ */
+    std::vector<tachikoma::memory> ext_mems_;
+    /* Indices in ext_mems_ of each IO tensor position */
+    std::vector<std::vector<size_t>> io_pos2ext_mems_;
+    /* Arena holding all intermediate buffers */
+    tachikoma::memory arena_;
+    size_t arena_size_ = 0;
+    size_t naive_size_ = 0;
+    size_t num_inplace_ = 0;
+
+    friend class TensorRegistry;
+  };
+
+  /*!
+   * \brief Construct execution plan of actions for all registered TRs.
+   * \param actions action queue with ArgIds produced by this registry
+   * \param io_eids eids of external IO tensors in order of BindIO positions
+   * \return execution plan with all non-IO memory objects bound
+   */
+  ExecutionPlan MakePlan(const ActionQue& actions, const std::vector<uint32_t>& io_eids) const {
+    return ExecutionPlan(*this, actions, io_eids);
+  }
+
  private:
   ArgId RegisterReinterpret(ArgId src_ar, const tachikoma::memory::desc& desc) {
     switch (src_ar.flag_) {
@@ -694,6 +1015,9 @@ class TensorRegistry {
   /* Collection of const memory objects. */
   std::vector<tachikoma::memory> const_mem_collection_;
 
+  /* References of cached const data, keep them alive in ConstDataCache. */
+  std::vector<ConstDataCache::DataPtr> const_data_holder_;
+
   /* Collection of intermediate memory descriptors. Zero position is reserved for scratchpads. */
   std::vector<tachikoma::memory::desc> tmp_mem_collection_;
 
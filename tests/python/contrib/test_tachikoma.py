@@ -650,6 +650,38 @@ def test_multiple_outputs(run_module, dtype="float32"):
     run_and_verify_func(get_graph(), run_module=run_module, dtype=dtype)
 
 
+def test_memory_plan(run_module, dtype="float32"):
+    x_shape = (1, 32, 8, 8)
+    x = relay.var("x", shape=x_shape, dtype=dtype)
+    out = x
+    for _ in range(3):
+        w = relay.const(np.random.uniform(-1, 1, (32, 32, 3, 3)).astype(dtype))
+        out = relay.nn.conv2d(out, w, kernel_size=(3, 3), padding=(1, 1), channels=32)
+        out = relay.sigmoid(relay.nn.relu(out))
+    mod = tvm.IRModule.from_expr(out)
+
+    with tvm.transform.PassContext(opt_level=3):
+        ref_lib = relay.build(mod, target="llvm")
+        lib = relay.build(partition_for_tachikoma(mod, alter_layout=False), target="llvm")
+    if not run_module:
+        return
+
+    data = np.random.uniform(-1, 1, x_shape).astype(dtype)
+    outputs = []
+    for built in [ref_lib, lib]:
+        gm = tvm.contrib.graph_executor.GraphModule(built["default"](tvm.cpu()))
+        gm.set_input("x", data)
+        gm.run()
+        outputs.append(gm.get_output(0).numpy())
+    tvm.testing.assert_allclose(outputs[0], outputs[1], rtol=1e-5, atol=1e-5)
+
+    # intermediates with disjoint live ranges share the arena
+    tachikoma_mods = [m for m in lib.get_lib().imported_modules if m.type_key == "tachikoma_json"]
+    assert tachikoma_mods
+    for m in tachikoma_mods:
+        assert m["get_arena_size"]() <= m["get_naive_memory_size"]()
+
+
 def test_elementwise(run_module, dtype="float32"):
     def get_graph(op, x_shape=(1, 8, 3, 3)):
         x = relay.var("x", shape=(x_shape), dtype=dtype)
@@ -1503,6 +1535,8 @@ qp_asymmetric_data = qp_regular._replace(
     d_zp=3, rq_zp=10, rq_scl=0.1, sum_zp=15, sum_scl=0.3, o_zp=4
 )
 
+qnn_dst_dtype = tvm.testing.parameter("uint8", "int8")
+
 qnn_conv_profiles = tvm.testing.parameter(
     by_dict={
         #  Pattern qnn.conv2d + qnn.requantize
@@ -1523,9 +1557,10 @@ qnn_conv_profiles = tvm.testing.parameter(
 
 
 @has_tachikoma_codegen
-def test_qnn_conv2d(qnn_conv_profiles):
-    def generate_model(p, c, q):
+def test_qnn_conv2d(qnn_conv_profiles, qnn_dst_dtype):
+    def generate_model(p, c, q, dst_dtype):
         np.random.seed(0)
+        dst_min, dst_max = np.iinfo(dst_dtype).min, np.iinfo(dst_dtype).max
 
         N, IC, IH, IW = p.SHAPE
         d_shape = p.SHAPE
@@ -1591,25 +1626,27 @@ def test_qnn_conv2d(qnn_conv_profiles):
             op, rq_in_scl, rq_in_zp, rq_out_scl, rq_out_zp, out_dtype="int32"
         )
         op = tvm.relay.clip(
-            op, a_min=0.0, a_max=255.0
+            op, a_min=float(dst_min), a_max=float(dst_max)
         )  # pytorch frontend specific, I guess it's redundant
-        op = tvm.relay.cast(op, dtype="uint8")
+        op = tvm.relay.cast(op, dtype=dst_dtype)
 
         # Optional sum (ResNet like)
         if c.Sum is not None:
-            sum_in = bld.arg(dtype="uint8", shape=s_shape, filler=filler_uni(0, 10), is_const=c.Sum)
+            sum_in = bld.arg(
+                dtype=dst_dtype, shape=s_shape, filler=filler_uni(0, 10), is_const=c.Sum
+            )
 
             lhs_zp, lhs_scl = bld.make_zp_and_scl("rq")
             rhs_zp, rhs_scl = bld.make_zp_and_scl("sum")
             out_zp, out_scl = bld.make_zp_and_scl("o")
 
             op = tvm.relay.qnn.op.add(op, sum_in, lhs_scl, lhs_zp, rhs_scl, rhs_zp, out_scl, out_zp)
-            op = tvm.relay.clip(op, a_min=0.0, a_max=255.0)
+            op = tvm.relay.clip(op, a_min=float(dst_min), a_max=float(dst_max))
 
         return bld.finalize(op)
 
     conv_p, arg_p, quant_p = qnn_conv_profiles
-    ref_mod, args = generate_model(conv_p, arg_p, quant_p)
+    ref_mod, args = generate_model(conv_p, arg_p, quant_p, qnn_dst_dtype)
     mod = partition_for_tachikoma(ref_mod)
 
     # atol=1 means int values should match with +-1 quantum value tolerance
@@ -1699,9 +1736,10 @@ qnn_dense_profiles = tvm.testing.parameter(
 
 
 @has_tachikoma_codegen
-def test_qnn_dense(qnn_dense_profiles):
-    def generate_model(p, c, q):
+def test_qnn_dense(qnn_dense_profiles, qnn_dst_dtype):
+    def generate_model(p, c, q, dst_dtype):
         np.random.seed(0)
+        dst_min, dst_max = np.iinfo(dst_dtype).min, np.iinfo(dst_dtype).max
 
         d_shape = [p.N, p.IC]
         w_shape = [p.OC, p.IC]
@@ -1737,25 +1775,27 @@ def test_qnn_dense(qnn_dense_profiles):
             op, rq_in_scl, rq_in_zp, rq_out_scl, rq_out_zp, out_dtype="int32"
         )
         op = tvm.relay.clip(
-            op, a_min=0.0, a_max=255.0
+            op, a_min=float(dst_min), a_max=float(dst_max)
         )  # pytorch frontend specific, I guess it's redundant
-        op = tvm.relay.cast(op, dtype="uint8")
+        op = tvm.relay.cast(op, dtype=dst_dtype)
 
         # Optional sum (ResNet like)
         if c.Sum is not None:
-            sum_in = bld.arg(dtype="uint8", shape=s_shape, filler=filler_uni(0, 10), is_const=c.Sum)
+            sum_in = bld.arg(
+                dtype=dst_dtype, shape=s_shape, filler=filler_uni(0, 10), is_const=c.Sum
+            )
 
             lhs_zp, lhs_scl = bld.make_zp_and_scl("rq")
             rhs_zp, rhs_scl = bld.make_zp_and_scl("sum")
             out_zp, out_scl = bld.make_zp_and_scl("o")
 
             op = tvm.relay.qnn.op.add(op, sum_in, lhs_scl, lhs_zp, rhs_scl, rhs_zp, out_scl, out_zp)
-            op = tvm.relay.clip(op, a_min=0.0, a_max=255.0)
+            op = tvm.relay.clip(op, a_min=float(dst_min), a_max=float(dst_max))
 
         return bld.finalize(op)
 
     conv_p, arg_p, quant_p = qnn_dense_profiles
-    ref_mod, args = generate_model(conv_p, arg_p, quant_p)
+    ref_mod, args = generate_model(conv_p, arg_p, quant_p, qnn_dst_dtype)
     mod = partition_for_tachikoma(ref_mod)
 
     # atol=1 means int values should match with +-1 quantum value tolerance
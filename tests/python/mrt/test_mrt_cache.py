@@ -0,0 +1,118 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+import numpy as np
+import pytest
+
+import tvm
+import tvm.testing
+from tvm import relay
+from tvm.mrt import cache
+from tvm.mrt.dataset import MemoryDataset
+from tvm.mrt.trace import Trace
+
+
+def _trace(seed=0):
+    x = relay.var("x", shape=(2, 4), dtype="float32")
+    w = relay.var("w", shape=(3, 4), dtype="float32")
+    out = relay.nn.relu(relay.nn.dense(x, w))
+    w_val = np.random.RandomState(seed).randn(3, 4).astype("float32")
+    return Trace.from_expr(out, {"w": tvm.nd.array(w_val)})
+
+
+def _dataset(num_batches, offset=0.0):
+    rng = np.random.RandomState(1)
+    return MemoryDataset(
+        [
+            (rng.randn(2, 4).astype("float32") + offset, np.zeros(2, "int64"))
+            for _ in range(num_batches)
+        ]
+    )
+
+
+@pytest.fixture
+def calibrate_calls(monkeypatch):
+    calls = []
+    calibrate = Trace.calibrate
+
+    def _calibrate(self, *args, **kwargs):
+        calls.append(self.name)
+        return calibrate(self, *args, **kwargs)
+
+    monkeypatch.setattr(Trace, "calibrate", _calibrate)
+    return calls
+
+
+def _assert_summaries_equal(a, b):
+    assert a.keys() == b.keys()
+    for name in a:
+        for field in a[name]:
+            np.testing.assert_array_equal(a[name][field], b[name][field])
+
+
+def test_calibrate_stats_cache_hit(tmp_path, calibrate_calls):
+    tr, ds = _trace(), _dataset(3)
+    first = tr.calibrate_stats(ds, bins=16, cache_root=str(tmp_path))
+    assert len(calibrate_calls) == 3
+
+    second = tr.calibrate_stats(ds, bins=16, cache_root=str(tmp_path))
+    assert len(calibrate_calls) == 3
+    _assert_summaries_equal(first, second)
+
+
+def test_calibrate_stats_cache_miss(tmp_path, calibrate_calls):
+    _trace().calibrate_stats(_dataset(2), bins=16, cache_root=str(tmp_path))
+    assert len(calibrate_calls) == 2
+
+    # model params changed
+    _trace(seed=1).calibrate_stats(_dataset(2), bins=16, cache_root=str(tmp_path))
+    assert len(calibrate_calls) == 4
+
+    # dataset content changed
+    _trace().calibrate_stats(_dataset(2, offset=1.0), bins=16, cache_root=str(tmp_path))
+    assert len(calibrate_calls) == 6
+
+
+def test_calibrate_stats_extends_cache(tmp_path, calibrate_calls):
+    tr, ds = _trace(), _dataset(4)
+    tr.calibrate_stats(ds, max_iter_num=2, bins=16, cache_root=str(tmp_path))
+    assert len(calibrate_calls) == 2
+
+    # only the two new batches are calibrated
+    extended = tr.calibrate_stats(ds, bins=16, cache_root=str(tmp_path))
+    assert len(calibrate_calls) == 4
+    expect = tr.calibrate_stats(ds, bins=16, cache_root=str(tmp_path), use_cache=False)
+    _assert_summaries_equal(extended, expect)
+
+
+def test_merge_summaries_rebins_histograms():
+    a = cache.summarize(np.array([0.5, -1.0], "float32"), bins=4)
+    b = cache.summarize(np.array([2.0, 3.5, -4.0], "float32"), bins=4)
+    merged = cache.merge_summaries([a, b])
+    assert float(merged["min"]) == -4.0
+    assert float(merged["max"]) == 3.5
+    assert float(merged["absmax"]) == 4.0
+    assert merged["hist"].sum() == 5
+
+    # summaries of the same range are merged exactly
+    c = cache.summarize(np.array([4.0, 1.5], "float32"), bins=4)
+    merged = cache.merge_summaries([b, c])
+    expect = cache.summarize(np.array([2.0, 3.5, -4.0, 4.0, 1.5], "float32"), bins=4)
+    np.testing.assert_array_equal(merged["hist"], expect["hist"])
+
+
+if __name__ == "__main__":
+    tvm.testing.main()
@@ -0,0 +1,98 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+import numpy as np
+
+import tvm
+import tvm.testing
+from tvm.mrt.symbol import *
+from tvm.mrt.trace import Trace
+from tvm.mrt.circuit import ConstraintCount, circuit_report, symbol_cost
+
+
+def _var(name, shape, dtype="float32"):
+    var = Symbol.variable(name)
+    var.attrs.update({"shape": list(shape), "dtype": dtype})
+    return var
+
+
+def _op(name, op_name, args, shape, dtype="float32", **attrs):
+    attrs.update({"shape": list(shape), "dtype": dtype})
+    return Symbol(name, op_name, args, attrs)
+
+
+def test_symbol_cost():
+    x = _var("x", (2, 8), "int8")
+    y = _var("y", (2, 8), "int8")
+    w = _var("w", (4, 8), "int8")
+    s = _var("s", (1,), "int32")
+    params = {"w": np.ones((4, 8), "int8"), "s": np.array([3], "int32")}
+
+    def _cost(sym):
+        return symbol_cost(sym, params)
+
+    assert _cost(x) == ConstraintCount()
+    assert _cost(_op("d", "nn.dense", [x, w], (2, 4), "int32")) == ConstraintCount(mul=64)
+    assert _cost(_op("m", "multiply", [x, w], (2, 8), "int8")) == ConstraintCount()
+    assert _cost(_op("m", "multiply", [x, y], (2, 8), "int8")) == ConstraintCount(mul=16)
+    assert _cost(_op("a", "add", [x, y], (2, 8), "int8")) == ConstraintCount()
+    # comparisons are range checks for integers and lookups for floats
+    assert _cost(_op("r", "nn.relu", [x], (2, 8), "int8")) == ConstraintCount(range=16 * 8)
+    assert _cost(_op("c", "clip", [x], (2, 8), "int8")) == ConstraintCount(range=16 * 2 * 8)
+    fx = _var("fx", (2, 8))
+    assert _cost(_op("r", "nn.relu", [fx], (2, 8))) == ConstraintCount(lookup=16)
+    # quotient and remainder of the shift
+    shift = _op("sh", "right_shift", [x, s], (2, 8), "int32")
+    assert _cost(shift) == ConstraintCount(range=16 * (3 + 32))
+    # narrowing cast checks the target range, widening is free
+    x32 = _var("x32", (2, 8), "int32")
+    assert _cost(_op("c", "cast", [x32], (2, 8), "int8")) == ConstraintCount(range=16 * 8)
+    assert _cost(_op("c", "cast", [x], (2, 8), "int32")) == ConstraintCount()
+    # unregistered operator is a lookup per element
+    assert _cost(_op("e", "exp", [fx], (2, 8))) == ConstraintCount(lookup=16)
+
+
+def test_symbol_cost_tuple_output():
+    x = _var("x", (2, 6))
+    split = _op("split", "split", [x], [(2, 2)] * 3, ["float32"] * 3, axis=1)
+    assert symbol_cost(split, {}) == ConstraintCount()
+    # unregistered tuple op counts the elements of every field
+    topk = _op("topk", "topk", [x], [(2, 3), (2, 3)], ["float32", "int32"], k=3)
+    assert symbol_cost(topk, {}) == ConstraintCount(lookup=12)
+
+
+def test_circuit_report_with_tuple_op():
+    x = _var("x", (1, 4, 3, 3))
+    w = _var("w", (8, 36))
+    bn_args = [_var(n, (4,)) for n in ["gamma", "beta", "mean", "var"]]
+    params = {v.name: np.ones(v.shape, "float32") for v in [w] + bn_args}
+    bn = _op("bn", "nn.batch_norm", [x] + bn_args, [(1, 4, 3, 3), (4,), (4,)], ["float32"] * 3)
+    item = _op("item", TUPLE_GET_ITEM_NAME, [bn], (1, 4, 3, 3), index=0)
+    flat = _op("flat", "nn.batch_flatten", [item], (1, 36))
+    dense = _op("dense", "nn.dense", [flat, w], (1, 8))
+    relu = _op("relu", "nn.relu", [dense], (1, 8))
+
+    report = circuit_report(Trace("init", relu, params))
+    assert report.symbols["bn"] == ConstraintCount(lookup=36 + 4 + 4)
+    assert report.layer_of["bn"] == "input"
+    assert report.layer_of["relu"] == "dense"
+    assert report.layers["dense"] == ConstraintCount(mul=8 * 36, lookup=8)
+    assert report.model == report.layers["input"] + report.layers["dense"]
+    assert report.to_json()["model"]["total"] == 36 + 8 + 8 * 36 + 8
+
+
+if __name__ == "__main__":
+    tvm.testing.main()
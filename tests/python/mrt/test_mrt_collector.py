@@ -0,0 +1,127 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+import numpy as np
+import pytest
+
+import tvm
+import tvm.testing
+from tvm.mrt.collector import (
+    HistogramCollector,
+    KLDivergenceCollector,
+    MinMaxCollector,
+    PercentileCollector,
+)
+
+
+def _batches(num=4, seed=0):
+    rng = np.random.RandomState(seed)
+    return [rng.randn(16, 32).astype("float32") * (i + 1) for i in range(num)]
+
+
+def test_minmax_streaming():
+    batches = _batches()
+    col = MinMaxCollector()
+    assert col.absmax == 0.0
+    for b in batches:
+        col.update(b)
+    data = np.concatenate(batches)
+    assert col.result() == (float(data.min()), float(data.max()))
+    assert col.absmax == float(np.abs(data).max())
+
+
+def test_minmax_merge():
+    batches = _batches()
+    left, right = MinMaxCollector(), MinMaxCollector()
+    for b in batches[:2]:
+        left.update(b)
+    for b in batches[2:]:
+        right.update(b)
+    data = np.concatenate(batches)
+    assert left.merge(right).result() == (float(data.min()), float(data.max()))
+    assert MinMaxCollector().merge(MinMaxCollector()).result() == (None, None)
+
+
+def test_histogram_streaming():
+    batches = _batches()
+    col = HistogramCollector(num_bins=101)
+    for b in batches:
+        col.update(b)
+    data = np.concatenate(batches)
+    hist, edges = col.result()
+    assert col.thres == float(np.abs(data).max())
+    assert edges[0] == -col.thres and edges[-1] == col.thres
+    # the re-binning keeps the total count
+    tvm.testing.assert_allclose(hist.sum(), data.size)
+    # and the distribution is close to the histogram of all data
+    expect, _ = np.histogram(data, bins=101, range=(-col.thres, col.thres))
+    assert np.abs(np.cumsum(hist) - np.cumsum(expect)).max() < 0.02 * data.size
+
+
+def test_histogram_merge():
+    batches = _batches()
+    left, right = HistogramCollector(num_bins=101), HistogramCollector(num_bins=101)
+    for b in batches[:3]:
+        left.update(b)
+    right.update(batches[3])
+    left.merge(right)
+    assert left.thres == float(np.abs(batches[3]).max())
+    tvm.testing.assert_allclose(left.hist.sum(), sum(b.size for b in batches))
+
+
+def test_kl_divergence_threshold():
+    col = KLDivergenceCollector()
+    assert col.result() == 0.0
+    for b in _batches():
+        col.update(b)
+    assert 0 < col.result() <= col.thres
+
+
+def test_percentile_exact_within_reservoir():
+    batches = _batches()
+    col = PercentileCollector(percentiles=[50, 99], reservoir_size=4096)
+    for b in batches:
+        col.update(b)
+    data = np.abs(np.concatenate(batches)).reshape(-1)
+    tvm.testing.assert_allclose(col.result(), np.percentile(data, [50, 99]), rtol=1e-6)
+
+
+def test_percentile_reservoir_sampling():
+    data = np.random.RandomState(0).randn(1 << 16).astype("float32")
+    col = PercentileCollector(percentiles=[50, 90], reservoir_size=8192)
+    for b in np.split(data, 16):
+        col.update(b)
+    assert col.seen == data.size
+    assert col.samples.size == 8192
+    tvm.testing.assert_allclose(
+        col.result(), np.percentile(np.abs(data), [50, 90]), rtol=0.05
+    )
+
+
+def test_percentile_merge():
+    data = np.random.RandomState(0).randn(1 << 15).astype("float32")
+    left = PercentileCollector(percentiles=[50], reservoir_size=4096, seed=1)
+    right = PercentileCollector(percentiles=[50], reservoir_size=4096, seed=2)
+    left.update(data[:8192])
+    right.update(data[8192:])
+    left.merge(right)
+    assert left.seen == data.size
+    tvm.testing.assert_allclose(left.result(), np.percentile(np.abs(data), [50]), rtol=0.05)
+    assert PercentileCollector().merge(PercentileCollector()).result() == [0.0, 0.0]
+
+
+if __name__ == "__main__":
+    tvm.testing.main()
@@ -0,0 +1,117 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+import numpy as np
+import pytest
+
+import tvm
+import tvm.testing
+from tvm.mrt.dataset import MemoryDataset, ShardedDataset
+
+
+def _memory_dataset(total=10, batch=3):
+    data = np.arange(total * 2 * 2, dtype="float32").reshape(total, 2, 2)
+    label = np.arange(total, dtype="int64")
+    return MemoryDataset(
+        [(data[i : i + batch], label[i : i + batch]) for i in range(0, total, batch)]
+    ), data, label
+
+
+def _collect(dataset):
+    datas, labels = [], []
+    dataset.reset()
+    while True:
+        dl = dataset.next()
+        if dl is None:
+            break
+        datas.append(np.asarray(dl[0]))
+        labels.append(np.asarray(dl[1]))
+    return datas, labels
+
+
+def test_sharded_dataset_round_trip(tmp_path):
+    mem, data, label = _memory_dataset()
+    ShardedDataset.write(str(tmp_path), mem, shard_size=4)
+    assert sorted(p.name for p in tmp_path.glob("shard-*.npy")) == [
+        "shard-00000.npy",
+        "shard-00001.npy",
+        "shard-00002.npy",
+    ]
+
+    ds = ShardedDataset(str(tmp_path), batch_size=3)
+    assert len(ds) == 10
+    assert ds.data_shape == (2, 2)
+    assert ds.dtype == "float32"
+    datas, labels = _collect(ds)
+    # batches cross the shard boundaries, the last one is smaller
+    assert [d.shape[0] for d in datas] == [3, 3, 3, 1]
+    np.testing.assert_array_equal(np.concatenate(datas), data)
+    np.testing.assert_array_equal(np.concatenate(labels), label)
+
+    np.testing.assert_array_equal(ds[5][0], data[5])
+    assert ds[-1][1] == label[-1]
+    with pytest.raises(IndexError):
+        ds[10]
+
+
+@pytest.mark.parametrize("num_workers", [1, 3, 4])
+def test_sharded_dataset_workers(tmp_path, num_workers):
+    mem, _, label = _memory_dataset()
+    ShardedDataset.write(str(tmp_path), mem, shard_size=4)
+
+    workers = [
+        ShardedDataset(str(tmp_path), batch_size=2, num_workers=num_workers, worker_index=i)
+        for i in range(num_workers)
+    ]
+    labels = [np.concatenate(_collect(w)[1]) for w in workers]
+    # contiguous ranges cover all samples exactly once
+    np.testing.assert_array_equal(np.concatenate(labels), label)
+    assert len(set(w.fingerprint() for w in workers)) == num_workers
+
+
+def test_sharded_dataset_fingerprint(tmp_path):
+    mem, _, _ = _memory_dataset()
+    ShardedDataset.write(str(tmp_path), mem, shard_size=4)
+    ds = ShardedDataset(str(tmp_path), batch_size=3)
+    assert ds.fingerprint() == ShardedDataset(str(tmp_path), batch_size=3).fingerprint()
+    assert ds.fingerprint() != ShardedDataset(str(tmp_path), batch_size=2).fingerprint()
+
+
+def test_sharded_dataset_fingerprint_covers_shard_data(tmp_path):
+    mem, data, label = _memory_dataset()
+    ShardedDataset.write(str(tmp_path / "a"), mem, shard_size=4)
+    # same labels and counts, different preprocessing
+    batches = [(d + 1, l) for d, l in mem.data]
+    ShardedDataset.write(str(tmp_path / "b"), MemoryDataset(batches), shard_size=4)
+
+    ds_a = ShardedDataset(str(tmp_path / "a"), batch_size=3)
+    ds_b = ShardedDataset(str(tmp_path / "b"), batch_size=3)
+    assert ds_a.fingerprint() != ds_b.fingerprint()
+
+    # chunked streaming hashes the same content
+    ds_a.fingerprint_chunk = 1
+    assert ds_a.fingerprint() == ShardedDataset(str(tmp_path / "a"), batch_size=3).fingerprint()
+
+
+def test_sharded_dataset_invalid_worker(tmp_path):
+    mem, _, _ = _memory_dataset()
+    ShardedDataset.write(str(tmp_path), mem)
+    with pytest.raises(AssertionError):
+        ShardedDataset(str(tmp_path), num_workers=2, worker_index=2)
+
+
+if __name__ == "__main__":
+    tvm.testing.main()
@@ -0,0 +1,132 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+import numpy as np
+
+import tvm
+import tvm.testing
+from tvm.mrt.symbol import *
+from tvm.mrt.trace import Trace
+from tvm.mrt.fuse import fuse
+from tvm.mrt import topi
+
+
+def _var(name, shape, dtype="float32"):
+    var = Symbol.variable(name)
+    var.attrs.update({"shape": list(shape), "dtype": dtype})
+    return var
+
+
+def _op(name, op_name, args, shape, dtype="float32", **attrs):
+    attrs.update({"shape": list(shape), "dtype": dtype})
+    return Symbol(name, op_name, args, attrs)
+
+
+def _dense_bn(name, x, w):
+    dense = _op(name, "nn.dense", [x, w], (2, 8))
+    bn_args = [_var("{}_{}".format(name, p), (8,)) for p in ["gamma", "beta", "mean", "var"]]
+    bn = Symbol(
+        name + "_bn",
+        "nn.batch_norm",
+        [dense] + bn_args,
+        {
+            "axis": 1,
+            "epsilon": 1e-5,
+            "center": True,
+            "scale": True,
+            "shape": [[2, 8], [8], [8]],
+            "dtype": ["float32"] * 3,
+        },
+    )
+    out = _op(name + "_out", TUPLE_GET_ITEM_NAME, [bn], (2, 8), index=0)
+    return out, bn_args
+
+
+def _bn_params(bn_args, seed):
+    rng = np.random.RandomState(seed)
+    gamma, beta, mean = [rng.randn(8).astype("float32") for _ in range(3)]
+    var = rng.uniform(0.5, 2, 8).astype("float32")
+    return dict(zip([a.name for a in bn_args], [gamma, beta, mean, var]))
+
+
+def _shared_weight_trace(same_bn):
+    x = _var("x", (2, 4))
+    w = _var("w", (8, 4))
+    a, a_bn = _dense_bn("a", x, w)
+    b, b_bn = _dense_bn("b", x, w)
+    out = _op("add", "add", [a, b], (2, 8))
+    params = {"w": np.random.randn(8, 4).astype("float32")}
+    params.update(_bn_params(a_bn, 0))
+    params.update(_bn_params(b_bn, 0 if same_bn else 1))
+    if same_bn:
+        for p in ["gamma", "beta", "mean", "var"]:
+            params["b_" + p] = params["a_" + p]
+    return Trace("init", out, params)
+
+
+def _run(tr, data):
+    return topi.run_symbol(tr.symbol, tr.params, data)[tr.symbol.name]
+
+
+def _ops(tr):
+    return [s.op_name for s in sym2list(tr.symbol) if not is_variable(s)]
+
+
+def test_fuse_shared_weight():
+    tr = _shared_weight_trace(same_bn=False)
+    fused = fuse(tr)
+    assert "nn.batch_norm" not in _ops(fused)
+    assert {"w_bn", "w_bn_1"} <= set(fused.params)
+
+    data = np.random.randn(2, 4).astype("float32")
+    tvm.testing.assert_allclose(_run(fused, data), _run(tr, data), rtol=1e-4, atol=1e-5)
+
+
+def test_fuse_shared_weight_reuses_identical_param():
+    tr = _shared_weight_trace(same_bn=True)
+    fused = fuse(tr)
+    assert "w_bn" in fused.params
+    assert "w_bn_1" not in fused.params
+
+    data = np.random.randn(2, 4).astype("float32")
+    tvm.testing.assert_allclose(_run(fused, data), _run(tr, data), rtol=1e-4, atol=1e-5)
+
+
+def test_fuse_twice():
+    tr = _shared_weight_trace(same_bn=False)
+    fused = fuse(tr)
+    again = fuse(fused)
+    assert _ops(again) == _ops(fused)
+
+    data = np.random.randn(2, 4).astype("float32")
+    tvm.testing.assert_allclose(_run(again, data), _run(tr, data), rtol=1e-4, atol=1e-5)
+
+
+def test_fuse_relu_clip_chain():
+    x = _var("x", (2, 8))
+    relu = _op("relu", "nn.relu", [x], (2, 8))
+    clip = _op("clip", "clip", [relu], (2, 8), a_min=-1.0, a_max=6.0)
+    relu2 = _op("relu2", "nn.relu", [clip], (2, 8))
+    tr = Trace("init", relu2, {})
+    fused = fuse(tr)
+    assert _ops(fused) == ["clip"]
+
+    data = np.random.randn(2, 8).astype("float32") * 10
+    np.testing.assert_array_equal(_run(fused, data), np.clip(data, 0, 6))
+
+
+if __name__ == "__main__":
+    tvm.testing.main()
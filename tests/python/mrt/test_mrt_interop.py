@@ -0,0 +1,76 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+import numpy as np
+
+import tvm
+import tvm.testing
+from tvm.mrt import interop
+
+
+def _stats_delta(func):
+    interop.reset_copy_stats()
+    out = func()
+    return out, interop.copy_stats()
+
+
+def test_ndarray_numpy_view():
+    arr = tvm.nd.array(np.arange(12, dtype="float32").reshape(3, 4))
+    out, stats = _stats_delta(lambda: interop.as_numpy(arr))
+    assert stats["numpy_view"] == 1 and stats["copy_bytes"] == 0
+    # the view shares the NDArray buffer
+    assert not out.flags["WRITEABLE"]
+    arr.copyfrom(np.full((3, 4), 42, dtype="float32"))
+    assert out[0, 0] == 42
+
+
+def test_numpy_ndarray_view():
+    data = interop.empty((3, 4), "float32")
+    assert interop.is_shareable(data)
+    data[...] = 1
+    out, stats = _stats_delta(lambda: interop.as_ndarray(data))
+    assert stats["ndarray_view"] == 1 and stats["copy_bytes"] == 0
+    data[1, 1] = 7
+    assert out.numpy()[1, 1] == 7
+
+
+def test_numpy_ndarray_copy():
+    # transposed array is not contiguous
+    data = np.arange(12, dtype="float32").reshape(3, 4).T
+    assert not interop.is_shareable(data)
+    out, stats = _stats_delta(lambda: interop.as_ndarray(data))
+    assert stats["ndarray_copy"] == 1
+    assert stats["copy_bytes"] == data.nbytes
+    np.testing.assert_array_equal(out.numpy(), data)
+
+
+def test_passthrough():
+    data = np.zeros((2,), "float32")
+    arr = tvm.nd.array(data)
+    _, stats = _stats_delta(lambda: (interop.as_numpy(data), interop.as_ndarray(arr)))
+    assert interop.as_numpy(data) is data
+    assert interop.as_ndarray(arr) is arr
+    assert sum(stats.values()) == 0
+
+
+def test_randn():
+    data = interop.randn((4, 5), "float32")
+    assert data.shape == (4, 5) and data.dtype == "float32"
+    assert interop.is_shareable(data)
+
+
+if __name__ == "__main__":
+    tvm.testing.main()
@@ -0,0 +1,121 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+import numpy as np
+import pytest
+
+import tvm
+import tvm.testing
+from tvm.mrt.symbol import *
+from tvm.mrt.trace import Trace
+from tvm.mrt.precision import PrecisionSearch, fake_quantize, mac_bits_cost
+from tvm.mrt import topi
+
+
+def _var(name, shape, dtype="float32"):
+    var = Symbol.variable(name)
+    var.attrs.update({"shape": list(shape), "dtype": dtype})
+    return var
+
+
+def _op(name, op_name, args, shape, dtype="float32", **attrs):
+    attrs.update({"shape": list(shape), "dtype": dtype})
+    return Symbol(name, op_name, args, attrs)
+
+
+def _searcher():
+    x = _var("x", (4, 16))
+    w1 = _var("w1", (32, 16))
+    w2 = _var("w2", (8, 32))
+    dense1 = _op("dense1", "nn.dense", [x, w1], (4, 32))
+    relu = _op("relu", "nn.relu", [dense1], (4, 32))
+    dense2 = _op("dense2", "nn.dense", [relu, w2], (4, 8))
+    params = {
+        "w1": np.random.randn(32, 16).astype("float32"),
+        "w2": np.random.randn(8, 32).astype("float32"),
+    }
+    tr = Trace("init", dense2, params)
+    data = np.random.randn(4, 16).astype("float32")
+    outputs = topi.run_symbol(tr.symbol, tr.params, data)
+    return PrecisionSearch(tr, outputs)
+
+
+def _noise(searcher, precisions):
+    return searcher.report(precisions)["noise"]
+
+
+def test_fake_quantize():
+    data = np.linspace(-1, 1, 11).astype("float32")
+    out = fake_quantize(data, 8, 1.0)
+    assert out.dtype == data.dtype
+    assert np.abs(out - data).max() <= 0.5 / 127 + 1e-7
+    np.testing.assert_array_equal(fake_quantize(data, 2, 1.0), np.round(data))
+
+
+def test_probe_decreases_with_bits():
+    searcher = _searcher()
+    sensitivity = searcher.probe()
+    assert set(sensitivity) == {"dense1", "dense2"}
+    for noises in sensitivity.values():
+        assert noises[4] > noises[8] > noises[16]
+
+
+@pytest.mark.parametrize("solver", ["greedy", "knapsack"])
+def test_solve_within_budget(solver):
+    searcher = _searcher()
+    searcher.probe()
+    budget = (searcher.sensitivity["dense1"][8] + searcher.sensitivity["dense2"][8]) * 1.05
+    precisions = searcher.solve(budget, solver)
+    assert _noise(searcher, precisions) <= budget
+    cost = searcher.report(precisions)["cost"]
+    assert cost < sum(mac_bits_cost(s, 16) for s in searcher.layers)
+
+    loose = searcher.solve(1e9, solver)
+    assert set(loose.values()) == {4}
+
+
+def test_knapsack_not_worse_than_greedy():
+    searcher = _searcher()
+    searcher.probe()
+    budget = searcher.sensitivity["dense1"][6] + searcher.sensitivity["dense2"][8]
+    # slack for the discretized budget of knapsack
+    greedy = searcher.report(searcher.solve(budget * 0.99, "greedy"))
+    knapsack = searcher.report(searcher.solve(budget, "knapsack"))
+    assert knapsack["noise"] <= budget
+    assert knapsack["cost"] <= greedy["cost"]
+
+
+def test_greedy_takes_noise_reducing_move():
+    searcher = _searcher()
+    searcher.sensitivity = {
+        "dense1": {4: 1.0, 6: 0.01, 8: 0.2, 16: 0.5},
+        "dense2": {4: 1.0, 6: 0.1, 8: 0.01, 16: 0.01},
+    }
+    # the noise of dense1 is over budget until it is lowered to 6 bits.
+    precisions = searcher.solve(0.05, "greedy")
+    assert precisions == {"dense1": 6, "dense2": 8}
+
+
+@pytest.mark.parametrize("solver", ["greedy", "knapsack"])
+def test_solve_infeasible(solver):
+    searcher = _searcher()
+    searcher.probe()
+    with pytest.raises(RuntimeError, match="infeasible"):
+        searcher.solve(0.0, solver)
+
+
+if __name__ == "__main__":
+    tvm.testing.main()
@@ -0,0 +1,110 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+import numpy as np
+import pytest
+
+import tvm
+import tvm.testing
+from tvm.mrt.symbol import *
+from tvm.mrt.trace import Trace
+from tvm.mrt.transformers.quantize import integer_quantize
+from tvm.mrt import topi
+
+
+def _var(name, shape, dtype="float32"):
+    var = Symbol.variable(name)
+    var.attrs.update({"shape": list(shape), "dtype": dtype})
+    return var
+
+
+def _op(name, op_name, args, shape, dtype="float32", **attrs):
+    attrs.update({"shape": list(shape), "dtype": dtype})
+    return Symbol(name, op_name, args, attrs)
+
+
+def _dense_bias_relu(rng):
+    x = _var("x", (2, 8))
+    w = _var("w", (4, 8))
+    b = _var("b", (4,))
+    dense = _op("dense", "nn.dense", [x, w], (2, 4))
+    bias = _op("bias", "nn.bias_add", [dense, b], (2, 4), axis=1)
+    relu = _op("relu", "nn.relu", [bias], (2, 4))
+    params = {
+        "w": rng.randn(4, 8).astype("float32"),
+        "b": rng.randn(4).astype("float32"),
+    }
+    return x, relu, params
+
+
+def _ranges(tr, data):
+    outs = topi.run_symbol(tr.symbol, tr.params, data)
+    return {k: float(np.abs(v).max()) for k, v in outs.items() if not isinstance(v, list)}
+
+
+def _check_close(out, expect, absmax, mode="fixed_point"):
+    assert out.dtype == "float32"
+    # 8 bits quantization error of a few steps, power of two
+    #   scales lose up to one more bit.
+    tol = 0.1 if mode == "power2" else 0.05
+    tvm.testing.assert_allclose(out, expect, atol=absmax * tol)
+
+
+@pytest.mark.parametrize("mode", ["fixed_point", "power2"])
+def test_quantize_single_output(mode):
+    rng = np.random.RandomState(0)
+    _, out, params = _dense_bias_relu(rng)
+    tr = Trace("init", out, params)
+    data = rng.randn(2, 8).astype("float32")
+    ranges = _ranges(tr, data)
+
+    qtr = integer_quantize(tr, ranges, mode=mode)
+    assert qtr.symbol.dtype == "float32"
+    ops = [s.op_name for s in sym2list(qtr.symbol)]
+    assert "nn.dense" in ops
+    dense = [s for s in sym2list(qtr.symbol) if s.is_op("nn.dense")][0]
+    assert [a.dtype for a in dense.args] == ["int8", "int8"]
+
+    expect = topi.run_symbol(tr.symbol, tr.params, data)[tr.symbol.name]
+    result = topi.run_symbol(qtr.symbol, qtr.params, data)[qtr.symbol.name]
+    _check_close(result, expect, ranges[tr.symbol.name], mode)
+
+
+def test_quantize_tuple_output():
+    rng = np.random.RandomState(0)
+    x, relu, params = _dense_bias_relu(rng)
+    w2 = _var("w2", (3, 8))
+    params["w2"] = rng.randn(3, 8).astype("float32")
+    dense2 = _op("dense2", "nn.dense", [x, w2], (2, 3))
+    out = Symbol(
+        "out", TUPLE_NAME, [relu, dense2], {"shape": [[2, 4], [2, 3]], "dtype": ["float32"] * 2}
+    )
+    tr = Trace("init", out, params)
+    data = rng.randn(2, 8).astype("float32")
+    ranges = _ranges(tr, data)
+
+    qtr = integer_quantize(tr, ranges)
+    assert qtr.symbol.is_op(TUPLE_NAME)
+    assert [a.dtype for a in qtr.symbol.args] == ["float32", "float32"]
+
+    expects = topi.run_symbol(tr.symbol, tr.params, data)[tr.symbol.name]
+    results = topi.run_symbol(qtr.symbol, qtr.params, data)[qtr.symbol.name]
+    for result, expect, name in zip(results, expects, ["relu", "dense2"]):
+        _check_close(result, expect, ranges[name])
+
+
+if __name__ == "__main__":
+    tvm.testing.main()
@@ -0,0 +1,142 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+from multiprocessing import shared_memory
+
+import numpy as np
+import pytest
+
+import tvm
+import tvm.testing
+from tvm import relay
+from tvm.mrt import runtime
+from tvm.mrt.interop import as_numpy
+from tvm.mrt.symbol import *
+from tvm.mrt.trace import Trace
+
+
+def _dense_relu():
+    x = relay.var("x", shape=(2, 4), dtype="float32")
+    w = relay.var("w", shape=(8, 4), dtype="float32")
+    b = relay.var("b", shape=(8,), dtype="float32")
+    out = relay.nn.relu(relay.nn.bias_add(relay.nn.dense(x, w), b))
+    params = {
+        "w": np.random.randn(8, 4).astype("float32"),
+        "b": np.random.randn(8).astype("float32"),
+    }
+    return expr2symbol(out), params
+
+
+def test_liveness_executor():
+    sym, params = _dense_relu()
+    data = np.random.randn(2, 4).astype("float32")
+    out = runtime.LivenessExecutor(sym, params).run(data)
+    expect = np.maximum(data @ params["w"].T + params["b"], 0)
+    tvm.testing.assert_allclose(as_numpy(out), expect, rtol=1e-5, atol=1e-5)
+
+
+def test_liveness_executor_releases_dead_outputs():
+    x = relay.var("x", shape=(16, 64), dtype="float32")
+    out = x
+    for _ in range(6):
+        out = relay.nn.relu(out)
+    sym = expr2symbol(out)
+    data = np.random.randn(16, 64).astype("float32")
+
+    executor = runtime.LivenessExecutor(sym, {})
+    seen = []
+    out = executor.run(data, callback=lambda s, o: seen.append(s.name))
+    tvm.testing.assert_allclose(as_numpy(out), np.maximum(data, 0))
+    assert len(seen) == 7
+    # at most the input of an operator and its output are alive
+    assert executor.peak_bytes <= 2 * data.nbytes
+
+
+def test_parallel_executor_publishes_params_once():
+    sym, params = _dense_relu()
+    with runtime.ParallelExecutor(sym, params, num_workers=2) as executor:
+        segments = list(executor._param_shms)
+        assert len(segments) == len(params)
+        for _ in range(2):
+            data = np.random.randn(2, 4).astype("float32")
+            outs = executor.run(data)
+            expect = np.maximum(data @ params["w"].T + params["b"], 0)
+            tvm.testing.assert_allclose(outs[sym.name], expect, rtol=1e-5)
+            assert list(executor._param_shms) == segments
+
+    for name in segments:
+        with pytest.raises(FileNotFoundError):
+            shared_memory.SharedMemory(name=name)
+
+
+def test_validator_chunks_and_pads_batches():
+    x = relay.var("x", shape=(2, 4), dtype="float32")
+    w = relay.var("w", shape=(8, 4), dtype="float32")
+    params = {"w": np.random.randn(8, 4).astype("float32")}
+    func = runtime.validator(relay.nn.dense(x, w), params, "dense")
+
+    data = np.random.randn(5, 4).astype("float32")
+    out, _ = func((data, None))
+    tvm.testing.assert_allclose(out, data @ params["w"].T, rtol=1e-5)
+
+    first, _ = func((data[:2], None))
+    second, _ = func((data[2:4], None))
+    # outputs are copied out of the preallocated buffers
+    assert not np.shares_memory(first, second)
+    tvm.testing.assert_allclose(first, data[:2] @ params["w"].T, rtol=1e-5)
+    tvm.testing.assert_allclose(second, data[2:4] @ params["w"].T, rtol=1e-5)
+
+
+def test_per_op_calibrate_hits_executor_cache():
+    x = relay.var("x", shape=(1, 4, 3, 3), dtype="float32")
+    names = ["gamma", "beta", "mean", "var"]
+    bn_args = [relay.var(n, shape=(4,), dtype="float32") for n in names]
+    out = relay.nn.relu(relay.nn.batch_norm(x, *bn_args)[0])
+    params = {n: tvm.nd.array(np.random.rand(4).astype("float32") + 0.5) for n in names}
+    tr = Trace.from_expr(out, params)
+    data = np.random.randn(1, 4, 3, 3).astype("float32")
+
+    runtime.clear_executor_cache()
+    # tuple output of batch_norm is kept as list among the outputs
+    first = tr.calibrate(data, whole_graph=False)
+    assert runtime.executor_cache_info()["hit"] == 0
+    misses = runtime.executor_cache_info()["miss"]
+    assert misses == 2
+
+    second = tr.calibrate(data, whole_graph=False)
+    assert runtime.executor_cache_info()["hit"] == misses
+    assert runtime.executor_cache_info()["miss"] == misses
+    name = tr.symbol.name
+    tvm.testing.assert_allclose(as_numpy(first[name]), as_numpy(second[name]))
+
+
+def test_infer_cache_keeps_input_order():
+    runtime.clear_executor_cache()
+    data = {
+        "x": np.random.randn(3).astype("float32"),
+        "y": np.random.randn(3).astype("float32"),
+    }
+    for lhs, rhs in [("x", "y"), ("y", "x"), ("x", "y")]:
+        a = relay.var(lhs, shape=(3,), dtype="float32")
+        b = relay.var(rhs, shape=(3,), dtype="float32")
+        out = runtime.infer(relay.subtract(a, b), data)
+        tvm.testing.assert_allclose(out.numpy(), data[lhs] - data[rhs])
+    assert runtime.executor_cache_info()["hit"] == 1
+    assert runtime.executor_cache_info()["miss"] == 2
+
+
+if __name__ == "__main__":
+    tvm.testing.main()
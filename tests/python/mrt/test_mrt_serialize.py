@@ -0,0 +1,111 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+import numpy as np
+import pytest
+
+import tvm
+import tvm.testing
+from tvm import runtime
+from tvm.mrt.symbol import *
+from tvm.mrt.trace import Trace
+from tvm.mrt.serialize import LazyParams, symbol_from_json, symbol_to_json
+
+
+def _params():
+    return {
+        "w": np.random.randn(4, 3).astype("float32"),
+        "b": np.random.randint(-100, 100, (4,)).astype("int32"),
+        "q": np.random.randint(-128, 128, (2, 2, 3)).astype("int8"),
+        "u": np.random.randint(0, 255, (5,)).astype("uint8"),
+        "d": np.random.randn(3).astype("float64"),
+        "s": np.array(7, dtype="int64"),
+        "m": np.array([True, False, True]),
+    }
+
+
+def test_lazy_params_matches_save_param_dict(tmp_path):
+    params = _params()
+    fname = str(tmp_path / "test.params")
+    with open(fname, "wb") as f:
+        f.write(runtime.save_param_dict({k: tvm.nd.array(v) for k, v in params.items()}))
+
+    lazy = LazyParams(fname)
+    assert len(lazy) == len(params)
+    assert set(lazy) == set(params)
+    assert lazy.loaded == []
+    for name, data in params.items():
+        assert lazy.shape_of(name) == data.shape
+        assert lazy.dtype_of(name) == str(data.dtype)
+        np.testing.assert_array_equal(lazy.numpy(name), data)
+    assert lazy.loaded == []
+
+    w = lazy["w"]
+    assert isinstance(w, tvm.nd.NDArray)
+    np.testing.assert_array_equal(w.numpy(), params["w"])
+    assert lazy.loaded == ["w"]
+    assert lazy["w"] is w
+
+    expect = runtime.load_param_dict(open(fname, "rb").read())
+    for name in params:
+        np.testing.assert_array_equal(lazy[name].numpy(), expect[name].numpy())
+
+    assert "missing" not in lazy
+    with pytest.raises(KeyError):
+        lazy["missing"]
+
+
+def test_lazy_params_invalid_file(tmp_path):
+    fname = tmp_path / "bad.params"
+    fname.write_bytes(b"\0" * 32)
+    with pytest.raises(AssertionError):
+        LazyParams(str(fname))
+
+
+def test_symbol_json_round_trip():
+    x = Symbol.variable("x")
+    x.attrs.update({"shape": [1, 3], "dtype": "float32"})
+    w = Symbol.variable("w")
+    w.attrs.update({"shape": [4, 3], "dtype": "float32"})
+    dense = Symbol("dense", "nn.dense", [x, w], {"shape": [1, 4], "dtype": "float32", "units": 4})
+    relu = Symbol("relu", "nn.relu", [dense], {"shape": [1, 4], "dtype": "float32"})
+
+    nodes = symbol_to_json(relu)
+    assert [n["name"] for n in nodes] == ["x", "w", "dense", "relu"]
+    out = symbol_from_json(nodes)
+    assert [s.name for s in sym2list(out)] == ["x", "w", "dense", "relu"]
+    assert out.args[0].attrs == dense.attrs
+    assert out.args[0].args[1].name == "w"
+
+
+def test_trace_dump_load(tmp_path):
+    x = Symbol.variable("x")
+    x.attrs.update({"shape": [1, 3], "dtype": "float32"})
+    w = Symbol.variable("w")
+    w.attrs.update({"shape": [4, 3], "dtype": "float32"})
+    dense = Symbol("dense", "nn.dense", [x, w], {"shape": [1, 4], "dtype": "float32"})
+    params = {"w": tvm.nd.array(np.random.randn(4, 3).astype("float32"))}
+    Trace("init", dense, params).dump(str(tmp_path / "trace"))
+
+    tr = Trace.load(str(tmp_path / "trace"))
+    assert tr.name == "init"
+    assert isinstance(tr.params, LazyParams)
+    assert tr.input_names == ["x"]
+    np.testing.assert_array_equal(tr.params["w"].numpy(), params["w"].numpy())
+
+
+if __name__ == "__main__":
+    tvm.testing.main()
@@ -0,0 +1,97 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+import numpy as np
+import pytest
+
+import tvm
+import tvm.testing
+from tvm.mrt.stats import ClassificationOutput
+
+
+def _naive_hits(data, label):
+    top1, top5 = 0, 0
+    for row, lbl in zip(data, label):
+        order = sorted(range(len(row)), key=lambda i: row[i])
+        top1 += int(order[-1] == lbl)
+        top5 += int(lbl in order[-5:])
+    return top1, top5
+
+
+def _batch(batch=16, num_classes=10, seed=0):
+    rng = np.random.RandomState(seed)
+    data = rng.randn(batch, num_classes).astype("float32")
+    label = rng.randint(0, num_classes, (batch,))
+    return data, label
+
+
+def test_classification_matches_naive():
+    stats = ClassificationOutput()
+    top1, top5, total = 0, 0, 0
+    for seed in range(3):
+        data, label = _batch(seed=seed)
+        stats.merge((data, label))
+        hit1, hit5 = _naive_hits(data, label)
+        top1, top5, total = top1 + hit1, top5 + hit5, total + len(label)
+        np.testing.assert_array_equal(stats.dl_top1, data.argmax(axis=1))
+
+    assert (stats.top1_hit, stats.top5_hit, stats.dl_total) == (top1, top5, total)
+    assert stats.info() == "{},{}".format(top1 / total, top5 / total)
+
+
+def test_classification_fewer_classes_than_topk():
+    data, label = _batch(num_classes=3)
+    stats = ClassificationOutput()
+    stats.merge((data, label))
+    assert stats.top5_hit == len(label)
+    assert stats.top1_hit == _naive_hits(data, label)[0]
+
+
+def test_classification_reduce():
+    data, label = _batch(batch=32)
+    whole = ClassificationOutput()
+    whole.merge((data, label))
+    left, right = ClassificationOutput(), ClassificationOutput()
+    left.merge((data[:10], label[:10]))
+    right.merge((data[10:], label[10:]))
+    left.reduce(right)
+    assert (left.top1_hit, left.top5_hit, left.dl_total) == (
+        whole.top1_hit,
+        whole.top5_hit,
+        whole.dl_total,
+    )
+
+    left.reset()
+    assert (left.top1_hit, left.top5_hit, left.dl_total) == (0, 0, 0)
+
+
+def test_classification_class_mismatch():
+    stats = ClassificationOutput()
+    stats.merge(_batch(num_classes=10))
+    with pytest.raises(AssertionError):
+        stats.merge(_batch(num_classes=8))
+
+
+def test_classification_debug_raw():
+    data, label = _batch(batch=4)
+    stats = ClassificationOutput(debug=True)
+    stats.merge((data, label))
+    np.testing.assert_array_equal(stats.top1_raw, data.max(axis=1))
+    np.testing.assert_array_equal(stats.top5_raw, np.sort(data, axis=1)[:, -5:])
+
+
+if __name__ == "__main__":
+    tvm.testing.main()
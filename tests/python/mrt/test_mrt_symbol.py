@@ -0,0 +1,86 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+import numpy as np
+
+import tvm
+import tvm.testing
+from tvm.mrt.symbol import *
+from tvm.mrt.fuse import FusionOp
+
+
+def _var(name, shape, dtype="float32"):
+    var = Symbol.variable(name)
+    var.attrs.update({"shape": list(shape), "dtype": dtype})
+    return var
+
+
+def _op(name, op_name, args, shape, dtype="float32", **attrs):
+    attrs.update({"shape": list(shape), "dtype": dtype})
+    return Symbol(name, op_name, args, attrs)
+
+
+def _dense_relu_relu():
+    x = _var("x", (1, 4))
+    w = _var("w", (8, 4))
+    dense = _op("dense", "nn.dense", [x, w], (1, 8))
+    relu = _op("relu", "nn.relu", [dense], (1, 8))
+    relu2 = _op("relu2", "nn.relu", [relu], (1, 8))
+    params = {"w": np.ones((8, 4), "float32")}
+    return relu2, params
+
+
+def test_sym2list_topo_order():
+    out, _ = _dense_relu_relu()
+    assert [s.name for s in sym2list(out)] == ["x", "w", "dense", "relu", "relu2"]
+
+
+def test_transform_unchanged_keeps_identity():
+    out, _ = _dense_relu_relu()
+    graph = GraphIndex(out)
+    assert transform(out, lambda sym: None, graph) is out
+
+
+def test_transform_copy_on_write():
+    out, _ = _dense_relu_relu()
+    graph = GraphIndex(out)
+
+    def _rename(sym):
+        if sym.name == "relu":
+            return sym.clone(name="relu_new")
+
+    new = transform(out, _rename, graph)
+    assert new is not out
+    assert new.args[0].name == "relu_new"
+    # the subgraph below the modified symbol is shared
+    assert new.args[0].args[0] is graph["dense"]
+
+
+def test_transformer_apply_keeps_identity():
+    out, params = _dense_relu_relu()
+    graph = GraphIndex(out)
+    fused = transform(out, lambda sym: FusionOp.apply()(sym, params), graph)
+    # relu(relu(x)) is fused into relu(x), and dense is not touched
+    assert fused.name == "relu"
+    assert fused.args[0] is graph["dense"]
+    assert type(fused.args[0]) is Symbol
+
+    dense = graph["dense"]
+    assert FusionOp.apply()(dense, params) is dense
+
+
+if __name__ == "__main__":
+    tvm.testing.main()
@@ -0,0 +1,115 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+import numpy as np
+import pytest
+
+import tvm
+import tvm.testing
+import tvm.topi.testing
+from tvm import relay
+from tvm.mrt import runtime, topi
+
+
+@pytest.mark.parametrize("groups", [1, 2])
+def test_conv2d_int8(groups):
+    x = np.random.randint(-128, 128, (1, 4, 7, 7)).astype("int8")
+    w = np.random.randint(-128, 128, (6, 4 // groups, 3, 3)).astype("int8")
+    attrs = {"padding": (1, 1), "strides": (2, 2), "groups": groups, "out_dtype": "int32"}
+    out = topi.run_op("nn.conv2d", [x, w], attrs)
+    expect = tvm.topi.testing.conv2d_nchw_python(
+        x.astype("int32"), w.astype("int32"), (2, 2), (1, 1), groups=groups
+    )
+    assert out.dtype == "int32"
+    np.testing.assert_array_equal(out, expect)
+
+
+def test_dense_int8():
+    x = np.random.randint(-128, 128, (3, 16)).astype("int8")
+    w = np.random.randint(-128, 128, (5, 16)).astype("int8")
+    out = topi.run_op("nn.dense", [x, w], {"out_dtype": "int32"})
+    np.testing.assert_array_equal(out, x.astype("int32") @ w.astype("int32").T)
+
+
+def test_avg_pool2d_int_trunc():
+    x = np.array([[[[1, 2], [2, 2]]]], "int32")
+    attrs = {"pool_size": (2, 2)}
+    assert topi.run_op("nn.avg_pool2d", [x], attrs).item() == 1
+    assert topi.run_op("nn.avg_pool2d", [-x], attrs).item() == -1
+    assert topi.run_op("nn.global_avg_pool2d", [-x], {}).item() == -1
+
+
+def test_int_avg_pool2d_matches_llvm():
+    x = np.random.randint(-128, 128, (1, 2, 5, 5)).astype("int32")
+    var = relay.var("x", shape=x.shape, dtype="int32")
+    for op_name, attrs in [
+        ("nn.avg_pool2d", {"pool_size": (2, 2), "strides": (2, 2), "padding": (1, 1)}),
+        ("nn.global_avg_pool2d", {}),
+    ]:
+        expr = getattr(relay.nn, op_name[3:])(var, **attrs)
+        expect = runtime.infer(expr, {"x": x}).numpy()
+        np.testing.assert_array_equal(topi.run_op(op_name, [x], attrs), expect)
+
+
+def test_global_avg_pool2d_matches_avg_pool2d():
+    x = np.random.randint(-128, 128, (2, 3, 5, 5)).astype("int8")
+    out = topi.run_op("nn.global_avg_pool2d", [x], {})
+    expect = topi.run_op("nn.avg_pool2d", [x], {"pool_size": (5, 5)})
+    assert out.dtype == x.dtype
+    np.testing.assert_array_equal(out, expect)
+
+    f = np.random.randn(2, 3, 5, 5).astype("float32")
+    out = topi.run_op("nn.global_avg_pool2d", [f], {})
+    tvm.testing.assert_allclose(out, f.mean(axis=(2, 3), keepdims=True), rtol=1e-5)
+
+
+@pytest.mark.parametrize(
+    "newshape, expect",
+    [
+        ((0, -1), (2, 12)),
+        ((-2,), (2, 3, 4)),
+        ((-3, 4), (6, 4)),
+        ((0, -3), (2, 12)),
+        ((-4, 1, 2, -2), (1, 2, 3, 4)),
+        ((2, -4, -1, 3, 0), (2, 1, 3, 4)),
+        ((-4, 2, -1, 0, 0), (2, 1, 3, 4)),
+    ],
+)
+def test_reshape(newshape, expect):
+    x = np.arange(24).reshape(2, 3, 4)
+    out = topi.run_op("reshape", [x], {"newshape": newshape})
+    assert out.shape == expect
+    np.testing.assert_array_equal(out.flatten(), x.flatten())
+
+
+def test_max_pool2d_padding():
+    x = np.random.randint(-128, 128, (1, 2, 4, 4)).astype("int8")
+    attrs = {"pool_size": (3, 3), "strides": (2, 2), "padding": (1, 1)}
+    out = topi.run_op("nn.max_pool2d", [x], attrs)
+    padded = np.pad(x, ((0, 0), (0, 0), (1, 1), (1, 1)), constant_values=-128)
+    expect = np.array(
+        [[padded[:, :, i : i + 3, j : j + 3].max(axis=(2, 3)) for j in (0, 2)] for i in (0, 2)]
+    ).transpose(2, 3, 0, 1)
+    np.testing.assert_array_equal(out, expect)
+
+
+def test_unsupported_op():
+    with pytest.raises(NotImplementedError):
+        topi.run_op("nn.not_an_op", [], {})
+
+
+if __name__ == "__main__":
+    tvm.testing.main()